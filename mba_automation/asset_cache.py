@@ -0,0 +1,175 @@
+import os
+import re
+import json
+import time
+import fcntl
+import hashlib
+
+from .site import HOST
+
+CACHE_DIR = os.getenv("MBA_ASSET_CACHE_DIR") or os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "cache", "assets"))
+MAX_CACHE_MB = int(os.getenv("MBA_ASSET_CACHE_MB", "100"))
+
+# Only the site's own JS/CSS bundles are cached; the pattern is handed to
+# Playwright so no other request is routed through Python for the cache
+ASSET_RE = re.compile(rf"^https?://([^/?#]*\.)?{re.escape(HOST)}(:\d+)?/[^?#]*\.(js|css)([?#].*)?$", re.IGNORECASE)
+# Bundles with a content hash in their name never change; serve them without revalidating
+IMMUTABLE_RE = re.compile(r"[.\-_][0-9a-f]{8,}\.(js|css)$", re.IGNORECASE)
+# Response headers worth replaying from disk
+KEEP_HEADERS = ("content-type", "etag", "last-modified", "cache-control")
+
+# Per-context counters, keyed by id(context)
+_stats = {}
+
+
+class AssetCache:
+    """Content-addressed disk cache for SPA bundles, shared by all runs and accounts.
+
+    Bodies are stored once per sha256 under blobs/, and index.json maps each
+    URL to its blob plus validators:
+        {url: {"sha": ..., "etag": ..., "last_modified": ..., "headers": {...}, "size": n, "stored": ts}}
+    Cached URLs are revalidated with If-None-Match/If-Modified-Since, so an
+    unchanged bundle costs a 304 instead of the full download.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_mb: int = MAX_CACHE_MB):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.index_file = os.path.join(cache_dir, "index.json")
+        self.max_bytes = max_mb * 1024 * 1024
+        self._index = None
+
+    def _load_index(self) -> dict:
+        if self._index is None:
+            try:
+                with open(self.index_file, 'r') as f:
+                    self._index = json.load(f)
+            except Exception:
+                self._index = {}
+        return self._index
+
+    def lookup(self, url: str):
+        """(entry, body) for a cached URL, or (None, None)."""
+        entry = self._load_index().get(url)
+        if not entry:
+            return None, None
+        try:
+            with open(os.path.join(self.blob_dir, entry['sha']), 'rb') as f:
+                return entry, f.read()
+        except OSError:
+            return None, None
+
+    def store(self, url: str, body: bytes, headers: dict) -> dict:
+        """Save a response body and its validators; returns the index entry."""
+        sha = hashlib.sha256(body).hexdigest()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        blob = os.path.join(self.blob_dir, sha)
+        if not os.path.exists(blob):
+            tmp = f"{blob}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, blob)
+        entry = {
+            'sha': sha,
+            'etag': headers.get('etag'),
+            'last_modified': headers.get('last-modified'),
+            'headers': {k: headers[k] for k in KEEP_HEADERS if k in headers},
+            'size': len(body),
+            'stored': time.time(),
+        }
+        self._update(lambda index: index.__setitem__(url, entry))
+        return entry
+
+    def _update(self, fn) -> None:
+        # Merge with what other CLI processes wrote, then enforce the size budget
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.index_file, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    index = json.loads(f.read() or '{}')
+                except ValueError:
+                    index = {}
+                fn(index)
+                self._evict(index)
+                f.seek(0)
+                f.truncate()
+                json.dump(index, f, indent=1)
+                self._index = index
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _evict(self, index: dict) -> None:
+        sizes = {e['sha']: e['size'] for e in index.values()}
+        total = sum(sizes.values())
+        for url, entry in sorted(index.items(), key=lambda kv: kv[1]['stored']):
+            if total <= self.max_bytes:
+                break
+            del index[url]
+            # Blobs are shared between URLs with identical content
+            if all(e['sha'] != entry['sha'] for e in index.values()):
+                total -= sizes.pop(entry['sha'], 0)
+                try:
+                    os.remove(os.path.join(self.blob_dir, entry['sha']))
+                except OSError:
+                    pass
+
+    def handle(self, route, stats: dict = None) -> None:
+        """Playwright route handler for ASSET_RE requests."""
+        stats = stats if stats is not None else {}
+        req = route.request
+        if req.method != 'GET':
+            return route.fallback()
+        entry, body = self.lookup(req.url)
+
+        if entry and IMMUTABLE_RE.search(req.url.split('?')[0]):
+            stats['hits'] = stats.get('hits', 0) + 1
+            stats['bytes_saved'] = stats.get('bytes_saved', 0) + entry['size']
+            return route.fulfill(status=200, headers=entry['headers'], body=body)
+
+        headers = dict(req.headers)
+        if entry and entry.get('etag'):
+            headers['if-none-match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['if-modified-since'] = entry['last_modified']
+        try:
+            resp = route.fetch(headers=headers)
+        except Exception:
+            if entry:
+                # Offline or flaky: a stale bundle beats a broken page
+                stats['stale'] = stats.get('stale', 0) + 1
+                return route.fulfill(status=200, headers=entry['headers'], body=body)
+            return route.fallback()
+
+        if resp.status == 304 and entry:
+            stats['revalidated'] = stats.get('revalidated', 0) + 1
+            stats['bytes_saved'] = stats.get('bytes_saved', 0) + entry['size']
+            return route.fulfill(status=200, headers=entry['headers'], body=body)
+        fresh = resp.body()
+        if resp.status == 200:
+            stats['misses'] = stats.get('misses', 0) + 1
+            resp_headers = {k.lower(): v for k, v in resp.headers.items()}
+            if resp_headers.get('etag') or resp_headers.get('last-modified') or IMMUTABLE_RE.search(req.url.split('?')[0]):
+                try:
+                    self.store(req.url, fresh, resp_headers)
+                except OSError:
+                    pass
+        return route.fulfill(response=resp, body=fresh)
+
+
+CACHE = AssetCache()
+
+
+def install(context, cache: AssetCache = None) -> dict:
+    """Serve the site's JS/CSS bundles for this context from the shared disk cache."""
+    cache = cache or CACHE
+    stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stale': 0, 'bytes_saved': 0}
+    _stats[id(context)] = stats
+    context.route(ASSET_RE, lambda route: cache.handle(route, stats))
+    return stats
+
+
+def pop_stats(context) -> dict:
+    return _stats.pop(id(context), {})
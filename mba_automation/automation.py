@@ -2,11 +2,35 @@ import os
 import time
 from typing import Optional, Tuple
 from playwright.sync_api import Playwright, Page, TimeoutError as PlaywrightTimeoutError
-from .scraper import scrape_income, scrape_withdrawal, scrape_balance, scrape_points, scrape_calendar_data, try_close_popups
+from .scraper import scrape_income, scrape_withdrawal, scrape_balance, scrape_stable_balance, scrape_progress, scrape_points, scrape_calendar_data, try_close_popups
 from .reviews import REVIEWS
+from .events import emit
+from .instrument import span
+from .sessions import SessionManager, session_tokens, SESSION_DIR
+from .planner import SOURCES
+from .retry import LoginFailed
+from . import selector_cache, blocking, asset_cache, instrument
+from .resources import ResourceMonitor
+from .site import page_url
 import random
 from datetime import date
 
+SESSIONS = SessionManager()
+
+# Selector variants per lookup, in declared preference order (see selector_cache)
+TICKET_SELECTORS = [
+    ".van-badge__wrapper.van-icon.van-icon-undefined.item-icon.iconfont.icon-ticket",
+    ".icon-ticket",
+    "[class*='icon-ticket']",
+]
+GRAB_BUTTON_SELECTORS = [
+    "role=button[name=\"Mendapatkan\"]",
+    "#app > div > div.van-config-provider.provider-box > div.main-wrapper.travel-bg > div.div-flex-center > button",
+]
+WORK_GRAB_BUTTON_SELECTORS = [
+    "role=button[name=\"Mendapatkan\"]",
+    "button:has-text('Mendapatkan')",
+]
 
 
 def smart_click(page: Page, selector: str, role: str = None, name: str = None, retries: int = 3, timeout: int = 5000) -> bool:
@@ -31,7 +55,7 @@ def smart_click(page: Page, selector: str, role: str = None, name: str = None, r
 def get_session_path(phone: str) -> str:
     """Returns the path for the session storage file."""
     # Ensure directory exists
-    session_dir = os.path.join(os.path.dirname(__file__), "..", "sessions")
+    session_dir = SESSION_DIR
     os.makedirs(session_dir, exist_ok=True)
     
     # Normalize phone for filename
@@ -39,66 +63,109 @@ def get_session_path(phone: str) -> str:
     return os.path.join(session_dir, f"{norm}.json")
 
 
-def login(page: Page, context, phone: str, password: str, timeout: int = 30) -> bool:
+def _page_probe(page: Page, timeout: int = 30) -> bool:
+    """Loads #/mine and waits for whichever comes first: an authenticated marker or a redirect to login."""
+    page.goto(page_url("mine"), wait_until="domcontentloaded", timeout=timeout*1000)
+    # PRO-TIP: "icon-lipin" might exist as an SVG symbol even if not logged in,
+    # so only a VISIBLE <i> tag (or the "Saldo Rekening" label) counts.
+    check = """() => {
+        if (location.hash.toLowerCase().includes('login')) return 'login';
+        const body = document.body ? document.body.innerText : '';
+        if (body.includes('Saldo Rekening')) return 'ok';
+        const icon = document.querySelector('i.icon-lipin');
+        if (icon && icon.offsetParent !== null) return 'ok';
+        return false;
+    }"""
+    try:
+        state = page.wait_for_function(check, timeout=8000).json_value()
+    except PlaywrightTimeoutError:
+        # A popup may be covering the page; dismiss and look once more
+        try_close_popups(page)
+        state = page.evaluate(check)
+    return state == 'ok' and "login" not in page.url.lower()
+
+
+def _request_probe(context, session_path: str, timeout: int = 30) -> Optional[bool]:
+    """Validate the stored session with one authenticated API request (no page render).
+
+    Only used when MBA_SESSION_PROBE_URL points at an endpoint that requires
+    login; returns None when no probe URL is configured.
+    """
+    url = os.getenv("MBA_SESSION_PROBE_URL")
+    if not url:
+        return None
+    headers = {}
+    tokens = session_tokens(session_path)
+    if tokens:
+        headers["Authorization"] = f"Bearer {tokens[0]}"
+    try:
+        resp = context.request.get(url, headers=headers, timeout=timeout*1000, max_redirects=0)
+        if resp.status in (401, 403) or 300 <= resp.status < 400:
+            return False
+        if not resp.ok:
+            return None
+        try:
+            body = resp.json()
+            code = body.get("code") if isinstance(body, dict) else None
+            if code in (401, 403, "401", "403"):
+                return False
+        except Exception:
+            pass
+        return True
+    except Exception as e:
+        print(f"  Session probe request failed: {e}")
+        return None
+
+
+def login(page: Page, context, phone: str, password: str, timeout: int = 30, force_probe: bool = False, relogin: bool = False) -> bool:
     """
     Handles login logic including phone number normalization and popup handling.
     Attempts to restore session if available.
+    Sessions verified recently (see sessions.SessionManager) are trusted without
+    any probe unless force_probe is set; relogin skips the stored session entirely.
     Returns True if login appears successful, False otherwise.
     """
     session_path = get_session_path(phone)
     
-    # 1. Try to restore session
-    if os.path.exists(session_path):
-        print(f"Restoring session from {session_path}...")
-        # Note: In Playwright sync, we load storage_state when creating context. 
-        # But if we are already here, the context might have been created without state 
-        # if the file didn't exist at start (or we are in a retry/reload loop).
-        # However, 'run' function now handles initial loading.
-        # Here we just verify if we are already logged in.
-
     try:
         # Normalize phone: strip '62' prefix if present
         phone_for_login = phone[2:] if phone.startswith('62') else phone
-        
-        # Check if already logged in (session restored)
-        page.goto("https://mba7.com/#/mine", wait_until="domcontentloaded", timeout=timeout*1000)
-        page.wait_for_timeout(2000)
-        try_close_popups(page)
-        
-        # Verify if we are logged in
-        # PRO-TIP: "icon-lipin" might exist as an SVG symbol even if not logged in.
-        # We must check for VISIBLE elements that only appear when authenticated.
-        authenticated = False
-        
-        # 1. Check for specific text that only exists on Mine/Profile page when logged in
-        if page.get_by_text("Saldo Rekening").is_visible(timeout=3000): 
-            authenticated = True
-        elif page.locator("i.icon-lipin").is_visible(timeout=1000): # Check specifically for <i> tag
-            authenticated = True
-        
-        # 2. Check for "Login" or "Daftar" - if they are prominently visible, we are likely NOT logged in
-        # (Be careful as they might be in a header/footer on many pages)
-        if authenticated:
-            # Final sanity check: make sure we aren't actually on the login page
-            if "login" in page.url.lower():
-                authenticated = False
 
-        if authenticated:
-            print("Session restored successfully (Already logged in).")
-            return True
+        # 1. Try to restore session
+        # Note: the storage state itself is loaded when 'run' creates the context;
+        # here we only decide whether it is still good.
+        if os.path.exists(session_path) and not relogin:
+            if not force_probe and SESSIONS.is_fresh(phone, session_path):
+                print("Session verified recently, skipping probe.")
+                return True
+
+            if SESSIONS.is_expired(phone, session_path):
+                print("Stored session token has expired.")
+                authenticated = False
+            else:
+                print(f"Restoring session from {session_path}...")
+                authenticated = _request_probe(context, session_path, timeout)
+                if authenticated is None:
+                    authenticated = _page_probe(page, timeout)
+
+            if authenticated:
+                print("Session restored successfully (Already logged in).")
+                SESSIONS.record_valid(phone)
+                return True
+            SESSIONS.record_invalid(phone)
         
         print(f"Session invalid or expired. Logging in as {phone}...")
-        page.goto("https://mba7.com/#/login", wait_until="networkidle", timeout=timeout*1000)
-        page.wait_for_timeout(2000)
+        page.goto(page_url("login"), wait_until="networkidle", timeout=timeout*1000)
         try_close_popups(page)
 
         # Ensure we are actually on login page
         if "login" not in page.url.lower():
             print("  Attempting navigation to login page again...")
-            page.goto("https://mba7.com/#/login", timeout=timeout*1000)
-            page.wait_for_timeout(2000)
+            page.goto(page_url("login"), timeout=timeout*1000)
 
-        page.get_by_role("textbox", name="Nomor Telepon").fill(phone_for_login)
+        phone_box = page.get_by_role("textbox", name="Nomor Telepon")
+        phone_box.wait_for(state="visible", timeout=10000)
+        phone_box.fill(phone_for_login)
         page.get_by_role("textbox", name="Kata Sandi").fill(password)
         
         # Handle the "Masuk" button in the login form
@@ -107,31 +174,30 @@ def login(page: Page, context, phone: str, password: str, timeout: int = 30) ->
             login_btn.click()
         else:
             smart_click(page, "button", role="button", name="Masuk")
-            
-        page.wait_for_timeout(4000)
+
+        # Wait until we leave the login page or a confirmation dialog shows up
+        try:
+            page.wait_for_function(
+                """() => !location.hash.toLowerCase().includes('login')
+                    || [...document.querySelectorAll('button')].some(b => b.innerText.includes('Mengonfirmasi'))""",
+                timeout=10000
+            )
+        except PlaywrightTimeoutError:
+            pass
 
         # After login: confirm buttons might appear
         for _ in range(3):
-            if smart_click(page, "button", role="button", name="Mengonfirmasi", timeout=3000):
-                page.wait_for_timeout(1000)
+            if smart_click(page, "button", role="button", name="Mengonfirmasi", retries=1, timeout=1500):
+                page.wait_for_timeout(500)
             else:
                 break
         
         # Verify login success by checking for mine page elements
-        page.goto("https://mba7.com/#/mine", timeout=timeout*1000)
-        page.wait_for_timeout(3000)
-        try_close_popups(page)
-        
-        success = False
-        if page.get_by_text("Saldo Rekening").is_visible(timeout=5000): 
-            success = True
-        elif page.locator("i.icon-lipin").is_visible(timeout=2000):
-            success = True
-
-        if success:
+        if _page_probe(page, timeout):
              # Save storage state
              print(f"Login success. Saving session to {session_path}...")
              context.storage_state(path=session_path)
+             SESSIONS.record_login(phone)
              return True
         
         print(f"Login verification failed. URL: {page.url}")
@@ -154,7 +220,7 @@ def perform_checkin(page: Page) -> Tuple[float, list]:
     try:
         # 1. Navigation: Go directly to points shop
         print("  Navigating to Points Shop...")
-        page.goto("https://mba7.com/#/points/shop", timeout=45000)
+        page.goto(page_url("points/shop"), timeout=45000)
         page.wait_for_timeout(3000)
         try_close_popups(page)
 
@@ -186,6 +252,11 @@ def perform_checkin(page: Page) -> Tuple[float, list]:
             print("    Calendar not opened, skipping calendar scraping")
             return points, calendar
 
+        if checked_in_today(calendar):
+            print("  Already checked in today, skipping submit.")
+            try_close_popups(page)
+            return points, calendar
+
         # 5. PERFORM CHECK-IN if calendar is open
         print("  Attempting check-in...")
         if smart_click(page, ".van-calendar__confirm", timeout=3000):
@@ -220,6 +291,114 @@ def perform_checkin(page: Page) -> Tuple[float, list]:
     return points, calendar
 
 
+# Which step of a task iteration the page is ready for. 'login' and 'confirm'
+# are always checked first; the other states are only reported when wanted.
+_TASK_STATE_JS = """
+(wanted) => {
+  if (location.hash.toLowerCase().includes('login')) return 'login';
+  const visible = el => el && el.offsetParent !== null;
+  const buttons = Array.from(document.querySelectorAll('button')).filter(visible);
+  const button = label => buttons.some(b => (b.textContent || '').includes(label));
+  if (button('Mengonfirmasi')) return 'confirm';
+  if (wanted.includes('kirim') && button('Kirim')) return 'kirim';
+  if (wanted.includes('item')) {
+    let n = 0;
+    for (const el of document.querySelectorAll('body *')) {
+      if (el.childElementCount === 0 && visible(el) && (el.textContent || '').includes('Sedang Berlangsung') && ++n >= 2) return 'item';
+    }
+  }
+  return false;
+}
+"""
+
+
+def _wait_task_state(page: Page, wanted: list, timeout: int = 10000) -> Optional[str]:
+    """Block until the page is ready for one of `wanted` (or shows login/confirm). None on timeout."""
+    try:
+        return page.wait_for_function(_TASK_STATE_JS, arg=wanted, polling=100, timeout=timeout).json_value()
+    except PlaywrightTimeoutError:
+        return None
+
+
+# A confirm dialog that keeps coming back within one item is stuck; give up on the item
+MAX_CONFIRM_ATTEMPTS = 3
+
+
+def task_loop(page: Page, iterations: int, completed: int, total: int, progress_callback=None, on_logout=None) -> int:
+    """Submit `iterations` reviews as a state machine driven by what the page shows.
+
+    Each iteration is open item -> Kirim, and there are no fixed sleeps. The
+    confirm dialog is dismissed when it shows up, while the loop waits for
+    the next step, instead of being probed after every submit. Returns the
+    number of iterations done.
+    Per-iteration latency is reported as a 'task_loop' event.
+    """
+    done = 0
+    consecutive_failures = 0
+    latencies = []
+    while done < iterations:
+        started = time.monotonic()
+        print(f"Loop ke-{done+1} (Total progress: {completed + done + 1}/{total})")
+
+        step = 'item'
+        confirms = 0
+        while step != 'done':
+            state = _wait_task_state(page, [step])
+            if state == 'login':
+                if not on_logout or not on_logout():
+                    step = 'abort'
+                    break
+                step = 'item'
+                continue
+            if state == 'confirm':
+                confirms += 1
+                if confirms > MAX_CONFIRM_ATTEMPTS:
+                    print("Dialog konfirmasi nggak mau hilang.")
+                    break
+                try:
+                    page.get_by_role("button", name="Mengonfirmasi").click(timeout=1500)
+                except Exception:
+                    pass
+                continue
+            if state is None:
+                print("Elemen utama nggak ketemu (Timeout)." if step == 'item' else "Tombol Kirim tidak muncul (mungkin delay)")
+                break
+            try:
+                if state == 'item':
+                    page.get_by_text("Sedang Berlangsung").nth(1).click()
+                    step = 'kirim'
+                else:
+                    page.get_by_role("button", name="Kirim").click()
+                    step = 'done'
+            except PlaywrightTimeoutError:
+                print("Klik gagal (Timeout).")
+                break
+
+        if step == 'abort':
+            break
+        if step != 'done':
+            consecutive_failures += 1
+            # Too many failures in a row: break early so the cli.py retry (which resumes from progress) takes over
+            if consecutive_failures >= 3:
+                print("Terlalu banyak kegagalan berturut-turut. Breaking loop untuk restart.")
+                break
+            continue
+
+        consecutive_failures = 0
+        done += 1
+        latencies.append(time.monotonic() - started)
+        if progress_callback:
+            try: progress_callback(completed + done, total)
+            except: pass
+
+    if latencies:
+        ordered = sorted(latencies)
+        emit('task_loop', f"{len(latencies)} iterations, avg {sum(latencies) / len(latencies):.2f}s",
+             iterations=len(latencies), avg=round(sum(latencies) / len(latencies), 3),
+             p50=round(ordered[len(ordered) // 2], 3), max=round(ordered[-1], 3))
+    return done
+
+
 def perform_tasks(page: Page, context, phone: str, password: str, iterations: int, review_text: Optional[str] = None, progress_callback=None) -> Tuple[int, int]:
     """
     Executes the main automation loop: checking progress, submitting reviews.
@@ -231,9 +410,10 @@ def perform_tasks(page: Page, context, phone: str, password: str, iterations: in
     def resurrect_session():
         """Helper to re-login if session is lost."""
         print("⚠️ Session lost! Attempting to resurrect...")
-        if login(page, context, phone, password):
+        SESSIONS.record_invalid(phone)
+        if login(page, context, phone, password, relogin=True):
             print("🚀 Session resurrected! Navigating back to grab...")
-            page.goto("https://mba7.com/#/grab", timeout=45000)
+            page.goto(page_url("grab"), timeout=45000)
             page.wait_for_timeout(3000)
             try_close_popups(page)
             return True
@@ -243,24 +423,17 @@ def perform_tasks(page: Page, context, phone: str, password: str, iterations: in
     print("Navigating to tasks page...")
     try:
         # Try direct goto first
-        page.goto("https://mba7.com/#/grab", timeout=45000)
+        page.goto(page_url("grab"), timeout=45000)
         page.wait_for_timeout(3000)
         try_close_popups(page)
         
         # If not on grab page, try clicking icon-ticket (legacy flow)
         if "grab" not in page.url and "ticket" not in page.url:
             print("  Not on grab page, trying icon-ticket navigation...")
-            ticket_selectors = [
-                ".van-badge__wrapper.van-icon.van-icon-undefined.item-icon.iconfont.icon-ticket",
-                ".icon-ticket",
-                "[class*='icon-ticket']"
-            ]
-            for selector in ticket_selectors:
-                btn = page.locator(selector).first
-                if btn.count() > 0 and btn.is_visible(timeout=3000):
-                    btn.click()
-                    page.wait_for_timeout(3000)
-                    break
+            btn = selector_cache.find(page, 'ticket_icon', TICKET_SELECTORS, timeout=3000)
+            if btn:
+                btn.click()
+                page.wait_for_timeout(3000)
 
         print("Tasks page check done.")
     except Exception as e:
@@ -270,7 +443,30 @@ def perform_tasks(page: Page, context, phone: str, password: str, iterations: in
             resurrect_session()
 
     # ========== SCRAPE ACTUAL PROGRESS FROM PAGE ==========
-    # ... (skipping for brevity but keeping implementation)
+    # Server-side progress decides what is left, so a retried run only does the rest
+    if "login" in page.url:
+        resurrect_session()
+    progress = scrape_progress(page, 3000)
+    if progress is None:
+        # Pivot not rendered on the grab page: read it from the ticket page and come back
+        try:
+            page.goto(page_url("ticket"), timeout=45000)
+            progress = scrape_progress(page, 5000)
+            page.goto(page_url("grab"), timeout=45000)
+            page.wait_for_timeout(2000)
+            try_close_popups(page)
+        except Exception as e:
+            print(f"Could not read starting progress: {e}")
+    if progress:
+        tasks_completed, tasks_total = progress
+        print(f"Starting progress from page: {tasks_completed}/{tasks_total}")
+        emit('tasks', f"Starting at {tasks_completed}/{tasks_total}", completed=tasks_completed, total=tasks_total)
+        if tasks_completed >= tasks_total:
+            print(f"All tasks already completed ({tasks_completed}/{tasks_total}). Skipping automation.")
+            if progress_callback:
+                try: progress_callback(tasks_completed, tasks_total)
+                except: pass
+            return tasks_completed, tasks_total
 
     # ========== PERTAMA KALI ISI REVIEW ==========
     loop_count = 0
@@ -281,17 +477,11 @@ def perform_tasks(page: Page, context, phone: str, password: str, iterations: in
         if tasks_completed < tasks_total:
             # Click Mendapatkan button (button 1: Grab/List)
             try:
-                # 1. Try User's Simple Selector first
-                btn = page.get_by_role("button", name="Mendapatkan").first
-                if btn.count() > 0 and btn.is_visible(timeout=5000):
-                    btn.click()
-                    print("Klik Mendapatkan (Role/Name) OK")
-                else:
-                    # 2. Try Specific CSS selector fallback
-                    btn = page.locator("#app > div > div.van-config-provider.provider-box > div.main-wrapper.travel-bg > div.div-flex-center > button").first
-                    btn.wait_for(state="visible", timeout=5000)
+                # Role/name first, specific CSS fallback; the registry tries the last winner first
+                btn = selector_cache.find(page, 'grab_button', GRAB_BUTTON_SELECTORS)
+                if btn:
                     btn.click()
-                    print("Klik Mendapatkan (CSS) OK")
+                    print("Klik Mendapatkan OK")
             except Exception as e:
                 # ... (error handling)
                 pass
@@ -302,17 +492,10 @@ def perform_tasks(page: Page, context, phone: str, password: str, iterations: in
 
             # Click Mendapatkan button on work/detail page (button 2)
             try:
-                # Same: Try simple role first
-                btn = page.get_by_role("button", name="Mendapatkan").first
-                if btn.count() > 0 and btn.is_visible(timeout=5000):
-                    btn.click()
-                    print("Klik Mendapatkan (Detail Role) OK")
-                else:
-                    # Text based fallback
-                    btn = page.locator("button:has-text('Mendapatkan')").first
-                    btn.wait_for(state="visible", timeout=5000)
+                btn = selector_cache.find(page, 'work_grab_button', WORK_GRAB_BUTTON_SELECTORS)
+                if btn:
                     btn.click()
-                    print("Klik Mendapatkan (Detail Text) OK")
+                    print("Klik Mendapatkan (Detail) OK")
             except Exception as e:
                 # ...
                 pass
@@ -348,10 +531,7 @@ def perform_tasks(page: Page, context, phone: str, password: str, iterations: in
                 page.get_by_role("button", name="Kirim").click()
             except: pass
 
-            try:
-                page.get_by_role("button", name="Mengonfirmasi").click()
-            except PlaywrightTimeoutError:
-                pass
+            # The confirm dialog (if any) is dismissed by task_loop while it waits for the next item
 
             # ========== LOOP KIRIM ULANG ==========
             # Calculate remaining iterations
@@ -366,64 +546,8 @@ def perform_tasks(page: Page, context, phone: str, password: str, iterations: in
                 try: progress_callback(tasks_completed + 1, tasks_total)
                 except: pass
             
-            consecutive_failures = 0
-            
-            for i in range(remaining_iterations):
-                # CHECK FOR LOGOUT AT START OF EACH LOOP
-                if "login" in page.url:
-                    if not resurrect_session():
-                        break
-
-                current_completed = tasks_completed + i + 2
-                print(f"Loop ke-{i+1} (Total progress: {current_completed}/{tasks_total})")
-                page.wait_for_timeout(1000) # Slight delay
-
-                try:
-                    # Robust clicking: find element, ensuring it's enabled
-                    el = page.get_by_text("Sedang Berlangsung").nth(1)
-                    if el.is_visible():
-                        el.click()
-                        
-                        # Wait for Kirim button
-                        k_btn = page.get_by_role("button", name="Kirim")
-                        if k_btn.is_visible(timeout=2000):
-                            k_btn.click()
-                            loop_count += 1
-                            consecutive_failures = 0 # Reset failure count
-                            
-                            # CALLBACK HERE for real-time update
-                            if progress_callback:
-                                try: progress_callback(current_completed, tasks_total)
-                                except: pass
-
-                        else:
-                             print("Tombol Kirim tidak muncul (mungkin delay)")
-                             if "login" in page.url:
-                                 resurrect_session()
-                    else:
-                        if "login" in page.url:
-                            resurrect_session()
-                        else:
-                            print("Elemen utama hidden/hilang")
-                            consecutive_failures += 1
-                        
-                except PlaywrightTimeoutError:
-                    if "login" in page.url:
-                        resurrect_session()
-                    else:
-                        print("Elemen utama nggak ketemu (Timeout).")
-                        consecutive_failures += 1
-                
-                # Self-healing: if too many consecutive failures, refresh and trying to recover would be complex here as state is lost
-                # Instead, we break early to trigger the outer retry loop in cli.py which is safer
-                if consecutive_failures >= 3:
-                     print("Terlalu banyak kegagalan berturut-turut. Breaking loop untuk restart.")
-                     break
-
-                try:
-                    page.get_by_role("button", name="Mengonfirmasi").click(timeout=1500)
-                except:
-                    pass
+            loop_count += task_loop(page, remaining_iterations, tasks_completed + 1, tasks_total,
+                                    progress_callback=progress_callback, on_logout=resurrect_session)
         else:
             print(f"All tasks already completed ({tasks_completed}/{tasks_total}). Skipping automation.")
             loop_count = 0
@@ -477,29 +601,37 @@ def perform_tasks(page: Page, context, phone: str, password: str, iterations: in
     return tasks_completed, tasks_total
 
 
-def run(playwright: Playwright, phone: str, password: str, headless: bool = False, slow_mo: int = 200, iterations: int = 30, review_text: Optional[str] = None, sync_only: bool = False, progress_callback=None) -> Tuple[int, int, float, float, float, float, list]:
-    browser = playwright.chromium.launch(
-        headless=headless, 
-        slow_mo=slow_mo,
-        args=[
-            "--disable-gpu",
-            "--disable-dev-shm-usage",
-            "--no-sandbox",
-            "--disable-setuid-sandbox",
-            "--disable-extensions",
-            "--no-first-run",
-            "--no-default-browser-check",
-            "--js-flags=\"--max-old-space-size=256\"",
-            "--disable-blink-features=AutomationControlled"
-        ]
-    )
-    
+BROWSER_ARGS = [
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-extensions",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--js-flags=\"--max-old-space-size=256\"",
+    "--disable-blink-features=AutomationControlled"
+]
+
+
+def launch_browser(playwright: Playwright, headless: bool = True, slow_mo: int = 200):
+    """Launch Chromium with the low-memory flags used for every run."""
+    # Count/time Page and Locator calls (no-op when MBA_INSTRUMENT=0, idempotent)
+    instrument.install()
+    return playwright.chromium.launch(headless=headless, slow_mo=slow_mo, args=BROWSER_ARGS)
+
+
+def new_account_page(browser, phone: str, timeout: int = 30, use_session: bool = True, block_profile: Optional[str] = None):
+    """Create an isolated context (with the phone's stored session) and a page. Returns (context, page).
+
+    block_profile names a blocking.PROFILES entry (default: MBA_BLOCK_PROFILE or "standard").
+    """
     # Default professional mobile viewport
     vp = {"width": 390, "height": 844}
     
     # Check for existing session
     session_path = get_session_path(phone)
-    storage_state = session_path if os.path.exists(session_path) else None
+    storage_state = session_path if use_session and os.path.exists(session_path) else None
     
     if storage_state:
         print(f"Attempting to load session from {storage_state}")
@@ -512,98 +644,263 @@ def run(playwright: Playwright, phone: str, password: str, headless: bool = Fals
         # Fallback to no session
         context = browser.new_context(viewport=vp)
 
+    # Serve unchanged JS/CSS bundles from disk. Routes run newest first, so the
+    # blocking profile below sees requests first and falls back to the cache.
+    if os.getenv("MBA_ASSET_CACHE", "1") != "0":
+        asset_cache.install(context)
+
+    # OPTIMIZATION: Block heavy resources to save RAM, CPU, and Battery
+    # (context-level, so every page of this account gets the same profile)
+    blocking.install(context, block_profile)
+
     page = context.new_page()
 
     # Set timeout (convert to ms)
-    timeout = 30
     page.set_default_timeout(timeout * 1000) 
+    return context, page
+
+
+def close_account_context(context) -> None:
+    """Close a context from new_account_page(), reporting what its blocking profile saved."""
+    stats = blocking.pop_stats(context)
+    if stats:
+        emit('blocking', f"Blocked {stats['blocked']} requests ({stats['profile']}/{stats['mode']})", **stats)
+    cached = asset_cache.pop_stats(context)
+    if cached:
+        emit('asset_cache', f"Assets served from cache: {cached['hits'] + cached['revalidated']}, "
+             f"downloaded: {cached['misses']}", **cached)
+    context.close()
+
+
+def checked_in_today(calendar: list, today: Optional[date] = None) -> bool:
+    """True if today's day-of-month is in a scraped attendance calendar."""
+    today = today or date.today()
+    return today.day in (calendar or [])
 
-    # OPTIMIZATION: Block heavy resources to save RAM, CPU, and Battery
-    def intercept_route(route):
-        # Strictly block images, media, and fonts
-        # Blocking stylesheets can be risky for selectors but fonts/images/media are safe
-        if route.request.resource_type in ["image", "media", "font"]:
-            route.abort()
-        else:
-            route.continue_()
-    
-    page.route("**/*", intercept_route)
+
+def run(playwright: Playwright, phone: str, password: str, headless: bool = False, slow_mo: int = 200, iterations: int = 30, review_text: Optional[str] = None, sync_only: bool = False, progress_callback=None, checkin_state: Optional[Tuple[float, list]] = None, sync_plan: Optional[set] = None, phase_state: Optional[dict] = None) -> Tuple[int, int, float, float, float, float, list]:
+    """
+    Full account run: login, tasks (or progress read in sync mode), scrapers and check-in.
+    checkin_state is the stored (points, calendar) for this account; when it already
+    shows today as checked in, the points shop/calendar round-trip is skipped.
+    sync_plan (sync mode only) is the set of planner.SOURCES to scrape; skipped
+    sources come back as 0 and the caller keeps the stored values.
+    phase_state is filled with each completed phase's result; pass the same dict
+    to a retry and those phases are reused instead of scraped again.
+    Raises retry.LoginFailed if the account cannot be logged in.
+    """
+    done = phase_state if phase_state is not None else {}
+
+    def wants(source):
+        return not sync_only or sync_plan is None or source in sync_plan
+
+    stored_points, stored_calendar = checkin_state or (0.0, [])
+    if sync_only and sync_plan is not None and not sync_plan:
+        print("Sync plan is empty (all data fresh), skipping browser.")
+        emit('run', "Nothing stale, sync skipped", skipped=True)
+        return 0, iterations, 0.0, 0.0, 0.0, stored_points, stored_calendar
+    if sync_only and sync_plan is not None:
+        print(f"Sync plan: {', '.join(s for s in SOURCES if s in sync_plan)}")
+
+    timeout = 30
+    # Set up inside the try below, so the finally closes whatever was opened
+    browser = context = page = None
+    # Watches the Chromium process tree; see recycle_if_needed()
+    monitor = ResourceMonitor()
+    recycles = 0
+    # Navigation/wait/locator counters and the optional MBA_PROFILE capture
+    counters_before = instrument.COUNTERS.snapshot()
+    profiler = instrument.Profiler(phone)
+
+    def recycle_if_needed(next_phase):
+        """Between phases: restart the browser if it outgrew its memory budget."""
+        nonlocal browser, context, page, recycles
+        if not monitor.over_budget:
+            return
+        print(f"♻️ Browser over memory budget ({monitor.last_rss // 1048576} MB), recycling before {next_phase}...")
+        emit('resources', f"Recycling browser before {next_phase}", level='WARNING',
+             rss_mb=monitor.last_rss // 1048576, next_phase=next_phase)
+        close_account_context(context)
+        context = None
+        browser.close()
+        browser = launch_browser(playwright, headless, slow_mo)
+        context, page = new_account_page(browser, phone, timeout)
+        monitor.reset_budget()
+        recycles += 1
+        # The session saved at login is fresh, so this does not hit the login form
+        if not login(page, context, phone, password, timeout):
+            emit('resources', f"Login failed after recycling before {next_phase}", level='ERROR')
+            raise LoginFailed(f"Login failed for {phone} after recycling the browser")
 
     try:
+        browser = launch_browser(playwright, headless, slow_mo)
+        context, page = new_account_page(browser, phone, timeout)
+        monitor.start()
+        profiler.start()
+
         # ========== LOGIN ==========
         # Login now handles restoration check AND saving to 'context'
-        if not login(page, context, phone, password, timeout):
+        with span('login') as ev:
+            ev['ok'] = login(page, context, phone, password, timeout)
+        if not ev['ok']:
             print("Login failed, aborting run.")
-            return 0, iterations, 0.0, 0.0, 0.0, 0.0, []
+            emit('run', "Login failed, aborting run.", level='ERROR')
+            raise LoginFailed(f"Login failed for {phone}")
 
         # ========== PERFORM TASKS ==========
         tasks_completed, tasks_total = 0, iterations
-        if not sync_only:
-            tasks_completed, tasks_total = perform_tasks(page, context, phone, password, iterations, review_text, progress_callback=progress_callback)
-        else:
+        if not sync_only and 'tasks' in done:
+            tasks_completed, tasks_total = done['tasks']
+            print(f"Tasks already completed in an earlier attempt ({tasks_completed}/{tasks_total}).")
+        elif not sync_only:
+            # Tasks change the balance and progress: values from an earlier attempt are stale now
+            done.pop('balance', None)
+            done.pop('progress', None)
+            with span('tasks') as ev:
+                tasks_completed, tasks_total = perform_tasks(page, context, phone, password, iterations, review_text, progress_callback=progress_callback)
+                ev.update(completed=tasks_completed, total=tasks_total)
+            if tasks_total and tasks_completed >= tasks_total:
+                done['tasks'] = (tasks_completed, tasks_total)
+        elif 'progress' in done:
+            tasks_completed, tasks_total = done['progress']
+        elif wants('progress'):
             print("Sync only mode: checking current progress...")
-            try:
-                # Direct navigation is more reliable than clicking icons
-                page.goto("https://mba7.com/#/ticket", timeout=timeout*1000)
-                page.wait_for_timeout(4000)
-                from .scraper import try_close_popups
-                try_close_popups(page)
-                
-                # Look for progress text (usually "X/Y")
-                progress_element = page.locator(".van-progress__pivot").first
-                if progress_element.count() > 0:
-                    progress_text = progress_element.text_content(timeout=5000)
-                    if progress_text and "/" in progress_text:
-                        parts = progress_text.split("/")
-                        tasks_completed = int(parts[0].strip())
-                        tasks_total = int(parts[1].strip())
+            with span('progress') as ev:
+                try:
+                    # Direct navigation is more reliable than clicking icons
+                    page.goto(page_url("ticket"), timeout=timeout*1000)
+                    page.wait_for_timeout(4000)
+                    if "login" in page.url.lower():
+                        # Session was trusted without a probe but has gone stale
+                        print("  Redirected to login, re-authenticating...")
+                        SESSIONS.record_invalid(phone)
+                        if login(page, context, phone, password, timeout, relogin=True):
+                            page.goto(page_url("ticket"), timeout=timeout*1000)
+                            page.wait_for_timeout(4000)
+                    from .scraper import try_close_popups
+                    try_close_popups(page)
+                    
+                    # Look for progress text (usually "X/Y")
+                    progress = scrape_progress(page, 5000)
+                    if progress:
+                        tasks_completed, tasks_total = progress
                         print(f"  ✓ Current progress detected: {tasks_completed}/{tasks_total}")
-                else:
-                    # Alternative: check record status count if pivot not found?
-                    # For now, if not found, we assume 0 or keep what we have
-                    pass
-            except Exception as e:
-                print(f"  ✗ Could not read progress during sync: {e}")
+                except Exception as e:
+                    print(f"  ✗ Could not read progress during sync: {e}")
+                    emit('progress', f"Could not read progress during sync: {e}", level='WARNING')
+                ev.update(completed=tasks_completed, total=tasks_total)
+            if tasks_total:
+                done['progress'] = (tasks_completed, tasks_total)
 
         # ========== SCRAPE DATA ==========
-        print("Scraping income from deposit records...")
-        income = scrape_income(page, timeout)
+        recycle_if_needed('income')
+        # Values found by an earlier attempt of this run are kept (see phase_state).
+        # A scrape that returned counts as done, 0 included (an account can have
+        # no income); save_progress decides whether a 0 replaces the stored value
+        income = done.get('income', 0.0)
+        withdrawal = done.get('withdrawal', 0.0)
+        balance = done.get('balance', 0.0)
+        if wants('income') and 'income' not in done:
+            print("Scraping income from deposit records...")
+            with span('income') as ev:
+                income = ev['income'] = scrape_income(page, timeout)
+            done['income'] = income
         
-        print("Scraping withdrawal from withdrawal records...")
-        withdrawal = scrape_withdrawal(page, timeout)
-
-        print("Scraping balance from profile...")
-        if sync_only:
-            # STABLE SYNC: Double-check logic to ensure balance isn't changing
-            print("  Performing STABLE SYNC check (Double Scrape)...")
-            b1 = scrape_balance(page, timeout)
-            
-            # Initial wait
-            page.wait_for_timeout(5000)
-            b2 = scrape_balance(page, timeout)
-            
-            if abs(b1 - b2) > 0.01:
-                print(f"  Balance unstable (diff: {b2-b1}). Waiting for final check...")
-                page.wait_for_timeout(5000)
-                balance = scrape_balance(page, timeout)
-            else:
-                print("  Balance stable.")
-                balance = b2
-        else:
-            balance = scrape_balance(page, timeout)
+        recycle_if_needed('withdrawal')
+        if wants('withdrawal') and 'withdrawal' not in done:
+            print("Scraping withdrawal from withdrawal records...")
+            with span('withdrawal') as ev:
+                withdrawal = ev['withdrawal'] = scrape_withdrawal(page, timeout)
+            done['withdrawal'] = withdrawal
+
+        recycle_if_needed('balance')
+        if wants('balance') and 'balance' not in done:
+            print("Scraping balance from profile...")
+            with span('balance') as ev:
+                if sync_only:
+                    # STABLE SYNC: watch the balance settle in one page load, starting
+                    # from the URL/selector that worked last time for this account
+                    hint = SESSIONS.get(phone).get('balance_hint')
+                    balance, found = scrape_stable_balance(page, timeout, hint)
+                    if found and found != hint:
+                        SESSIONS.remember(phone, 'balance_hint', found)
+                    ev['hint_hit'] = bool(found and found == hint)
+                    if not found:
+                        # Page layout not recognised in-page, use the slow path
+                        balance = scrape_balance(page, timeout)
+                else:
+                    balance = scrape_balance(page, timeout)
+                ev['balance'] = balance
+            done['balance'] = balance
 
         # ========== CHECK-IN & POINTS ==========
+        recycle_if_needed('checkin')
         # Always run check-in/points scrape unless explicitly disabled (not yet implemented)
         # Check-in logic already handles if already checked in
-        points, calendar = perform_checkin(page)
+        if checkin_state and checked_in_today(checkin_state[1]):
+            print("Already checked in today (stored calendar), skipping check-in.")
+            points, calendar = checkin_state
+            emit('checkin', "Skipped, already checked in today", skipped=True)
+        elif not wants('checkin'):
+            points, calendar = stored_points, stored_calendar
+        elif 'checkin' in done:
+            points, calendar = done['checkin']
+        else:
+            with span('checkin') as ev:
+                points, calendar = perform_checkin(page)
+                ev.update(points=points, calendar_days=len(calendar))
+            if calendar:
+                done['checkin'] = (points, calendar)
         
         # Return progress with income, withdrawal, balance, points, and calendar
         print(f"Returning final progress: {tasks_completed}/{tasks_total}, Points: {points}, Calendar days: {len(calendar)}")
+        emit('run', "Run finished", completed=tasks_completed, total=tasks_total, balance=balance, points=points)
         return tasks_completed, tasks_total, income, withdrawal, balance, points, calendar
 
     finally:
-        context.close()
-        browser.close()
+        usage = monitor.stop()
+        emit('resources', f"Peak browser RSS {usage['peak_rss_mb']} MB, CPU {usage['peak_cpu']}%",
+             recycles=recycles, **usage)
+        counters = instrument.COUNTERS.delta(counters_before)
+        profile_path = profiler.stop()
+        print(f"⏱ {instrument.summary_line(counters)}" + (f", profile: {profile_path}" if profile_path else ""))
+        emit('instrument', instrument.summary_line(counters), profile=profile_path,
+             hottest=instrument.COUNTERS.hottest(counters_before), **counters)
+        selector_cache.REGISTRY.flush()
+        if context is not None:
+            close_account_context(context)
+        if browser is not None:
+            browser.close()
+
 
 
 
+
+def refresh_session(playwright: Playwright, phone: str, password: str, headless: bool = True, slow_mo: int = 0) -> bool:
+    """Replace a stored session with a freshly logged-in one (used for off-peak refreshes)."""
+    browser = launch_browser(playwright, headless, slow_mo)
+    context, page = new_account_page(browser, phone, use_session=False)
+    try:
+        with span('session_refresh') as ev:
+            ev['ok'] = login(page, context, phone, password, relogin=True)
+        return ev['ok']
+    finally:
+        close_account_context(context)
+        browser.close()
+
+
+def checkin_account(browser, phone: str, password: str, timeout: int = 30) -> Optional[Tuple[float, list]]:
+    """Login and check in one account inside a shared browser. Returns (points, calendar) or None."""
+    context, page = new_account_page(browser, phone, timeout)
+    try:
+        with span('login') as ev:
+            ev['ok'] = login(page, context, phone, password, timeout)
+        if not ev['ok']:
+            print(f"Login failed for {phone}, skipping check-in.")
+            return None
+        with span('checkin') as ev:
+            points, calendar = perform_checkin(page)
+            ev.update(points=points, calendar_days=len(calendar))
+        return points, calendar
+    finally:
+        close_account_context(context)
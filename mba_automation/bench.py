@@ -0,0 +1,167 @@
+"""End-to-end benchmark of automation.run() against the local mock site.
+
+    python -m mba_automation.bench --accounts 1,10,50 --modes task,sync --latency 80
+    python -m mba_automation.bench --accounts 10 --compare bench_results/bench_20260101_120000.json
+
+Each (mode, account count) combination runs that many simulated accounts one
+after another, like cli.main() does, and records per-phase timings (from the
+structured events), total time, accounts/hour, peak browser RSS and the number
+of requests the mock site served. Results are written as JSON for comparing
+runs over time; --compare exits non-zero when a combination got slower than
+the tolerance allows.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import tempfile
+
+RESULTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "bench_results"))
+
+
+def _stats(values: list) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'mean': round(sum(ordered) / len(ordered), 3),
+        'p50': round(ordered[len(ordered) // 2], 3),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'max': round(ordered[-1], 3),
+    }
+
+
+def run_combination(playwright, site, mode: str, count: int, iterations: int, headless: bool = True) -> dict:
+    """Run `count` simulated accounts in one mode and summarise them."""
+    from . import automation, events
+
+    phases = {}
+    peaks = []
+    failures = 0
+
+    def on_event(record):
+        if record.get('duration') is not None:
+            phases.setdefault(record['phase'], []).append(record['duration'])
+        if record.get('phase') == 'resources' and record.get('peak_rss_mb') is not None:
+            peaks.append(record['peak_rss_mb'])
+
+    site.accounts = {}
+    requests_before = site.requests
+    events.add_listener(on_event)
+    started = time.monotonic()
+    per_account = []
+    try:
+        for n in range(count):
+            phone = f"81{n:08d}"
+            events.set_context(phone=phone)
+            t0 = time.monotonic()
+            try:
+                automation.run(playwright, phone, site.fixtures['password'], headless=headless, slow_mo=0,
+                               iterations=iterations, sync_only=(mode == 'sync'))
+            except Exception as e:
+                failures += 1
+                print(f"  {phone}: {e}")
+            per_account.append(time.monotonic() - t0)
+    finally:
+        events.remove_listener(on_event)
+    total = time.monotonic() - started
+    requests = site.requests - requests_before
+    return {
+        'mode': mode,
+        'accounts': count,
+        'total_s': round(total, 2),
+        'per_account': _stats(per_account),
+        'accounts_per_hour': round(count / total * 3600, 1) if total else None,
+        'phases': {name: _stats(values) for name, values in sorted(phases.items())},
+        'peak_rss_mb': max(peaks) if peaks else None,
+        'requests': requests,
+        'requests_per_account': round(requests / count, 1) if count else 0,
+        'failures': failures,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Combinations whose mean per-account time regressed by more than `tolerance` (fraction)."""
+    previous = {(r['mode'], r['accounts']): r for r in baseline.get('runs', [])}
+    regressions = []
+    for run in results['runs']:
+        old = previous.get((run['mode'], run['accounts']))
+        if not old or not old.get('per_account') or not run.get('per_account'):
+            continue
+        before, after = old['per_account']['mean'], run['per_account']['mean']
+        if before and after > before * (1 + tolerance):
+            regressions.append({'mode': run['mode'], 'accounts': run['accounts'],
+                                'before': before, 'after': after, 'change': round(after / before - 1, 3)})
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark automation.run() against the local mock site")
+    parser.add_argument("--accounts", default="1,10,50", help="Comma-separated account counts")
+    parser.add_argument("--modes", default="task,sync", help="Comma-separated modes (task, sync)")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--latency", type=int, default=50, help="Mock site latency per request (ms)")
+    parser.add_argument("--jitter", type=int, default=0)
+    parser.add_argument("--popups", action="store_true")
+    parser.add_argument("--balance-settle", type=int, default=0)
+    parser.add_argument("--no-headless", dest="headless", action="store_false")
+    parser.add_argument("--out", default=None, help="Result file (default bench_results/bench_<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier result file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before --compare fails")
+    args = parser.parse_args()
+
+    from .mock_site import MockSite, serve
+    site = MockSite(latency_ms=args.latency, jitter_ms=args.jitter, popups=args.popups,
+                    balance_settle_ms=args.balance_settle)
+    server, base_url = serve(site)
+
+    # Keep the benchmark away from real sessions, events and learned selectors.
+    # These must be set before the automation modules are imported.
+    workdir = tempfile.mkdtemp(prefix="mba-bench-")
+    os.environ["MBA_BASE_URL"] = base_url
+    os.environ.setdefault("MBA_SESSION_DIR", os.path.join(workdir, "sessions"))
+    os.environ.setdefault("MBA_EVENTS_DIR", os.path.join(workdir, "events"))
+    os.environ.setdefault("MBA_ASSET_CACHE_DIR", os.path.join(workdir, "assets"))
+
+    from playwright.sync_api import sync_playwright
+
+    results = {
+        'started': datetime.datetime.now().isoformat(timespec='seconds'),
+        'config': {k: getattr(args, k) for k in ('accounts', 'modes', 'iterations', 'latency', 'jitter', 'popups', 'balance_settle')},
+        'python': sys.version.split()[0],
+        'runs': [],
+    }
+    counts = [int(c) for c in args.accounts.split(",") if c.strip()]
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    try:
+        with sync_playwright() as playwright:
+            for mode in modes:
+                for count in counts:
+                    print(f"▶ {mode} x {count} accounts...")
+                    run = run_combination(playwright, site, mode, count, args.iterations, args.headless)
+                    results['runs'].append(run)
+                    print(f"  {run['total_s']}s total, {run['accounts_per_hour']} accounts/h, "
+                          f"{run['requests_per_account']} requests/account, peak RSS {run['peak_rss_mb']} MB")
+    finally:
+        server.shutdown()
+
+    out = args.out or os.path.join(RESULTS_DIR, f"bench_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {out}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"⚠️ Regression: {r['mode']} x {r['accounts']}: {r['before']}s -> {r['after']}s per account (+{r['change']:.0%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
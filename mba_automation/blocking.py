@@ -0,0 +1,100 @@
+import os
+import re
+
+# Resource blocking profiles, applied per browser context.
+#   types:      Playwright resource types aborted when routing through Python
+#   extensions: URL suffixes aborted in pattern-only mode (no Python call for allowed requests)
+#   hosts:      domains (and subdomains) aborted in both modes
+_ANALYTICS_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "facebook.net", "facebook.com", "hotjar.com", "clarity.ms", "cnzz.com", "baidu.com",
+)
+_IMAGE_EXT = ("png", "jpg", "jpeg", "gif", "webp", "avif", "bmp", "ico", "svg")
+_FONT_EXT = ("woff", "woff2", "ttf", "otf", "eot")
+_MEDIA_EXT = ("mp4", "webm", "mp3", "ogg", "wav", "m4a")
+
+PROFILES = {
+    # What every run blocked before profiles existed
+    "minimal": {
+        "types": ("image", "media", "font"),
+        "extensions": _IMAGE_EXT + _FONT_EXT + _MEDIA_EXT,
+        "hosts": (),
+    },
+    # Also drop analytics/ad trackers; nothing the automation reads depends on them
+    "standard": {
+        "types": ("image", "media", "font"),
+        "extensions": _IMAGE_EXT + _FONT_EXT + _MEDIA_EXT,
+        "hosts": _ANALYTICS_HOSTS,
+    },
+    # Also drop manifests, text tracks and server-sent event streams
+    "lean": {
+        "types": ("image", "media", "font", "manifest", "texttrack", "eventsource"),
+        "extensions": _IMAGE_EXT + _FONT_EXT + _MEDIA_EXT + ("webmanifest",),
+        "hosts": _ANALYTICS_HOSTS,
+    },
+    # Also drop stylesheets. Visibility checks depend on CSS, so only for flows
+    # that read text without waiting for elements to become visible.
+    "strict": {
+        "types": ("image", "media", "font", "manifest", "texttrack", "eventsource", "stylesheet"),
+        "extensions": _IMAGE_EXT + _FONT_EXT + _MEDIA_EXT + ("webmanifest", "css"),
+        "hosts": _ANALYTICS_HOSTS,
+    },
+}
+
+DEFAULT_PROFILE = os.getenv("MBA_BLOCK_PROFILE", "standard")
+# "python" inspects every request's resource type; "pattern" only routes URLs
+# matching the profile's extensions/hosts, so allowed requests never reach Python
+ROUTING_MODE = os.getenv("MBA_BLOCK_ROUTING", "python")
+
+# Blocked-request counters per live context, keyed by id(context)
+_stats = {}
+
+
+def _host_re(hosts):
+    if not hosts:
+        return None
+    alt = "|".join(re.escape(h) for h in hosts)
+    return re.compile(rf"^[a-z]+://([^/?#]*\.)?({alt})(:\d+)?([/?#]|$)", re.IGNORECASE)
+
+
+def _ext_re(extensions):
+    alt = "|".join(re.escape(e) for e in extensions)
+    return re.compile(rf"\.({alt})([?#].*)?$", re.IGNORECASE)
+
+
+def install(context, profile: str = None, mode: str = None) -> dict:
+    """Install a blocking profile on a browser context. Returns its live counters."""
+    name = profile or DEFAULT_PROFILE
+    spec = PROFILES.get(name) or PROFILES["standard"]
+    mode = mode or ROUTING_MODE
+    stats = {"profile": name, "mode": mode, "blocked": 0, "by_type": {}}
+    _stats[id(context)] = stats
+    hosts = _host_re(spec["hosts"])
+    types = set(spec["types"])
+
+    def block(route):
+        rtype = route.request.resource_type
+        stats["blocked"] += 1
+        stats["by_type"][rtype] = stats["by_type"].get(rtype, 0) + 1
+        route.abort()
+
+    if mode == "pattern":
+        context.route(_ext_re(spec["extensions"]), block)
+        if hosts:
+            context.route(hosts, block)
+        return stats
+
+    def intercept_route(route):
+        if route.request.resource_type in types or (hosts and hosts.match(route.request.url)):
+            block(route)
+        else:
+            # Let earlier routes (the asset cache) handle it, else the network
+            route.fallback()
+
+    context.route("**/*", intercept_route)
+    return stats
+
+
+def pop_stats(context) -> dict:
+    """Counters for a context that is about to close (empty dict if none were installed)."""
+    return _stats.pop(id(context), {})
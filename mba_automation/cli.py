@@ -9,9 +9,14 @@ import argparse
 import time
 import gc
 from playwright.sync_api import sync_playwright
-from .automation import run as automation_run
+from .automation import run as automation_run, refresh_session, launch_browser, checkin_account, checked_in_today
+from . import events, retry
+from .planner import SOURCES, plan_sync
 
-ACCOUNTS_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'accounts.json'))
+# MBA_ACCOUNTS_FILE: remote workers run the CLI against a per-job copy (see remote_worker.py)
+ACCOUNTS_FILE = os.getenv('MBA_ACCOUNTS_FILE') or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'accounts.json'))
+# Shared by every account and CLI process (state lives in sessions/circuit.json)
+BREAKER = retry.CircuitBreaker()
 
 # Global state for signal handler
 current_run_data = {
@@ -23,7 +28,9 @@ current_run_data = {
     'balance': 0.0,
     'points': 0.0,
     'calendar': [],
-    'is_sync': False
+    'is_sync': False,
+    'checkin_only': False,
+    'synced_sources': []
 }
 
 def normalize_phone(phone: str) -> str:
@@ -34,6 +41,33 @@ def normalize_phone(phone: str) -> str:
     elif p.startswith('8'): p = '62' + p
     return p
 
+def load_account(phone: str) -> dict:
+    """Read the stored account entry for phone from accounts.json (empty dict if missing)."""
+    target = normalize_phone(phone)
+    try:
+        with open(ACCOUNTS_FILE, 'r') as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                accounts = json.load(f)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    except Exception:
+        return {}
+    return next((a for a in accounts if normalize_phone(a.get('phone')) == target), {})
+
+def stored_checkin_state(acc: dict, today: datetime.date = None):
+    """(points, calendar) from the newest daily_progress entry of this month, or None."""
+    today = today or datetime.date.today()
+    month = today.strftime('%Y-%m')
+    dp = acc.get('daily_progress', {}) or {}
+    for day in sorted(dp.keys(), reverse=True):
+        if not day.startswith(month):
+            break
+        entry = dp[day]
+        if entry.get('calendar'):
+            return float(entry.get('points', 0.0) or 0.0), list(entry['calendar'])
+    return None
+
 def save_progress() -> None:
     """Atomically save current progress to accounts.json."""
     data = current_run_data
@@ -55,6 +89,19 @@ def save_progress() -> None:
                             acc['daily_progress'] = {}
                         
                         existing = acc['daily_progress'].get(today, {})
+
+                        if data.get('checkin_only'):
+                            # Check-in batch: only points/calendar change, keep everything else
+                            entry = dict(existing) or {'date': today, 'completed': 0, 'total': 0, 'percentage': 0}
+                            if data['points'] > 0 or 'points' not in entry:
+                                entry['points'] = data['points']
+                            if data['calendar'] or 'calendar' not in entry:
+                                entry['calendar'] = data['calendar']
+                            acc['daily_progress'][today] = entry
+                            if data['calendar']:
+                                acc.setdefault('sync_sources', {})['checkin'] = datetime.datetime.now().isoformat()
+                            updated = True
+                            break
                         
                         # Sticky Progress
                         final_completed = max(data['completed'], existing.get('completed', 0))
@@ -83,6 +130,10 @@ def save_progress() -> None:
                         acc['last_sync_ts'] = ts
                         if not data['is_sync']:
                             acc['last_run_ts'] = ts
+                        # Per-source freshness for the sync planner
+                        sources = acc.setdefault('sync_sources', {})
+                        for src in data.get('synced_sources') or []:
+                            sources[src] = ts
                         
                         acc['is_syncing'] = False
                         updated = True
@@ -124,7 +175,7 @@ def main() -> None:
     # allow multiple phones via repeated --phone or comma-separated --phones
     parser.add_argument("--phone", dest="phones", action="append", help="Phone number (can be provided multiple times; overrides .env)")
     parser.add_argument("--phones", dest="phones_csv", help="Comma-separated phone numbers (overrides .env)")
-    parser.add_argument("--password", help="Password (overrides .env)")
+    parser.add_argument("--password", action="append", help="Password (overrides .env); repeat once per --phone for per-account passwords")
     # allow explicit --headless / --no-headless and default to environment or True
     group = parser.add_mutually_exclusive_group()
     group.add_argument("--headless", dest="headless", action="store_true", help="Run browser headless")
@@ -134,6 +185,9 @@ def main() -> None:
     parser.add_argument("--iterations", type=int, default=30, help="Number of review loops")
     parser.add_argument("--review", type=str, default=None, help="Optional review text to submit")
     parser.add_argument("--sync", action="store_true", help="Sync financial data only (skips tasks loop)")
+    parser.add_argument("--refresh-session", action="store_true", help="Only log in again and save a fresh session")
+    parser.add_argument("--checkin-only", action="store_true", help="Only do the daily check-in, for all phones in one shared browser")
+    parser.add_argument("--full-sync", action="store_true", help="With --sync: scrape every source instead of only the stale ones")
     args = parser.parse_args()
 
     # load .env if present
@@ -154,26 +208,23 @@ def main() -> None:
     if env_phones:
         phones.extend([p.strip() for p in env_phones.split(",") if p.strip()])
 
-    password = args.password or os.getenv("MBA_PASSWORD")
+    passwords = args.password or ([os.getenv("MBA_PASSWORD")] if os.getenv("MBA_PASSWORD") else [])
 
-    if not phones or not password:
+    if not phones or not passwords:
         print("ERROR: at least one phone and a password must be provided via args or .env (MBA_PHONE or MBA_PHONES, MBA_PASSWORD)")
         return
 
+    # Either one password shared by every phone or exactly one per phone
+    if len(passwords) not in (1, len(phones)):
+        print(f"ERROR: got {len(passwords)} passwords for {len(phones)} phones; pass one --password per --phone (or a single shared one)")
+        return
+
+    def password_for(idx):
+        return passwords[idx] if len(passwords) == len(phones) else passwords[0]
+
     # run automation sequentially for each phone
     with sync_playwright() as playwright:
-        # SYSTEM CLEANUP: Delete logs older than 3 days
-        LOGS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'logs'))
-        if os.path.exists(LOGS_DIR):
-            print("🧹 Cleaning up old logs...")
-            now = time.time()
-            for f in os.listdir(LOGS_DIR):
-                f_path = os.path.join(LOGS_DIR, f)
-                if os.path.isfile(f_path) and os.stat(f_path).st_mtime < now - 3 * 86400:
-                    try: 
-                        os.remove(f_path)
-                        print(f"  Removed old log: {f}")
-                    except: pass
+        # Log cleanup is owned by the webapp's retention sweep (utils/log_retention.py)
 
         # Decide final headless setting: CLI flag > env var > default True
         env_headless = os.getenv("MBA_HEADLESS")
@@ -188,8 +239,59 @@ def main() -> None:
             parsed = env_bool(env_headless)
             final_headless = True if parsed is None else bool(parsed)
 
-        for phone in phones:
+        if args.refresh_session:
+            for idx, phone in enumerate(phones):
+                events.set_context(phone=normalize_phone(phone))
+                print(f"Refreshing session for {phone}...")
+                ok = refresh_session(playwright, phone, password_for(idx), headless=final_headless, slow_mo=args.slow_mo)
+                print(f"{'✅' if ok else '❌'} Session refresh {'done' if ok else 'failed'} for {phone}")
+            return
+
+        if args.checkin_only:
+            # One browser for every account; each gets its own context
+            browser = launch_browser(playwright, final_headless, args.slow_mo)
+            try:
+                for idx, phone in enumerate(phones):
+                    events.set_context(phone=normalize_phone(phone))
+                    known = stored_checkin_state(load_account(phone))
+                    if known and checked_in_today(known[1]):
+                        print(f"✓ {phone} already checked in today, skipping.")
+                        events.emit('checkin', "Skipped, already checked in today", skipped=True)
+                        continue
+                    print(f"Check-in for {phone}...")
+                    try:
+                        result = checkin_account(browser, phone, password_for(idx))
+                    except Exception as e:
+                        # One broken account must not cost the rest of the batch
+                        print(f"❌ Check-in failed for {phone}: {e}")
+                        events.emit('checkin', f"Check-in failed: {e}", level='ERROR', ok=False, error=type(e).__name__)
+                        continue
+                    if result is None:
+                        continue
+                    current_run_data.update({
+                        'phone': phone,
+                        'points': result[0],
+                        'calendar': result[1],
+                        'is_sync': True,
+                        'checkin_only': True
+                    })
+                    save_progress()
+            finally:
+                browser.close()
+            return
+
+        for idx, phone in enumerate(phones):
+            password = password_for(idx)
             print(f"Starting automation for {phone} (headless={final_headless})")
+            events.set_context(phone=normalize_phone(phone))
+            events.emit('start', f"Starting {'sync' if args.sync else 'automation'} for {phone}", sync=args.sync)
+
+            acc = load_account(phone)
+            checkin_state = stored_checkin_state(acc)
+            sync_plan = None
+            if args.sync and not args.full_sync:
+                sync_plan = plan_sync(acc, checked_in=bool(checkin_state and checked_in_today(checkin_state[1])))
+            planned = sorted(sync_plan) if sync_plan is not None else list(SOURCES)
             
             current_run_data.update({
                 'phone': phone,
@@ -200,20 +302,23 @@ def main() -> None:
                 'balance': 0.0,
                 'points': 0.0,
                 'calendar': [],
-                'is_sync': args.sync
+                'is_sync': args.sync,
+                'checkin_only': False,
+                'synced_sources': []
             })
             
             max_retries = 5
             attempt = 0
+            login_failures = 0
+            # Phases finished by earlier attempts are reused, not redone (see automation.run)
+            phase_state = {}
             while attempt < max_retries:
                 attempt += 1
+                # Site-wide outage detected (by this or another process): wait it out
+                BREAKER.wait_if_open()
                 if attempt > 1:
-                    print(f"🔄 Retry attempt {attempt}/{max_retries} for {phone}...")
-                    
-                    # Connection Check
-                    if not check_internet_connection():
-                        print("⚠️ No internet connection detected. Waiting 30s...")
-                        time.sleep(30)
+                    print(f"🔄 Retry attempt {attempt}/{max_retries} for {phone} (done: {', '.join(phase_state) or 'nothing'})...")
+                    events.emit('retry', f"Retry attempt {attempt}/{max_retries}", level='WARNING', attempt=attempt, resumed=sorted(phase_state))
                 
                 def on_prog(c, t):
                     current_run_data.update({
@@ -222,12 +327,15 @@ def main() -> None:
                     })
                     save_progress()
 
+                error = None
                 try:
                     c, t, i, w, b, p, cal = automation_run(
                         playwright, phone=phone, password=password, 
                         headless=final_headless, slow_mo=args.slow_mo, 
                         iterations=args.iterations, review_text=args.review, 
-                        sync_only=args.sync, progress_callback=on_prog
+                        sync_only=args.sync, progress_callback=on_prog,
+                        checkin_state=checkin_state, sync_plan=sync_plan,
+                        phase_state=phase_state
                     )
                     
                     # Update global data for persistence
@@ -238,24 +346,53 @@ def main() -> None:
                         'withdrawal': w,
                         'balance': b,
                         'points': p,
-                        'calendar': cal
+                        'calendar': cal,
+                        # Only sources whose scrape completed count as fresh
+                        # (automation.run records those in phase_state)
+                        'synced_sources': [s for s in planned if s in phase_state]
                     })
+                    # The site answered, whatever the task outcome
+                    BREAKER.record_success()
                     
                     if args.sync or (c >= t and t > 0):
                         print(f"✅ {'SYNC' if args.sync else 'SUCCESS'} for {phone}")
-                        # COOL DOWN: Give the CPU a break before next account
-                        if phone != phones[-1]:
+                        events.emit('result', f"{'SYNC' if args.sync else 'SUCCESS'} for {phone}", completed=c, total=t, attempt=attempt)
+                        # COOL DOWN: Give the CPU a break before next account (nothing to cool down after an empty plan)
+                        if phone != phones[-1] and sync_plan != set():
                             print("❄️ Cooling down for 15s...")
                             time.sleep(15)
                         # Explicit Memory Flush
                         gc.collect()
                         break
                     
-                    print(f"⚠️ Incomplete: {c}/{t}. Retrying in 5s...")
-                    time.sleep(5)
+                    print(f"⚠️ Incomplete: {c}/{t}.")
                 except Exception as e:
-                    print(f"❌ Error: {e}. Retrying in 5s...")
-                    time.sleep(5)
+                    error = e
+                    print(f"❌ Error: {e}.")
+
+                failure = retry.classify(error, online=error is None or check_internet_connection())
+                if BREAKER.record_failure(failure):
+                    print("⛔ Repeated site failures, opening circuit breaker.")
+                events.emit('result', f"{failure}: {error or 'incomplete'}", level='WARNING' if error is None else 'ERROR',
+                            failure=failure, attempt=attempt, completed=current_run_data['completed'], total=current_run_data['total'])
+                if failure == retry.LOGIN:
+                    login_failures += 1
+                    if login_failures >= retry.MAX_LOGIN_FAILURES:
+                        print(f"❌ Login keeps failing for {phone}, giving up on this account.")
+                        break
+                if attempt >= max_retries:
+                    break
+                if failure == retry.NETWORK:
+                    # Wait for our own connection instead of burning attempts on it
+                    waited = 0
+                    while not check_internet_connection() and waited < 600:
+                        print("⚠️ No internet connection detected. Waiting...")
+                        pause = retry.backoff(attempt, failure)
+                        time.sleep(pause)
+                        waited += pause
+                delay = retry.backoff(attempt, failure)
+                print(f"   Retrying in {delay:.0f}s ({failure})...")
+                time.sleep(delay)
             
             save_progress()
 
@@ -0,0 +1,125 @@
+"""Structured JSON-lines run events.
+
+Every event is one JSON object per line in logs/events/YYYY-MM-DD.jsonl:
+    {"ts": "...", "level": "INFO", "phone": "628...", "run_id": "...",
+     "phase": "login", "msg": "...", "duration": 1.23, ...counters}
+
+Human-readable print() output is unchanged; events are written alongside it
+so the webapp can filter runs without parsing free-form text.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import datetime
+from contextlib import contextmanager
+
+EVENTS_DIR = os.getenv('MBA_EVENTS_DIR') or os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'logs', 'events'))
+
+# In-process subscribers (benchmarks, metrics); called with every emitted record
+_listeners = []
+
+# Per-process context (the CLI handles one phone at a time)
+_context = {
+    'phone': None,
+    'run_id': os.getenv('MBA_RUN_ID') or None,
+}
+
+
+def set_context(phone=None, run_id=None):
+    """Set the phone/run id attached to subsequent events."""
+    if phone is not None:
+        _context['phone'] = phone
+    if run_id is not None:
+        _context['run_id'] = run_id
+    elif not _context['run_id']:
+        _context['run_id'] = uuid.uuid4().hex[:12]
+
+
+def add_listener(fn):
+    _listeners.append(fn)
+
+
+def remove_listener(fn):
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+
+def events_path(day=None):
+    day = day or datetime.date.today()
+    return os.path.join(EVENTS_DIR, f"{day.isoformat()}.jsonl")
+
+
+def write_event(record):
+    """Append a single record. One write() per line keeps concurrent writers from interleaving."""
+    line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode('utf-8')
+    try:
+        os.makedirs(EVENTS_DIR, exist_ok=True)
+        fd = os.open(events_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError:
+        # Never let telemetry break a run
+        pass
+
+
+def emit(phase, msg='', level='INFO', duration=None, **fields):
+    """Emit a structured event for the current phone/run."""
+    record = {
+        'ts': datetime.datetime.now().isoformat(timespec='milliseconds'),
+        'level': level,
+        'phone': fields.pop('phone', None) or _context['phone'],
+        'run_id': fields.pop('run_id', None) or _context['run_id'],
+        'phase': phase,
+        'msg': msg,
+    }
+    if duration is not None:
+        record['duration'] = round(duration, 3)
+    record.update(fields)
+    write_event(record)
+    for listener in list(_listeners):
+        try:
+            listener(record)
+        except Exception:
+            pass
+    return record
+
+
+@contextmanager
+def phase_event(phase, **fields):
+    """Emit one event when a phase finishes, with its duration.
+
+    The yielded dict can be filled with counters (e.g. completed/total).
+    """
+    counters = {}
+    start = time.monotonic()
+    try:
+        yield counters
+    except Exception as e:
+        emit(phase, f"{phase} failed: {e}", level='ERROR', duration=time.monotonic() - start, **fields, **counters)
+        raise
+    emit(phase, f"{phase} done", duration=time.monotonic() - start, **fields, **counters)
+
+
+class EventLogHandler(logging.Handler):
+    """logging.Handler that mirrors log records into the event stream."""
+
+    def __init__(self, phase='webapp', level=logging.INFO):
+        super().__init__(level)
+        self.phase = phase
+
+    def emit(self, record):
+        try:
+            write_event({
+                'ts': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+                'level': record.levelname,
+                'phone': getattr(record, 'phone', None),
+                'run_id': getattr(record, 'run_id', None),
+                'phase': self.phase,
+                'msg': record.getMessage(),
+            })
+        except Exception:
+            self.handleError(record)
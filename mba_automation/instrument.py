@@ -0,0 +1,187 @@
+"""Timing counters and optional profiling for the automation engine.
+
+install() wraps the Playwright Page/Locator methods at class level, so every
+navigation, wait, locator action and in-page evaluate is counted and timed
+without touching the call sites. span() is phase_event() plus the counter
+deltas of the phase; run() emits the per-run totals as an 'instrument' event,
+which the webapp serves from the event log.
+
+MBA_INSTRUMENT=0 disables the wrappers. MBA_PROFILE=cprofile (or pyinstrument,
+if installed) captures a profile of each run into logs/profiles/, which the
+webapp's log retention prunes with the run logs.
+"""
+import os
+import time
+import threading
+import datetime
+import functools
+from contextlib import contextmanager
+
+from .events import phase_event
+
+ENABLED = os.getenv("MBA_INSTRUMENT", "1") != "0"
+PROFILE = os.getenv("MBA_PROFILE", "").strip().lower()
+PROFILE_DIR = os.getenv("MBA_PROFILE_DIR") or os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "logs", "profiles"))
+
+# category -> methods, per Playwright class
+PAGE_METHODS = {
+    'navigation': ('goto', 'reload', 'go_back', 'go_forward'),
+    'wait': ('wait_for_timeout', 'wait_for_selector', 'wait_for_load_state', 'wait_for_function',
+             'wait_for_url', 'wait_for_event'),
+    'locator': ('click', 'fill', 'query_selector', 'query_selector_all'),
+    'evaluate': ('evaluate', 'evaluate_handle'),
+}
+LOCATOR_METHODS = {
+    'wait': ('wait_for',),
+    'locator': ('click', 'fill', 'type', 'press', 'check', 'count', 'is_visible', 'inner_text',
+                'text_content', 'inner_html', 'input_value', 'get_attribute', 'all_inner_texts',
+                'all_text_contents', 'scroll_into_view_if_needed'),
+    'evaluate': ('evaluate', 'evaluate_all'),
+}
+CATEGORIES = ('navigation', 'wait', 'locator', 'evaluate')
+
+_local = threading.local()
+
+
+class Counters:
+    """Call counts and seconds per category and per wrapped method."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods = {}  # 'Page.goto' -> [category, calls, seconds]
+
+    def add(self, category: str, method: str, seconds: float) -> None:
+        with self.lock:
+            entry = self.methods.setdefault(method, [category, 0, 0.0])
+            entry[1] += 1
+            entry[2] += seconds
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {m: (c, n, s) for m, (c, n, s) in self.methods.items()}
+
+    def delta(self, before: dict) -> dict:
+        """Flat counters since `before` (a snapshot), e.g. {'navigation_calls': 3, 'navigation_s': 1.2}."""
+        totals = {c: [0, 0.0] for c in CATEGORIES}
+        for method, (category, calls, seconds) in self.snapshot().items():
+            _, calls0, seconds0 = before.get(method, (category, 0, 0.0))
+            totals[category][0] += calls - calls0
+            totals[category][1] += seconds - seconds0
+        out = {}
+        for category, (calls, seconds) in totals.items():
+            out[f"{category}_calls"] = calls
+            out[f"{category}_s"] = round(seconds, 3)
+        return out
+
+    def hottest(self, before: dict, n: int = 5) -> list:
+        """The `n` methods that took the most time since `before`."""
+        rows = []
+        for method, (category, calls, seconds) in self.snapshot().items():
+            _, calls0, seconds0 = before.get(method, (category, 0, 0.0))
+            if calls > calls0:
+                rows.append({'method': method, 'calls': calls - calls0, 'seconds': round(seconds - seconds0, 3)})
+        rows.sort(key=lambda r: r['seconds'], reverse=True)
+        return rows[:n]
+
+
+COUNTERS = Counters()
+
+
+def _wrap(cls, name: str, category: str, counters: Counters) -> None:
+    original = getattr(cls, name, None)
+    if original is None or getattr(original, '_instrumented', False):
+        return
+    label = f"{cls.__name__}.{name}"
+
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        # Only the outermost call counts (e.g. a Page method implemented via a Locator)
+        if getattr(_local, 'active', False):
+            return original(*args, **kwargs)
+        _local.active = True
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            _local.active = False
+            counters.add(category, label, time.perf_counter() - start)
+
+    wrapper._instrumented = True
+    setattr(cls, name, wrapper)
+
+
+def install(page_cls=None, locator_cls=None, counters: Counters = None) -> bool:
+    """Wrap the Page and Locator methods in PAGE_METHODS / LOCATOR_METHODS (idempotent)."""
+    if not ENABLED and page_cls is None:
+        return False
+    if page_cls is None or locator_cls is None:
+        from playwright.sync_api import Page, Locator
+        page_cls, locator_cls = page_cls or Page, locator_cls or Locator
+    counters = counters or COUNTERS
+    for cls, table in ((page_cls, PAGE_METHODS), (locator_cls, LOCATOR_METHODS)):
+        for category, names in table.items():
+            for name in names:
+                _wrap(cls, name, category, counters)
+    return True
+
+
+@contextmanager
+def span(phase: str, **fields):
+    """phase_event() whose event also carries the navigation/wait/locator counters of the phase."""
+    before = COUNTERS.snapshot()
+    with phase_event(phase, **fields) as ev:
+        try:
+            yield ev
+        finally:
+            ev.update(COUNTERS.delta(before))
+
+
+def summary_line(counters: dict) -> str:
+    """One line for the run log, e.g. '12 navigations (8.1s), 40 waits (30.2s), ...'."""
+    labels = (('navigation', 'navigations'), ('wait', 'waits'), ('locator', 'locator calls'), ('evaluate', 'evaluates'))
+    return ", ".join(f"{counters.get(c + '_calls', 0)} {label} ({counters.get(c + '_s', 0):.1f}s)" for c, label in labels)
+
+
+class Profiler:
+    """Whole-run profile (cProfile or pyinstrument) written to PROFILE_DIR; a no-op unless enabled."""
+
+    def __init__(self, label: str, mode: str = None, out_dir: str = None):
+        self.label = label
+        self.mode = PROFILE if mode is None else mode
+        self.out_dir = out_dir or PROFILE_DIR
+        self._profiler = None
+
+    def start(self) -> "Profiler":
+        if self.mode == 'pyinstrument':
+            try:
+                import pyinstrument
+                self._profiler = pyinstrument.Profiler()
+                self._profiler.start()
+                return self
+            except ImportError:
+                print("pyinstrument is not installed, profiling with cProfile instead")
+                self.mode = 'cprofile'
+        if self.mode == 'cprofile':
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def stop(self):
+        """Write the profile; returns its path (None if profiling was off)."""
+        if self._profiler is None:
+            return None
+        profiler, self._profiler = self._profiler, None
+        stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        os.makedirs(self.out_dir, exist_ok=True)
+        if self.mode == 'pyinstrument':
+            profiler.stop()
+            path = os.path.join(self.out_dir, f"{self.label}_{stamp}.html")
+            with open(path, 'w') as f:
+                f.write(profiler.output_html())
+        else:
+            profiler.disable()
+            path = os.path.join(self.out_dir, f"{self.label}_{stamp}.prof")
+            profiler.dump_stats(path)
+        return path
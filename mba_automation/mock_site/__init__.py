@@ -0,0 +1,211 @@
+"""Local stand-in for mba7.com, for offline benchmarks and regression runs.
+
+Serves a small SPA (fixtures/) with the hash routes, labels and class names the
+automation uses (#/login, #/mine, #/grab, #/work, record pages, points shop and
+calendar), backed by an in-memory JSON API. Latency, popups, confirm dialogs and
+a late-settling balance can be configured. Point the automation at it with
+MBA_BASE_URL=http://127.0.0.1:<port>.
+"""
+import os
+import json
+import time
+import copy
+import base64
+import hashlib
+import random
+import calendar
+import datetime
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+STATIC_TYPES = {".js": "application/javascript", ".css": "text/css", ".html": "text/html; charset=utf-8"}
+MONTHS_ID = ["Januari", "Februari", "Maret", "April", "Mei", "Juni", "Juli",
+             "Agustus", "September", "Oktober", "November", "Desember"]
+
+
+def _b64(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+
+def make_token(phone: str, ttl: int, now: float = None) -> str:
+    """JWT-shaped (unsigned) token, so sessions.token_expiry() can read its exp."""
+    now = now or time.time()
+    return f"{_b64({'alg': 'none', 'typ': 'JWT'})}.{_b64({'sub': phone, 'exp': int(now + ttl)})}.mock"
+
+
+def _token_claims(token: str):
+    try:
+        payload = token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except Exception:
+        return None
+
+
+class MockSite:
+    """In-memory account state plus the knobs that shape responses."""
+
+    def __init__(self, fixtures: dict = None, latency_ms: int = 0, jitter_ms: int = 0, popups: bool = False,
+                 confirm_rate: float = 1.0, balance_settle_ms: int = 0, session_ttl: int = None):
+        if fixtures is None:
+            with open(os.path.join(FIXTURES_DIR, "state.json"), "r") as f:
+                fixtures = json.load(f)
+        self.fixtures = fixtures
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.popups = popups
+        self.confirm_rate = confirm_rate
+        self.balance_settle_ms = balance_settle_ms
+        self.session_ttl = session_ttl or fixtures.get("session_ttl", 86400)
+        self.accounts = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def account(self, phone: str) -> dict:
+        phone = phone[2:] if phone.startswith("62") else phone
+        with self.lock:
+            if phone not in self.accounts:
+                acc = copy.deepcopy(self.fixtures["default_account"])
+                acc.update(copy.deepcopy(self.fixtures.get("accounts", {}).get(phone, {})))
+                acc["total"] = self.fixtures["levels"].get(acc.get("level", "E2"), 30)
+                self.accounts[phone] = acc
+            return self.accounts[phone]
+
+    def delay(self) -> None:
+        ms = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+    def login(self, phone: str, password: str):
+        if not phone or password != self.fixtures.get("password"):
+            return None
+        self.account(phone)
+        return make_token(phone, self.session_ttl)
+
+    def authorized_phone(self, header: str):
+        if not header or not header.startswith("Bearer "):
+            return None
+        claims = _token_claims(header[7:])
+        if not claims or claims.get("exp", 0) < time.time():
+            return None
+        return claims.get("sub")
+
+    def state(self, phone: str, today: datetime.date = None) -> dict:
+        today = today or datetime.date.today()
+        acc = self.account(phone)
+        data = {k: v for k, v in acc.items() if k != "level"}
+        data["month_title"] = f"{MONTHS_ID[today.month - 1]} {today.year}"
+        data["days_in_month"] = calendar.monthrange(today.year, today.month)[1]
+        return data
+
+    def do_task(self, phone: str) -> dict:
+        acc = self.account(phone)
+        with self.lock:
+            if acc["completed"] < acc["total"]:
+                acc["completed"] += 1
+        return self.state(phone)
+
+    def checkin(self, phone: str, today: datetime.date = None) -> dict:
+        today = today or datetime.date.today()
+        acc = self.account(phone)
+        with self.lock:
+            if today.day not in acc["calendar"]:
+                acc["calendar"].append(today.day)
+                acc["points"] += 10
+        return self.state(phone, today)
+
+    def config(self) -> dict:
+        return {"popups": self.popups, "confirm_rate": self.confirm_rate, "balance_settle_ms": self.balance_settle_ms}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    site: MockSite = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json", headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, data, status: int = 200):
+        self._send(status, json.dumps(data).encode())
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return {}
+
+    def _static(self, name: str):
+        path = os.path.join(FIXTURES_DIR, name)
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except OSError:
+            return self._json({"msg": "not found"}, 404)
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self._send(200, body, STATIC_TYPES.get(os.path.splitext(name)[1], "application/octet-stream"),
+                   {"ETag": etag, "Cache-Control": "no-cache"})
+
+    def _authorized(self):
+        phone = self.site.authorized_phone(self.headers.get("Authorization"))
+        if not phone:
+            self._json({"code": 401, "msg": "Silakan login"}, 401)
+        return phone
+
+    def do_GET(self):
+        self.site.requests += 1
+        self.site.delay()
+        path = self.path.split("?")[0]
+        if path in ("/", "/index.html"):
+            return self._static("index.html")
+        if path.startswith("/static/"):
+            return self._static(os.path.basename(path))
+        if path == "/api/config":
+            return self._json(self.site.config())
+        if path in ("/api/state", "/api/user"):
+            phone = self._authorized()
+            if phone:
+                self._json(self.site.state(phone))
+            return
+        self._json({"msg": "not found"}, 404)
+
+    def do_POST(self):
+        self.site.requests += 1
+        self.site.delay()
+        path = self.path.split("?")[0]
+        if path == "/api/login":
+            body = self._body()
+            token = self.site.login(str(body.get("phone", "")), str(body.get("password", "")))
+            if not token:
+                return self._json({"code": 400, "msg": "Nomor telepon atau kata sandi salah"}, 200)
+            return self._json({"code": 200, "token": token})
+        phone = self._authorized()
+        if not phone:
+            return
+        if path == "/api/task":
+            return self._json(self.site.do_task(phone))
+        if path == "/api/checkin":
+            return self._json(self.site.checkin(phone))
+        self._json({"msg": "not found"}, 404)
+
+
+def serve(site: MockSite = None, host: str = "127.0.0.1", port: int = 0):
+    """Start the mock in a daemon thread. Returns (server, base_url)."""
+    site = site or MockSite()
+    handler = type("BoundMockHandler", (MockHandler,), {"site": site})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
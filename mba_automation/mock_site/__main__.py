@@ -0,0 +1,39 @@
+import json
+import time
+import argparse
+
+from . import MockSite, serve
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for mba7.com (offline benchmarks and regression runs)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=int, default=0, help="Added delay per request in ms")
+    parser.add_argument("--jitter", type=int, default=0, help="Random extra delay per request, up to this many ms")
+    parser.add_argument("--popups", action="store_true", help="Show an announcement popup on every page's first load")
+    parser.add_argument("--confirm-rate", type=float, default=1.0, help="Chance of a confirm dialog after each task")
+    parser.add_argument("--balance-settle", type=int, default=0, help="Show a placeholder balance for this many ms")
+    parser.add_argument("--session-ttl", type=int, default=None, help="Login token lifetime in seconds")
+    parser.add_argument("--fixtures", default=None, help="Alternative state.json")
+    args = parser.parse_args()
+
+    fixtures = None
+    if args.fixtures:
+        with open(args.fixtures, "r") as f:
+            fixtures = json.load(f)
+    site = MockSite(fixtures, latency_ms=args.latency, jitter_ms=args.jitter, popups=args.popups,
+                    confirm_rate=args.confirm_rate, balance_settle_ms=args.balance_settle,
+                    session_ttl=args.session_ttl)
+    server, url = serve(site, args.host, args.port)
+    print(f"Mock mba7 site on {url} (password: {site.fixtures.get('password')})")
+    print(f"Run the automation against it with MBA_BASE_URL={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+// Stand-in for the mba7.com SPA: same hash routes, labels and class names the
+// automation relies on, backed by the mock server's JSON API.
+(function () {
+  const app = document.getElementById('app');
+  const overlays = document.getElementById('overlay-root');
+  let config = { popups: false, confirm_rate: 1, balance_settle_ms: 0 };
+  const popupShown = {};
+
+  const show = (el, on) => { el.style.display = on ? '' : 'none'; };
+
+  function money(n) {
+    const [int, frac] = Number(n).toFixed(2).split('.');
+    return int.replace(/\B(?=(\d{3})+(?!\d))/g, '.') + ',' + frac;
+  }
+
+  async function api(path, body) {
+    const token = localStorage.getItem('token');
+    const headers = { 'Content-Type': 'application/json' };
+    if (token) headers.Authorization = 'Bearer ' + token;
+    const res = await fetch(path, { method: body ? 'POST' : 'GET', headers, body: body ? JSON.stringify(body) : undefined });
+    if (res.status === 401) {
+      localStorage.removeItem('token');
+      location.hash = '#/login';
+      throw new Error('unauthorized');
+    }
+    return res.json();
+  }
+
+  function dialog(label, onConfirm) {
+    const wrap = document.createElement('div');
+    wrap.innerHTML = '<div class="van-overlay"></div><div class="dialog"><p>Berhasil</p><button class="confirm">' + label + '</button></div>';
+    wrap.querySelector('.confirm').onclick = () => { wrap.remove(); if (onConfirm) onConfirm(); };
+    wrap.querySelector('.van-overlay').onclick = () => wrap.remove();
+    overlays.appendChild(wrap);
+  }
+
+  function maybePopup(route) {
+    if (!config.popups || popupShown[route]) return;
+    popupShown[route] = true;
+    const wrap = document.createElement('div');
+    wrap.innerHTML = '<div class="van-overlay"></div><div class="van-popup"><span class="van-popup__close-icon">x</span><p>Pengumuman</p></div>';
+    wrap.querySelector('.van-popup__close-icon').onclick = () => wrap.remove();
+    wrap.querySelector('.van-overlay').onclick = () => wrap.remove();
+    overlays.appendChild(wrap);
+  }
+
+  const pages = {
+    login() {
+      app.innerHTML = '<div class="login">' +
+        '<input type="text" aria-label="Nomor Telepon" placeholder="Nomor Telepon">' +
+        '<input type="password" aria-label="Kata Sandi" placeholder="Kata Sandi">' +
+        '<button class="login-btn">Masuk</button><p class="error"></p></div>';
+      app.querySelector('.login-btn').onclick = async () => {
+        const [phone, password] = Array.from(app.querySelectorAll('input')).map(i => i.value);
+        const res = await fetch('/api/login', { method: 'POST', body: JSON.stringify({ phone, password }) });
+        const data = await res.json();
+        if (!data.token) { app.querySelector('.error').textContent = data.msg || 'Gagal'; return; }
+        localStorage.setItem('token', data.token);
+        dialog('Mengonfirmasi', () => { location.hash = '#/mine'; });
+      };
+    },
+
+    async mine() {
+      const s = await api('/api/state');
+      app.innerHTML = '<div class="mine"><div class="label">Saldo Rekening</div>' +
+        '<div class="user-balance"></div><i class="icon-lipin">*</i> <span class="icon-ticket">T</span></div>';
+      const el = app.querySelector('.user-balance');
+      app.querySelector('.icon-ticket').onclick = () => { location.hash = '#/ticket'; };
+      if (config.balance_settle_ms > 0) {
+        // Like the real site: a placeholder first, the real balance a moment later
+        el.textContent = 'Rp ' + money(0);
+        setTimeout(() => { el.textContent = 'Rp ' + money(s.balance); }, config.balance_settle_ms);
+      } else {
+        el.textContent = 'Rp ' + money(s.balance);
+      }
+    },
+
+    async grab() {
+      const s = await api('/api/state');
+      app.innerHTML = '<div class="van-progress"><span class="van-progress__pivot">' + s.completed + '/' + s.total + '</span></div>' +
+        '<div class="div-flex-center"><button class="grab">Mendapatkan</button></div>';
+      app.querySelector('.grab').onclick = () => { location.hash = '#/work'; };
+    },
+
+    async work() {
+      const s = await api('/api/state');
+      app.innerHTML = '<button class="grab-detail">Mendapatkan</button><div class="tasks"></div>' +
+        '<div class="review-form"><input type="radio" name="star">' +
+        '<textarea aria-label="Harap masukkan ulasan Anda di sini"></textarea><button class="kirim">Kirim</button></div>';
+      const list = app.querySelector('.tasks');
+      const form = app.querySelector('.review-form');
+      show(form, false);
+      const renderList = (state) => {
+        list.innerHTML = state.completed >= state.total ? '<p>Semua tugas selesai</p>' :
+          [1, 2, 3].map(i => '<div class="task-item"><span class="task-name">Tugas ' + (state.completed + i) + '</span> <span class="task-status">Sedang Berlangsung</span></div>').join('');
+        list.querySelectorAll('.task-item').forEach(item => {
+          item.onclick = () => { show(list, false); show(form, true); };
+        });
+        show(list, true);
+      };
+      renderList(s);
+      app.querySelector('.kirim').onclick = async () => {
+        show(form, false);
+        const state = await api('/api/task', {});
+        renderList(state);
+        if (Math.random() < config.confirm_rate) dialog('Mengonfirmasi');
+      };
+    },
+
+    async record(kind) {
+      const s = await api('/api/state');
+      const rows = kind === 'deposit' ? s.deposits : s.withdrawals;
+      app.innerHTML = rows.map(r => '<div class="details-record-cell"><span class="record-status">' + r.status +
+        '</span> <span class="amount-change">' + r.amount + '</span></div>').join('') || '<p>Tidak ada data</p>';
+    },
+
+    async shop() {
+      const s = await api('/api/state');
+      app.innerHTML = '<div class="points-balance">' + money(s.points) + ' </div><div class="sign-in-container">Masuk</div>';
+      app.querySelector('.sign-in-container').onclick = () => openCalendar(s);
+    },
+  };
+
+  function openCalendar(s) {
+    const wrap = document.createElement('div');
+    const render = (state) => {
+      const days = [];
+      for (let d = 1; d <= state.days_in_month; d++) {
+        const signed = state.calendar.includes(d);
+        days.push('<div class="van-calendar__day' + (signed ? ' signed-day' : '') + '">' + d +
+          (signed ? '<div class="van-calendar__bottom-info">Masuk</div>' : '') + '</div>');
+      }
+      wrap.innerHTML = '<div class="van-overlay"></div><div class="van-popup van-calendar">' +
+        '<div class="van-calendar__month-title">' + state.month_title + '</div>' + days.join('') +
+        '<button class="van-calendar__confirm">Masuk</button></div>';
+      wrap.querySelector('.van-overlay').onclick = () => wrap.remove();
+      wrap.querySelector('.van-calendar__confirm').onclick = async () => {
+        const next = await api('/api/checkin', {});
+        dialog('Mengonfirmasi', () => {
+          render(next);
+          const points = document.querySelector('.points-balance');
+          if (points) points.textContent = money(next.points) + ' ';
+        });
+      };
+    };
+    render(s);
+    overlays.appendChild(wrap);
+  }
+
+  async function route() {
+    const hash = location.hash.replace(/^#\/?/, '') || 'mine';
+    overlays.innerHTML = '';
+    if (hash !== 'login' && !localStorage.getItem('token')) { location.hash = '#/login'; return; }
+    try {
+      if (hash === 'login') pages.login();
+      else if (hash === 'mine' || hash === 'me') await pages.mine();
+      else if (hash === 'grab' || hash === 'ticket') await pages.grab();
+      else if (hash.startsWith('work')) await pages.work();
+      else if (hash === 'amount/deposit/record') await pages.record('deposit');
+      else if (hash === 'amount/withdrawal/record') await pages.record('withdrawal');
+      else if (hash === 'points/shop') await pages.shop();
+      else app.innerHTML = '<p>404</p>';
+      if (hash !== 'login') maybePopup(hash);
+    } catch (e) { /* redirected to login */ }
+  }
+
+  window.addEventListener('hashchange', route);
+  fetch('/api/config').then(r => r.json()).then(c => { config = c; }).finally(route);
+})();
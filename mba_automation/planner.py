@@ -0,0 +1,76 @@
+import datetime
+from typing import Optional, Set
+
+# Data sources a sync can refresh, in the order run() scrapes them
+SOURCES = ('progress', 'income', 'withdrawal', 'balance', 'checkin')
+
+# Weekly payout day per tier (Mon=0), same table as webapp.calculate_estimation
+PAYOUT_WEEKDAY = {'E3': 2, 'E2': 3, 'E1': 4}
+
+# A source older than this is always refreshed
+MAX_AGE = {
+    'progress': datetime.timedelta(minutes=30),
+    'income': datetime.timedelta(hours=6),
+    'withdrawal': datetime.timedelta(hours=6),
+    'balance': datetime.timedelta(hours=1),
+}
+# Payouts move money, so refresh these much more often on the tier's payout day
+PAYOUT_DAY_MAX_AGE = {
+    'withdrawal': datetime.timedelta(minutes=30),
+    'balance': datetime.timedelta(minutes=15),
+}
+# Sources that a task run can change
+CHANGED_BY_TASKS = ('progress', 'balance')
+
+
+def _parse_ts(value) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_payout_day(level: Optional[str], now: datetime.datetime) -> bool:
+    return PAYOUT_WEEKDAY.get(str(level or '').upper()) == now.weekday()
+
+
+def plan_sync(acc: dict, now: Optional[datetime.datetime] = None, checked_in: bool = False) -> Set[str]:
+    """Decide which data sources a --sync run for this stored account should scrape.
+
+    A source is stale when it was never synced today, when a task run happened
+    after its last sync (progress/balance), when today is the tier's payout day
+    (withdrawal/balance, shorter max age), or simply when it is older than its
+    max age. Check-in is planned only if today is not yet checked in.
+    """
+    now = now or datetime.datetime.now()
+    synced = acc.get('sync_sources', {}) or {}
+    last_run = _parse_ts(acc.get('last_run_ts'))
+    payout_day = is_payout_day(acc.get('level'), now)
+    today_entry = (acc.get('daily_progress', {}) or {}).get(now.strftime('%Y-%m-%d'), {})
+
+    plan = set()
+    for source, max_age in MAX_AGE.items():
+        ts = _parse_ts(synced.get(source))
+        if ts is None or ts.date() != now.date():
+            plan.add(source)
+            continue
+        if source in CHANGED_BY_TASKS and last_run and last_run > ts:
+            plan.add(source)
+            continue
+        if payout_day and source in PAYOUT_DAY_MAX_AGE:
+            max_age = PAYOUT_DAY_MAX_AGE[source]
+        if now - ts > max_age:
+            plan.add(source)
+
+    # Finished for today and nothing ran since: progress cannot change any more
+    total = today_entry.get('total', 0)
+    if 'progress' in plan and total and today_entry.get('completed', 0) >= total:
+        ts = _parse_ts(synced.get('progress'))
+        if ts and ts.date() == now.date() and not (last_run and last_run > ts):
+            plan.discard('progress')
+
+    if not checked_in:
+        plan.add('checkin')
+    return plan
@@ -0,0 +1,173 @@
+"""Remote worker: pull jobs from a coordinator webapp and run them on this device.
+
+    python -m mba_automation.remote_worker --coordinator http://192.168.1.10:5000 --token <worker_token>
+
+The coordinator (a webapp with `worker_token` set) owns accounts.json and the
+schedule. Each claimed job comes with its CLI arguments and a copy of the
+accounts it touches; the CLI runs here against that copy (MBA_ACCOUNTS_FILE),
+and the log plus the updated accounts are posted back every few seconds and
+once more at the end. Sessions stay local to each device.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import requests
+
+from .resources import system_available_mb
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class CoordinatorClient:
+    """The /api/worker/* calls, with the shared token."""
+
+    def __init__(self, base_url: str, token: str, name: str, timeout: int = 15):
+        self.base_url = base_url.rstrip('/')
+        self.name = name
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['X-Worker-Token'] = token
+
+    def _post(self, path: str, payload: dict):
+        try:
+            return self.session.post(self.base_url + path, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"⚠️ Coordinator unreachable ({e})")
+            return None
+
+    def claim(self):
+        """The next job, None when there is none, or raises PermissionError on a bad token."""
+        resp = self._post('/api/worker/claim', {'worker': self.name})
+        if resp is None or resp.status_code == 204:
+            return None
+        if resp.status_code == 403:
+            raise PermissionError("Coordinator rejected the worker token")
+        if resp.status_code != 200:
+            print(f"⚠️ Claim failed: HTTP {resp.status_code}")
+            return None
+        return resp.json()
+
+    def progress(self, job_id: str, log: str, accounts):
+        """Returns True (delivered), False (not delivered) or 'cancel' (lease lost)."""
+        resp = self._post('/api/worker/progress', {'job_id': job_id, 'log': log, 'accounts': accounts})
+        if resp is None:
+            return False
+        if resp.status_code == 410:
+            return 'cancel'
+        return resp.status_code == 200
+
+    def result(self, job_id: str, returncode, log: str, accounts, attempts: int = 5) -> bool:
+        payload = {'job_id': job_id, 'returncode': returncode, 'log': log, 'accounts': accounts}
+        for attempt in range(attempts):
+            resp = self._post('/api/worker/result', payload)
+            if resp is not None and resp.status_code in (200, 410):
+                return resp.status_code == 200
+            time.sleep(min(60, 5 * 2 ** attempt))
+        return False
+
+
+def _read_new(path: str, offset: int):
+    with open(path, 'r', errors='replace') as f:
+        f.seek(offset)
+        text = f.read()
+        return text, f.tell()
+
+
+def _read_accounts(path: str):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Mid-write by the CLI; the next report picks it up
+        return None
+
+
+def run_job(client: CoordinatorClient, job: dict, heartbeat: int = 15):
+    """Run one claimed job to completion, reporting as it goes. Returns the CLI exit code."""
+    workdir = tempfile.mkdtemp(prefix='mba-job-')
+    accounts_file = os.path.join(workdir, 'accounts.json')
+    log_path = os.path.join(workdir, 'run.log')
+    with open(accounts_file, 'w') as f:
+        json.dump(job.get('accounts') or [], f, indent=2)
+    env = dict(os.environ)
+    env.update(job.get('env') or {})
+    env['MBA_ACCOUNTS_FILE'] = accounts_file
+
+    phones = ', '.join(a.get('phone', '?') for a in job.get('accounts') or []) or '?'
+    print(f"▶ Job {job['job_id']} ({job.get('kind')}) for {phones}")
+    offset = 0
+    with open(log_path, 'w') as log:
+        proc = subprocess.Popen([sys.executable] + list(job['args']), cwd=ROOT, stdout=log,
+                                stderr=subprocess.STDOUT, env=env)
+        while proc.poll() is None:
+            try:
+                proc.wait(timeout=heartbeat)
+            except subprocess.TimeoutExpired:
+                pass
+            if proc.returncode is not None:
+                break
+            log.flush()
+            chunk, new_offset = _read_new(log_path, offset)
+            delivered = client.progress(job['job_id'], chunk, _read_accounts(accounts_file))
+            if delivered == 'cancel':
+                print("⛔ Coordinator gave this job to another worker, stopping it.")
+                proc.terminate()
+                proc.wait()
+                shutil.rmtree(workdir, ignore_errors=True)
+                return proc.returncode
+            if delivered:
+                offset = new_offset
+
+    chunk, _ = _read_new(log_path, offset)
+    if client.result(job['job_id'], proc.returncode, chunk, _read_accounts(accounts_file)):
+        shutil.rmtree(workdir, ignore_errors=True)
+    else:
+        print(f"⚠️ Could not deliver the result; log and accounts kept in {workdir}")
+    print(f"✓ Job {job['job_id']} finished (rc={proc.returncode})")
+    return proc.returncode
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run automation jobs for a coordinator webapp")
+    parser.add_argument("--coordinator", default=os.getenv("MBA_COORDINATOR"), help="Coordinator URL, e.g. http://192.168.1.10:5000")
+    parser.add_argument("--token", default=os.getenv("MBA_WORKER_TOKEN"), help="The coordinator's worker_token")
+    parser.add_argument("--name", default=socket.gethostname(), help="Worker name shown on the coordinator")
+    parser.add_argument("--poll", type=int, default=10, help="Seconds between claims while idle")
+    parser.add_argument("--heartbeat", type=int, default=15, help="Seconds between progress reports")
+    parser.add_argument("--min-free-mb", type=float, default=250, help="Only claim jobs with this much memory available")
+    args = parser.parse_args()
+    if not args.coordinator or not args.token:
+        print("ERROR: --coordinator and --token (or MBA_COORDINATOR / MBA_WORKER_TOKEN) are required")
+        sys.exit(2)
+
+    client = CoordinatorClient(args.coordinator, args.token, args.name)
+    print(f"Worker {args.name} polling {client.base_url}")
+    while True:
+        available = system_available_mb()
+        if available is not None and available < args.min_free_mb:
+            time.sleep(args.poll)
+            continue
+        try:
+            job = client.claim()
+        except PermissionError as e:
+            print(f"❌ {e}")
+            time.sleep(60)
+            continue
+        if job is None:
+            time.sleep(args.poll)
+            continue
+        run_job(client, job, args.heartbeat)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,133 @@
+import os
+import time
+import threading
+from typing import Optional
+
+# Recycle the browser between phases once its process tree grows past this
+RSS_BUDGET_MB = int(os.getenv("MBA_BROWSER_RSS_MB", "700"))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _read_stat(pid: int):
+    """(ppid, utime + stime ticks) from /proc/<pid>/stat, or None."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces; fields resume after the last ')'
+    fields = data[data.rfind(')') + 2:].split()
+    try:
+        return int(fields[1]), int(fields[11]) + int(fields[12])
+    except (IndexError, ValueError):
+        return None
+
+
+def descendants(root: int) -> list:
+    """PIDs of every process below root (Playwright driver, Chromium and its renderers)."""
+    children = {}
+    try:
+        pids = [int(p) for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return []
+    for pid in pids:
+        stat = _read_stat(pid)
+        if stat:
+            children.setdefault(stat[0], []).append(pid)
+    found, stack = [], [root]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def system_available_mb() -> Optional[float]:
+    """MemAvailable from /proc/meminfo in MB (None where /proc is unavailable)."""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class ResourceMonitor:
+    """Samples RSS and CPU of this process's descendants (the browser tree) in a daemon thread.
+
+    Peaks are kept for the whole account run; `over_budget` turns true once a
+    sample exceeds the RSS budget and is reset by `reset_budget()` after the
+    caller recycled the browser.
+    """
+
+    def __init__(self, root: int = None, interval: float = 2.0, budget_mb: int = RSS_BUDGET_MB):
+        self.root = root or os.getpid()
+        self.interval = interval
+        self.budget = budget_mb * 1024 * 1024
+        self.peak_rss = 0
+        self.peak_cpu = 0.0
+        self.last_rss = 0
+        self.samples = 0
+        self.over_budget = False
+        self._ticks = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self, now: float = None) -> int:
+        """Take one sample; returns the tree's RSS in bytes."""
+        now = now or time.monotonic()
+        pids = descendants(self.root)
+        rss = sum(rss_bytes(p) for p in pids)
+        ticks = sum((_read_stat(p) or (0, 0))[1] for p in pids)
+        if self._ticks is not None and now > self._ticks[0]:
+            # Exited processes make the tick sum drop; skip that interval
+            cpu = max(0.0, (ticks - self._ticks[1]) / _CLK_TCK / (now - self._ticks[0]) * 100)
+            self.peak_cpu = max(self.peak_cpu, cpu)
+        self._ticks = (now, ticks)
+        self.last_rss = rss
+        self.peak_rss = max(self.peak_rss, rss)
+        self.samples += 1
+        if rss > self.budget:
+            self.over_budget = True
+        return rss
+
+    def reset_budget(self) -> None:
+        self.over_budget = False
+        self._ticks = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                pass
+
+    def start(self) -> "ResourceMonitor":
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> dict:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+        return self.summary()
+
+    def summary(self) -> dict:
+        return {
+            'peak_rss_mb': round(self.peak_rss / 1048576, 1),
+            'peak_cpu': round(self.peak_cpu, 1),
+            'samples': self.samples,
+        }
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import fcntl
+import random
+import re
+
+from .events import emit
+from .sessions import SESSION_DIR
+
+# Failure classes for a single account attempt
+NETWORK = 'network'   # our own connection is down
+SITE = 'site'         # mba7.com unreachable, erroring or its pages timing out
+LOGIN = 'login'       # credentials rejected / login form never completed
+PARTIAL = 'partial'   # run finished but not all tasks were done
+TRANSIENT = 'transient'  # an element wait/click timed out on an otherwise working page
+ERROR = 'error'       # anything else
+
+# (base seconds, cap seconds) of the exponential backoff per class
+BACKOFF = {
+    NETWORK: (15, 300),
+    SITE: (10, 300),
+    LOGIN: (20, 120),
+    PARTIAL: (5, 30),
+    TRANSIENT: (5, 30),
+    ERROR: (5, 60),
+}
+# Login failures rarely fix themselves; stop retrying an account after this many
+MAX_LOGIN_FAILURES = 2
+
+_NETWORK_MARKERS = ('ERR_INTERNET_DISCONNECTED', 'ERR_NAME_NOT_RESOLVED', 'ERR_NETWORK_CHANGED',
+                    'ERR_ADDRESS_UNREACHABLE', 'ERR_NETWORK_ACCESS_DENIED', 'ERR_PROXY_CONNECTION_FAILED')
+_SITE_MARKERS = ('ERR_CONNECTION_REFUSED', 'ERR_CONNECTION_RESET', 'ERR_CONNECTION_CLOSED',
+                 'ERR_EMPTY_RESPONSE', 'ERR_TIMED_OUT', 'ERR_SSL', 'ERR_HTTP_RESPONSE_CODE_FAILURE')
+# Only a page load timing out says something about the site; a locator or
+# selector wait timing out is one account's page (or a drifted selector) and
+# must not trip the breaker for everyone
+_NAVIGATION_TIMEOUT = re.compile(r"\b(page|frame)\.(goto|reload|go_back|go_forward|wait_for_load_state|wait_for_url)"
+                                 r":\s*Timeout|Navigation timeout", re.IGNORECASE)
+_TIMEOUT = re.compile(r"timeout", re.IGNORECASE)
+
+
+class LoginFailed(Exception):
+    """Raised by automation.run() when the account could not be logged in."""
+
+
+def classify(exc: Exception = None, online: bool = True) -> str:
+    """Map an attempt's exception (None = finished with partial progress) to a failure class."""
+    if exc is None:
+        return PARTIAL
+    if isinstance(exc, LoginFailed):
+        return LOGIN
+    text = str(exc)
+    if not online or any(m in text for m in _NETWORK_MARKERS):
+        return NETWORK
+    if any(m in text for m in _SITE_MARKERS) or _NAVIGATION_TIMEOUT.search(text):
+        return SITE
+    if _TIMEOUT.search(text):
+        return TRANSIENT
+    return ERROR
+
+
+def backoff(attempt: int, failure: str, rng=random) -> float:
+    """Exponential backoff with full jitter: uniform(base, min(cap, base * 2^(attempt-1)))."""
+    base, cap = BACKOFF.get(failure, BACKOFF[ERROR])
+    return rng.uniform(base, max(base, min(cap, base * 2 ** max(0, attempt - 1))))
+
+
+class CircuitBreaker:
+    """Pauses every account when the site looks down.
+
+    Consecutive SITE failures are counted across accounts and CLI processes in a
+    small flock-protected state file. After `threshold` of them the breaker opens
+    for a cooldown that doubles each time it re-opens; a success closes it.
+        {"failures": n, "trips": n, "open_until": ts}
+    """
+
+    def __init__(self, path: str = None, threshold: int = 3, cooldown: float = 60, max_cooldown: float = 1800):
+        self.path = path or os.path.join(SESSION_DIR, "circuit.json")
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+    def _update(self, fn):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or '{}')
+                except ValueError:
+                    state = {}
+                result = fn(state)
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def state(self) -> dict:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def remaining(self, now: float = None) -> float:
+        """Seconds until the breaker closes again (0 when closed)."""
+        now = now or time.time()
+        return max(0.0, self.state().get('open_until', 0) - now)
+
+    def record_success(self) -> None:
+        if self.state():
+            self._update(lambda state: state.clear())
+
+    def record_failure(self, failure: str, now: float = None) -> bool:
+        """Count a failure; returns True if this one opened the breaker."""
+        if failure != SITE:
+            return False
+        now = now or time.time()
+
+        def fn(state):
+            state['failures'] = state.get('failures', 0) + 1
+            if state['failures'] >= self.threshold and state.get('open_until', 0) <= now:
+                state['open_until'] = now + min(self.max_cooldown, self.cooldown * 2 ** state.get('trips', 0))
+                state['trips'] = state.get('trips', 0) + 1
+                state['failures'] = 0
+                return True
+            return False
+        return self._update(fn)
+
+    def wait_if_open(self, sleep=time.sleep) -> float:
+        """Block while the breaker is open. Returns how long we waited."""
+        wait = self.remaining()
+        if wait > 0:
+            print(f"⛔ Site looks down, pausing all accounts for {int(wait)}s...")
+            emit('circuit', f"Circuit open, pausing {int(wait)}s", level='WARNING', wait=round(wait))
+            sleep(wait)
+        return wait
@@ -1,27 +1,61 @@
 from playwright.sync_api import Page
 import re
+from . import selector_cache
+from .site import page_url
 
-def try_close_popups(page: Page) -> None:
-    """Helper to dismiss common overlays that might block scraping."""
-    popups = [
-        ".van-popup__close-icon", 
-        "button:has-text('Mengonfirmasi')", 
-        "button:has-text('Confirm')",
-        ".van-overlay"
-    ]
-    for selector in popups:
+# Known overlays, checked in this order. Entries are CSS selectors, or
+# "button:<text>" for a button whose label contains the text.
+POPUP_SELECTORS = [
+    ".van-popup__close-icon",
+    "button:Mengonfirmasi",
+    "button:Confirm",
+    ".van-overlay",
+]
+
+# Finds and clicks every visible known overlay in one round-trip; returns how many were clicked
+_CLOSE_POPUPS_JS = """
+(selectors) => {
+  const visible = el => el && el.offsetParent !== null && el.getClientRects().length > 0;
+  let clicked = 0;
+  for (const sel of selectors) {
+    let el = null;
+    if (sel.startsWith('button:')) {
+      const label = sel.slice(7);
+      el = Array.from(document.querySelectorAll('button')).find(b => visible(b) && (b.textContent || '').includes(label));
+    } else {
+      el = Array.from(document.querySelectorAll(sel)).find(visible);
+    }
+    if (el) { el.click(); clicked++; }
+  }
+  return clicked;
+}
+"""
+
+
+def try_close_popups(page: Page, max_passes: int = 3) -> int:
+    """Helper to dismiss common overlays that might block scraping.
+
+    All known overlays are checked with a single in-page query, so a page
+    without popups costs one evaluate and no waiting. Only when something was
+    clicked do we give the close animation a moment and look again (a closed
+    popup can reveal a stacked one). Returns the number of overlays clicked.
+    """
+    total = 0
+    for _ in range(max_passes):
         try:
-            el = page.locator(selector).first
-            if el.is_visible(timeout=500):
-                el.click()
-                page.wait_for_timeout(500)
-        except:
-            pass
+            clicked = page.evaluate(_CLOSE_POPUPS_JS, POPUP_SELECTORS)
+        except Exception:
+            break
+        if not clicked:
+            break
+        total += clicked
+        page.wait_for_timeout(500)
+    return total
 
 def scrape_record_page(page: Page, url_suffix: str, record_type: str, timeout: int = 30) -> float:
     """Generic function to scrape total amount from a record page."""
     try:
-        full_url = f"https://mba7.com/#/{url_suffix}"
+        full_url = page_url(url_suffix)
         print(f"  Navigating to {record_type} page: {full_url}")
         page.goto(full_url, wait_until="domcontentloaded", timeout=timeout * 1000)
         
@@ -84,10 +118,75 @@ def scrape_income(page: Page, timeout: int = 30) -> float:
 def scrape_withdrawal(page: Page, timeout: int = 30) -> float:
     return scrape_record_page(page, "amount/withdrawal/record", "withdrawal", timeout)
 
+BALANCE_URLS = [page_url("mine"), page_url("me")]
+BALANCE_SELECTORS = [".user-balance", ".balance-amount", ".amount-value"]
+# Pseudo-selector for the "Saldo Rekening Rp ..." text fallback
+BALANCE_TEXT_FALLBACK = "text:Saldo Rekening"
+
+# Watches the balance element in-page until its text has stopped changing.
+# The quiet window doubles on every change (up to maxWait), so a balance that is
+# still being filled in by the SPA gets more time than one that rendered final.
+_WATCH_BALANCE_JS = """
+([selectors, settle, maxWait]) => new Promise(resolve => {
+  const start = Date.now();
+  const read = () => {
+    for (const sel of selectors) {
+      if (sel.startsWith('text:')) {
+        const m = (document.body.innerText || '').match(/Saldo Rekening\\s*Rp\\s*([\\d.,]+)/);
+        if (m) return [sel, m[1]];
+        continue;
+      }
+      const el = document.querySelector(sel);
+      if (el && el.offsetParent !== null && /\\d/.test(el.textContent || '')) return [sel, el.textContent];
+    }
+    return [null, null];
+  };
+  let [selector, last] = read();
+  let changedAt = start, changes = 0, quiet = settle;
+  const tick = () => {
+    const [sel, text] = read();
+    const now = Date.now();
+    if (text !== last) {
+      last = text; selector = sel; changedAt = now; changes++;
+      quiet = Math.min(quiet * 2, maxWait);
+    }
+    if ((last && now - changedAt >= quiet) || now - start >= maxWait) {
+      resolve({selector, text: last, changes, waited: now - start});
+    } else {
+      setTimeout(tick, 100);
+    }
+  };
+  tick();
+})
+"""
+
+
+def parse_balance_text(balance_text: str) -> float:
+    """Parse an Indonesian/English formatted money string ("Rp 1.234.567", "1,234.56") into a float."""
+    # Robust cleaning: remove everything except digits, commas and dots
+    cleaned = re.sub(r'[^\d.,]', '', balance_text or '')
+
+    # Standardize to dot decimal: handle "1.234.567" or "1,234.56"
+    if ',' in cleaned and '.' in cleaned:
+        if cleaned.rfind(',') > cleaned.rfind('.'):
+            cleaned = cleaned.replace('.', '').replace(',', '.')
+        else:
+            cleaned = cleaned.replace(',', '')
+    elif ',' in cleaned:
+        cleaned = cleaned.replace(',', '.')
+    elif cleaned.count('.') > 1:
+        # Multiple dots mean they are thousands separators (eg 1.000.000)
+        cleaned = cleaned.replace('.', '')
+    try:
+        return float(cleaned)
+    except ValueError:
+        return 0.0
+
+
 def scrape_balance(page: Page, timeout: int) -> float:
     """Scrapes balance with retries and popup handling."""
     # Try both /mine and /me as the profile page URL
-    urls = ["https://mba7.com/#/mine", "https://mba7.com/#/me"]
+    urls = BALANCE_URLS
     
     for url in urls:
         for attempt in range(2):
@@ -97,14 +196,8 @@ def scrape_balance(page: Page, timeout: int) -> float:
                 page.wait_for_timeout(2500)
                 try_close_popups(page)
                 
-                # Try multiple selectors for balance
-                selectors = [".user-balance", ".balance-amount", ".amount-value"]
-                balance_el = None
-                for selector in selectors:
-                    el = page.locator(selector).first
-                    if el.count() > 0 and el.is_visible(timeout=2000):
-                        balance_el = el
-                        break
+                # Try multiple selectors for balance, last winner first
+                balance_el = selector_cache.find(page, 'balance', BALANCE_SELECTORS, timeout=2000)
                 
                 if not balance_el:
                     # Fallback: look for text "Saldo Rekening" and get next sibling or parent's child
@@ -126,33 +219,67 @@ def scrape_balance(page: Page, timeout: int) -> float:
                 
                 if balance_text:
                     print(f"  Raw balance text: {balance_text}")
-                    # Robust cleaning: remove everything except digits, commas and dots
-                    cleaned = re.sub(r'[^\d.,]', '', balance_text)
-                    
-                    # Standardize to dot decimal: handle "1.234.567" or "1,234.56"
-                    if ',' in cleaned and '.' in cleaned:
-                        if cleaned.rfind(',') > cleaned.rfind('.'):
-                            cleaned = cleaned.replace('.', '').replace(',', '.')
-                        else:
-                            cleaned = cleaned.replace(',', '')
-                    elif ',' in cleaned:
-                        cleaned = cleaned.replace(',', '.')
-                    elif cleaned.count('.') > 1:
-                        # Multiple dots mean they are thousands separators (eg 1.000.000)
-                        cleaned = cleaned.replace('.', '')
-                        
-                    try: 
-                        val = float(cleaned)
-                        if val > 0: 
-                            print(f"  Successfully scraped balance: {val}")
-                            return val
-                    except: pass
+                    val = parse_balance_text(balance_text)
+                    if val > 0: 
+                        print(f"  Successfully scraped balance: {val}")
+                        return val
             except Exception as e:
                 print(f"  Attempt {attempt+1} at {url} failed: {e}")
                 if attempt == 0: page.reload()
             
     return 0.0
 
+def scrape_stable_balance(page: Page, timeout: int, hint: dict = None, settle_ms: int = 1500, max_wait_ms: int = 8000):
+    """Read a settled balance from a single page load.
+
+    Instead of scraping several times with fixed sleeps, the balance element is
+    watched in-page until its text stops changing. `hint` is the {url, selector}
+    that worked last time for this account; it is tried first.
+    Returns (balance, hint) where hint is what worked now (None if nothing did).
+    """
+    hint = hint or {}
+    urls = sorted(BALANCE_URLS, key=lambda u: u != hint.get('url'))
+    selectors = selector_cache.REGISTRY.order('balance', BALANCE_SELECTORS + [BALANCE_TEXT_FALLBACK])
+    selectors = sorted(selectors, key=lambda s: s != hint.get('selector'))
+    # Only wait for the variant expected to match; the in-page watch polls for the rest
+    ready = "text=Saldo Rekening" if selectors[0] == BALANCE_TEXT_FALLBACK else selectors[0]
+
+    for url in urls:
+        try:
+            print(f"  Watching balance on {url}...")
+            page.goto(url, timeout=timeout*1000)
+            try:
+                page.wait_for_selector(ready, state="visible", timeout=5000)
+            except Exception:
+                try_close_popups(page)
+            result = page.evaluate(_WATCH_BALANCE_JS, [selectors, settle_ms, max_wait_ms])
+            val = parse_balance_text(result.get('text'))
+            if val > 0:
+                print(f"  ✓ Balance settled at {val} via {result['selector']} "
+                      f"({result['changes']} changes, {result['waited']}ms)")
+                selector_cache.REGISTRY.hit('balance', result['selector'])
+                return val, {'url': url, 'selector': result['selector']}
+            print(f"  No balance found on {url}")
+        except Exception as e:
+            print(f"  Balance watch at {url} failed: {e}")
+    return 0.0, None
+
+def parse_progress_text(text: str):
+    """Parse the task progress pivot ("12/60") into (completed, total), or None."""
+    match = re.search(r'(\d+)\s*/\s*(\d+)', text or '')
+    if not match or int(match.group(2)) <= 0:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+def scrape_progress(page: Page, timeout_ms: int = 5000):
+    """Read server-side task progress from .van-progress__pivot on the current page, or None."""
+    try:
+        el = page.locator(".van-progress__pivot").first
+        el.wait_for(state="attached", timeout=timeout_ms)
+        return parse_progress_text(el.text_content(timeout=timeout_ms))
+    except Exception:
+        return None
+
 def scrape_points(page: Page, timeout: int = 30) -> float:
     """Scrapes point balance from points/shop page. Assumes caller has navigated to correct page."""
     try:
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import fcntl
+
+from .site import HOST
+from .sessions import SESSION_DIR
+
+SELECTOR_FILE = os.path.join(SESSION_DIR, "selectors.json")
+DEFAULT_SITE = HOST
+
+
+class SelectorRegistry:
+    """Learns which variant of a multi-selector lookup works on a site.
+
+    Callers describe a lookup as a key plus an ordered list of Playwright
+    selector strings (CSS, "role=button[name=...]", "text=..."). The registry
+    hands them back with the last winner first and the rest by hit rate, and
+    keeps per-variant hit/miss counts. Stats are persisted (flock-merged with
+    other CLI processes) on flush():
+        {"mba7.com": {"grab_button": {"winner": sel, "stats": {sel: {"hit": n, "miss": n}}}}}
+    """
+
+    def __init__(self, path: str = SELECTOR_FILE, site: str = DEFAULT_SITE):
+        self.path = path
+        self.site = site
+        self._learned = None
+        self._pending = {}  # key -> {"winner": sel, "stats": {sel: {"hit": n, "miss": n}}}
+
+    def _site_data(self) -> dict:
+        if self._learned is None:
+            try:
+                with open(self.path, 'r') as f:
+                    self._learned = json.load(f).get(self.site, {})
+            except Exception:
+                self._learned = {}
+        return self._learned
+
+    def order(self, key: str, variants: list) -> list:
+        """Variants to try, best first: last winner, then by hit rate, then declared order."""
+        entry = self._site_data().get(key, {})
+        pending = self._pending.get(key, {})
+        winner = pending.get('winner') or entry.get('winner')
+        stats = entry.get('stats', {})
+
+        def rank(item):
+            idx, sel = item
+            s = stats.get(sel, {})
+            tries = s.get('hit', 0) + s.get('miss', 0)
+            rate = s.get('hit', 0) / tries if tries else 0.0
+            return (sel != winner, -rate, idx)
+        return [sel for _, sel in sorted(enumerate(variants), key=rank)]
+
+    def _count(self, key: str, selector: str, field: str) -> None:
+        entry = self._pending.setdefault(key, {'stats': {}})
+        stat = entry['stats'].setdefault(selector, {'hit': 0, 'miss': 0})
+        stat[field] += 1
+        if field == 'hit':
+            entry['winner'] = selector
+
+    def hit(self, key: str, selector: str) -> None:
+        self._count(key, selector, 'hit')
+
+    def miss(self, key: str, selector: str) -> None:
+        self._count(key, selector, 'miss')
+
+    def stats(self, key: str) -> dict:
+        """Persisted plus pending hit/miss counts per variant."""
+        merged = {sel: dict(s) for sel, s in self._site_data().get(key, {}).get('stats', {}).items()}
+        for sel, s in self._pending.get(key, {}).get('stats', {}).items():
+            m = merged.setdefault(sel, {'hit': 0, 'miss': 0})
+            m['hit'] = m.get('hit', 0) + s['hit']
+            m['miss'] = m.get('miss', 0) + s['miss']
+        return merged
+
+    def find(self, page, key: str, variants: list, timeout: int = 5000):
+        """First visible locator among the variants, or None.
+
+        Only the expected winner gets the full visibility wait; the remaining
+        variants are checked without waiting, so a stable layout costs one lookup.
+        """
+        for i, sel in enumerate(self.order(key, variants)):
+            el = page.locator(sel).first
+            try:
+                if i == 0:
+                    el.wait_for(state="visible", timeout=timeout)
+                    found = True
+                else:
+                    found = el.count() > 0 and el.is_visible()
+            except Exception:
+                found = False
+            if found:
+                self.hit(key, sel)
+                return el
+            self.miss(key, sel)
+        return None
+
+    def flush(self) -> None:
+        """Merge pending counts into the selector file."""
+        if not self._pending:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    data = json.loads(f.read() or '{}')
+                except ValueError:
+                    data = {}
+                site = data.setdefault(self.site, {})
+                for key, pending in self._pending.items():
+                    entry = site.setdefault(key, {'stats': {}})
+                    if pending.get('winner'):
+                        entry['winner'] = pending['winner']
+                    for sel, s in pending['stats'].items():
+                        stat = entry['stats'].setdefault(sel, {'hit': 0, 'miss': 0})
+                        stat['hit'] += s['hit']
+                        stat['miss'] += s['miss']
+                    entry['updated'] = time.time()
+                f.seek(0)
+                f.truncate()
+                json.dump(data, f, indent=2)
+                self._learned = site
+                self._pending = {}
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+REGISTRY = SelectorRegistry()
+
+
+def find(page, key: str, variants: list, timeout: int = 5000):
+    """Module-level shortcut for REGISTRY.find()."""
+    return REGISTRY.find(page, key, variants, timeout)
@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import time
+import base64
+import fcntl
+
+SESSION_DIR = os.getenv("MBA_SESSION_DIR") or os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "sessions"))
+META_FILE = os.path.join(SESSION_DIR, "meta.json")
+
+# A session verified this recently is trusted without any probe
+FRESH_SECONDS = int(os.getenv("MBA_SESSION_FRESH_SECONDS", "900"))
+# Sessions with a known expiry are trusted for longer between verifications
+TRUST_SECONDS = int(os.getenv("MBA_SESSION_TRUST_SECONDS", str(6 * 3600)))
+# Only trust a session up to this fraction of its observed lifetime
+LIFETIME_SAFETY = 0.8
+# Keep this many lifetime observations per phone
+MAX_SAMPLES = 5
+
+_JWT_RE = re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]*")
+
+
+def _norm(phone: str) -> str:
+    return phone[2:] if phone and phone.startswith('62') else (phone or '')
+
+
+def session_tokens(storage_state_path: str) -> list:
+    """JWT-looking tokens stored in a Playwright storage state file (cookies + localStorage)."""
+    try:
+        with open(storage_state_path, 'r') as f:
+            state = json.load(f)
+    except Exception:
+        return []
+    values = [c.get('value', '') for c in state.get('cookies', [])]
+    for origin in state.get('origins', []):
+        values.extend(item.get('value', '') for item in origin.get('localStorage', []))
+    return [m.group(0) for v in values for m in [_JWT_RE.search(v or '')] if m]
+
+
+def token_expiry(storage_state_path: str):
+    """Return the `exp` (epoch seconds) of the first JWT found in a storage state file, or None."""
+    for token in session_tokens(storage_state_path):
+        try:
+            payload = token.split('.')[1]
+            payload += '=' * (-len(payload) % 4)
+            exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+            if exp:
+                return float(exp)
+        except Exception:
+            continue
+    return None
+
+
+class SessionManager:
+    """Tracks when each stored session was saved/last verified and how long sessions live.
+
+    State is kept in sessions/meta.json (shared by concurrent CLI processes via flock):
+        {"8123...": {"saved_at": ts, "verified_at": ts, "samples": [lifetime_s, ...],
+                     "balance_hint": {"url": ..., "selector": ...}}}
+    """
+
+    def __init__(self, meta_file: str = META_FILE):
+        self.meta_file = meta_file
+
+    def _update(self, fn):
+        os.makedirs(os.path.dirname(self.meta_file), exist_ok=True)
+        with open(self.meta_file, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    meta = json.loads(f.read() or '{}')
+                except ValueError:
+                    meta = {}
+                result = fn(meta)
+                f.seek(0)
+                f.truncate()
+                json.dump(meta, f, indent=2)
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def load(self) -> dict:
+        try:
+            with open(self.meta_file, 'r') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def get(self, phone: str) -> dict:
+        return self.load().get(_norm(phone), {})
+
+    def record_login(self, phone: str, now: float = None) -> None:
+        """A fresh storage state was just saved after a form login."""
+        now = now or time.time()
+
+        def fn(meta):
+            entry = meta.setdefault(_norm(phone), {})
+            entry['saved_at'] = now
+            entry['verified_at'] = now
+        self._update(fn)
+
+    def record_valid(self, phone: str, now: float = None) -> None:
+        now = now or time.time()
+        self._update(lambda meta: meta.setdefault(_norm(phone), {}).__setitem__('verified_at', now))
+
+    def remember(self, phone: str, key: str, value) -> None:
+        """Store a per-account scraping hint (e.g. which balance URL/selector worked)."""
+        self._update(lambda meta: meta.setdefault(_norm(phone), {}).__setitem__(key, value))
+
+    def claim_refresh(self, phone: str, day: str) -> bool:
+        """Mark the session as refreshed on `day`; False if some process already did today."""
+        def fn(meta):
+            entry = meta.setdefault(_norm(phone), {})
+            if entry.get('refreshed_on') == day:
+                return False
+            entry['refreshed_on'] = day
+            return True
+        return self._update(fn)
+
+    def record_invalid(self, phone: str, now: float = None) -> None:
+        """The stored session stopped working; learn its lifetime from it."""
+        now = now or time.time()
+
+        def fn(meta):
+            entry = meta.setdefault(_norm(phone), {})
+            saved = entry.get('saved_at')
+            # Only learn from sessions we last saw working (record once per death)
+            if saved and 'verified_at' in entry:
+                # It died somewhere between the last good check and now
+                last_good = entry.get('verified_at', saved)
+                sample = ((last_good - saved) + (now - saved)) / 2
+                if sample > 0:
+                    entry['samples'] = (entry.get('samples', []) + [round(sample)])[-MAX_SAMPLES:]
+            entry.pop('verified_at', None)
+        self._update(fn)
+
+    def lifetime(self, phone: str, entry: dict = None):
+        """Conservative observed lifetime in seconds (shortest recent sample), or None."""
+        entry = entry if entry is not None else self.get(phone)
+        samples = entry.get('samples') or []
+        return min(samples) if samples else None
+
+    def expires_at(self, phone: str, session_path: str = None, entry: dict = None):
+        """Best estimate of when the stored session expires (epoch seconds), or None."""
+        entry = entry if entry is not None else self.get(phone)
+        if session_path:
+            exp = token_expiry(session_path)
+            if exp:
+                return exp
+        life = self.lifetime(phone, entry)
+        if life and entry.get('saved_at'):
+            return entry['saved_at'] + life * LIFETIME_SAFETY
+        return None
+
+    def is_fresh(self, phone: str, session_path: str, now: float = None) -> bool:
+        """True if the stored session can be used without probing it."""
+        now = now or time.time()
+        if not os.path.exists(session_path):
+            return False
+        entry = self.get(phone)
+        verified = entry.get('verified_at')
+        if not verified:
+            return False
+        exp = self.expires_at(phone, session_path, entry)
+        if exp is not None and exp <= now + 60:
+            return False
+        if now - verified <= FRESH_SECONDS:
+            return True
+        # Beyond the short window only trust sessions whose expiry we know
+        return exp is not None and now - verified <= TRUST_SECONDS
+
+    def is_expired(self, phone: str, session_path: str, now: float = None) -> bool:
+        """True if the stored session is known to be dead (skip straight to form login)."""
+        now = now or time.time()
+        exp = token_expiry(session_path)
+        return bool(exp and exp <= now)
+
+    def expiring(self, within: float, now: float = None) -> list:
+        """Phones (display format) whose sessions expire within `within` seconds."""
+        now = now or time.time()
+        due = []
+        for phone, entry in self.load().items():
+            path = os.path.join(os.path.dirname(self.meta_file), f"{phone}.json")
+            if not os.path.exists(path):
+                continue
+            exp = self.expires_at(phone, path, entry)
+            if exp is not None and exp - now < within:
+                due.append(phone)
+        return due
@@ -0,0 +1,12 @@
+import os
+from urllib.parse import urlparse
+
+# Site the automation talks to. Point it at the local stand-in
+# (python -m mba_automation.mock_site) to run everything offline.
+BASE_URL = os.getenv("MBA_BASE_URL", "https://mba7.com").rstrip('/')
+HOST = urlparse(BASE_URL).hostname or "mba7.com"
+
+
+def page_url(route: str) -> str:
+    """URL of an SPA hash route, e.g. page_url('mine') -> https://mba7.com/#/mine."""
+    return f"{BASE_URL}/#/{route.lstrip('/')}"
@@ -0,0 +1,249 @@
+"""Load test for the dashboard endpoints on synthetic data.
+
+    python scripts/loadtest_webapp.py --accounts 100,500,2000 --years 1,3 --concurrency 1,8
+
+For every (accounts, years) size a synthetic accounts.json (daily_progress for
+every day of the period, encrypted passwords like the real file), a run-log
+directory and a day-file event log are generated in a temp dir. The webapp's
+data manager, run index and log store are pointed at them, and each endpoint
+is hit through Flask's test client: first sequentially (latency percentiles),
+then from N concurrent clients (throughput). Nothing touches the real
+accounts.json or logs/, and no jobs are run.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import datetime
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Importing the webapp must not start its job runner, scheduler or log sweep,
+# nor write its log, event files or runner socket into the real logs/
+_SCRATCH = tempfile.mkdtemp(prefix='mba-loadtest-')
+os.environ['MBA_BACKGROUND'] = '0'
+os.environ['MBA_EVENTS_DIR'] = os.path.join(_SCRATCH, 'events')
+os.environ['MBA_WEBAPP_LOG'] = os.path.join(_SCRATCH, 'runs.log')
+os.environ['MBA_RUNNER_SOCKET'] = os.path.join(_SCRATCH, 'runner.sock')
+import webapp
+from utils import crypto
+from utils.run_index import RunIndex
+from utils.log_store import LogStore
+from utils.job_runner import JobQueue
+
+LEVEL_TASKS = {'E1': 15, 'E2': 30, 'E3': 60}
+RESULTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bench_results'))
+
+
+def generate_accounts(count, days, today=None, seed=0):
+    """Synthetic accounts shaped like the ones cli.py writes, with `days` of daily_progress."""
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    accounts = []
+    for n in range(count):
+        level = rng.choice(list(LEVEL_TASKS))
+        total = LEVEL_TASKS[level]
+        balance = rng.uniform(50_000, 500_000)
+        points = 0
+        progress = {}
+        for back in range(days - 1, -1, -1):
+            day = today - datetime.timedelta(days=back)
+            completed = total if back else rng.randint(0, total)
+            income = completed * rng.uniform(800, 1200)
+            balance += income
+            withdrawal = 0.0
+            if day.weekday() == 3 and balance > 100_000:
+                withdrawal = round(balance * 0.5, 2)
+                balance -= withdrawal
+            points += 10
+            progress[day.isoformat()] = {
+                'date': day.isoformat(),
+                'completed': completed,
+                'total': total,
+                'percentage': int(completed / total * 100),
+                'income': round(income, 2),
+                'withdrawal': withdrawal,
+                'balance': round(balance, 2),
+                'points': points,
+                'calendar': list(range(1, day.day + 1)),
+            }
+        ts = datetime.datetime.combine(today, datetime.time(6, 0)).isoformat()
+        accounts.append({
+            'phone': f"62812{n:07d}",
+            'password': crypto.encrypt_password(f"pw{n}"),
+            'level': level,
+            'schedule': f"{rng.randint(5, 22):02d}:{rng.choice((0, 15, 30, 45)):02d}",
+            'last_run_ts': ts,
+            'last_sync_ts': ts,
+            'status': 'idle',
+            'daily_progress': progress,
+        })
+    return accounts
+
+
+def generate_logs(log_dir, events_dir, accounts, runs_per_account=5, events_per_run=20, now=None, seed=0):
+    """Run logs named like the worker's and JSON-lines events for them, one day file per day."""
+    rng = random.Random(seed)
+    now = now or datetime.datetime.now()
+    os.makedirs(log_dir, exist_ok=True)
+    os.makedirs(events_dir, exist_ok=True)
+    day_files = {}
+    try:
+        for acc in accounts:
+            display = webapp.phone_display(acc['phone'])
+            for r in range(runs_per_account):
+                started = now - datetime.timedelta(days=r, minutes=rng.randint(0, 600))
+                stamp = started.strftime('%Y%m%d_%H%M%S')
+                with open(os.path.join(log_dir, f"schedule_{display}_{stamp}.log"), 'w') as f:
+                    f.writelines(f"[{i}] Progress: {i}/30\n" for i in range(events_per_run * 4))
+                day = started.date().isoformat()
+                if day not in day_files:
+                    day_files[day] = open(os.path.join(events_dir, f"{day}.jsonl"), 'a')
+                for i in range(events_per_run):
+                    ts = started + datetime.timedelta(seconds=i * 3)
+                    day_files[day].write(json.dumps({
+                        'ts': ts.isoformat(timespec='milliseconds'),
+                        'level': 'ERROR' if rng.random() < 0.02 else 'INFO',
+                        'phone': display,
+                        'run_id': f"schedule_{display}_{stamp}",
+                        'phase': rng.choice(('login', 'tasks', 'income', 'balance', 'checkin')),
+                        'msg': 'done',
+                        'duration': round(rng.uniform(0.1, 20), 3),
+                    }) + "\n")
+    finally:
+        for f in day_files.values():
+            f.close()
+
+
+@contextmanager
+def use_dataset(workdir):
+    """Point the webapp at a generated dataset, restoring the real paths afterwards."""
+    dm = webapp.data_manager
+    saved = (dm.accounts_file, dm.settings_file, webapp.LOG_DIR, webapp.LOG_STORE, webapp.JOB_QUEUE)
+    try:
+        dm.accounts_file = os.path.join(workdir, 'accounts.json')
+        dm.settings_file = os.path.join(workdir, 'settings.json')
+        webapp.LOG_DIR = os.path.join(workdir, 'logs')
+        runs = RunIndex(key_fn=webapp.normalize_phone, max_history=None)
+        runs.seed(webapp.LOG_DIR)
+        webapp.LOG_STORE = LogStore(os.path.join(workdir, 'events'))
+        # The scheduler may enqueue the synthetic accounts; nothing runs this queue
+        webapp.JOB_QUEUE = JobQueue(lambda job: None, os.path.join(workdir, 'runner.sock'),
+                                    os.path.join(workdir, 'runner.lock'), should_run=lambda: False,
+                                    services={'runs': runs}).start()
+        yield
+    finally:
+        webapp.JOB_QUEUE.close()
+        (dm.accounts_file, dm.settings_file, webapp.LOG_DIR, webapp.LOG_STORE, webapp.JOB_QUEUE) = saved
+
+
+def build_dataset(workdir, count, days, runs_per_account=5):
+    accounts = generate_accounts(count, days)
+    with open(os.path.join(workdir, 'accounts.json'), 'w') as f:
+        json.dump(accounts, f, indent=2)
+    with open(os.path.join(workdir, 'settings.json'), 'w') as f:
+        json.dump({}, f)
+    generate_logs(os.path.join(workdir, 'logs'), os.path.join(workdir, 'events'), accounts, runs_per_account)
+    return [webapp.phone_display(a['phone']) for a in accounts]
+
+
+def endpoints(phones, rng):
+    """(name, path factory) for every endpoint under test."""
+    return [
+        ('index', lambda: '/'),
+        ('api_accounts', lambda: '/api/accounts'),
+        ('api_global_history', lambda: '/api/global_history'),
+        ('api_logs', lambda: '/api/logs?limit=100'),
+        ('api_logs_phone', lambda: f"/api/logs/{rng.choice(phones)}"),
+    ]
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 2)
+    return {'count': len(ordered), 'p50_ms': pick(0.5), 'p90_ms': pick(0.9), 'p99_ms': pick(0.99),
+            'max_ms': round(ordered[-1] * 1000, 2), 'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2)}
+
+
+def measure(path_fn, requests, concurrency=1):
+    """Issue `requests` GETs from `concurrency` clients. Returns latency stats plus throughput."""
+    errors = []
+
+    def client_loop(n):
+        client = webapp.app.test_client()
+        latencies = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            resp = client.get(path_fn())
+            resp.get_data()
+            latencies.append(time.perf_counter() - t0)
+            if resp.status_code >= 400:
+                errors.append(resp.status_code)
+        return latencies
+
+    shares = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = [l for chunk in pool.map(client_loop, [s for s in shares if s]) for l in chunk]
+    wall = time.perf_counter() - started
+    stats = percentiles(latencies)
+    stats.update({'concurrency': concurrency, 'rps': round(len(latencies) / wall, 1) if wall else None,
+                  'errors': len(errors)})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the webapp dashboard endpoints on synthetic data")
+    parser.add_argument("--accounts", default="100,500,2000", help="Comma-separated account counts")
+    parser.add_argument("--years", default="1,3", help="Comma-separated years of daily_progress")
+    parser.add_argument("--requests", type=int, default=30, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--concurrency", default="1,8", help="Comma-separated concurrent client counts")
+    parser.add_argument("--runs-per-account", type=int, default=5)
+    parser.add_argument("--endpoints", default=None, help="Only these endpoints (comma-separated names)")
+    parser.add_argument("--out", default=None, help="Result file (default bench_results/webapp_<timestamp>.json)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    only = set(args.endpoints.split(",")) if args.endpoints else None
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    results = {'started': datetime.datetime.now().isoformat(timespec='seconds'), 'config': vars(args), 'runs': []}
+
+    for count in [int(c) for c in args.accounts.split(",") if c.strip()]:
+        for years in [float(y) for y in args.years.split(",") if y.strip()]:
+            workdir = tempfile.mkdtemp(prefix="mba-loadtest-")
+            try:
+                t0 = time.perf_counter()
+                phones = build_dataset(workdir, count, int(365 * years), args.runs_per_account)
+                size_mb = os.path.getsize(os.path.join(workdir, 'accounts.json')) / 1e6
+                print(f"▶ {count} accounts x {years:g}y (accounts.json {size_mb:.1f} MB, generated in {time.perf_counter() - t0:.1f}s)")
+                with use_dataset(workdir):
+                    for name, path_fn in endpoints(phones, rng):
+                        if only and name not in only:
+                            continue
+                        for concurrency in levels:
+                            stats = measure(path_fn, args.requests, concurrency)
+                            results['runs'].append({'accounts': count, 'years': years, 'accounts_mb': round(size_mb, 2),
+                                                    'endpoint': name, **stats})
+                            print(f"  {name:<20} c={concurrency:<3} p50 {stats['p50_ms']:>9.1f} ms  "
+                                  f"p99 {stats['p99_ms']:>9.1f} ms  {stats['rps']:>7.1f} req/s"
+                                  + (f"  {stats['errors']} errors" if stats['errors'] else ""))
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"webapp_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {out}")
+    shutil.rmtree(_SCRATCH, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -631,6 +631,7 @@ function attachSyncButtons() {
       try {
         const formData = new FormData();
         formData.append('phone', phone);
+        formData.append('full', '1');
 
         const res = await fetch('/sync_single', {
           method: 'POST',
@@ -721,8 +722,10 @@ attachScheduleButtons();
 function initSettings() {
   const settingsInputs = [
     'setting-loglevel',
+    'setting-job-slots',
     'setting-telegram-token',
-    'setting-telegram-chat-id'
+    'setting-telegram-chat-id',
+    'setting-digest-time'
   ];
 
   settingsInputs.forEach(id => {
@@ -774,6 +777,24 @@ function initSettings() {
     });
   }
 
+  // Check-in all accounts (one shared browser)
+  const btnCheckinAll = document.getElementById('btn-checkin-all');
+  if (btnCheckinAll) {
+    btnCheckinAll.addEventListener('click', function () {
+      btnCheckinAll.disabled = true;
+      fetch('/checkin_all', { method: 'POST' })
+        .then(res => res.json())
+        .then(data => {
+          btnCheckinAll.disabled = false;
+          showToast(data.msg, data.ok ? 'success' : 'error');
+        })
+        .catch(err => {
+          btnCheckinAll.disabled = false;
+          showToast('Error: ' + err, 'error');
+        });
+    });
+  }
+
   // Telegram Test
   const btnTestTele = document.getElementById('btn-test-telegram');
   if (btnTestTele) {
@@ -814,14 +835,21 @@ function initSettings() {
 }
 
 function saveSettings() {
-  const settings = {
-    auto_reconnect_wifi: document.getElementById('setting-wifi').checked,
-    timeout: parseInt(document.getElementById('setting-timeout').value),
-    viewport: document.getElementById('setting-viewport').value,
-    log_level: document.getElementById('setting-loglevel').value,
-    telegram_token: document.getElementById('setting-telegram-token').value,
-    telegram_chat_id: document.getElementById('setting-telegram-chat-id').value
+  // The server merges these into settings.json, so only send the fields shown here
+  const fields = {
+    log_level: 'setting-loglevel',
+    job_slots: 'setting-job-slots',
+    telegram_token: 'setting-telegram-token',
+    telegram_chat_id: 'setting-telegram-chat-id',
+    digest_time: 'setting-digest-time'
   };
+  const settings = {};
+  Object.entries(fields).forEach(([key, id]) => {
+    const el = document.getElementById(id);
+    if (el) {
+      settings[key] = el.type === 'number' ? parseInt(el.value) || 1 : el.value;
+    }
+  });
 
   console.log('Saving settings:', settings);
   fetch('/settings/save', {
@@ -0,0 +1,780 @@
+import unittest
+import tempfile
+import os
+import json
+import time
+import base64
+
+import sys
+# ensure project root is on path so 'mba_automation' imports work
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Events emitted by the code under test go to a tmp dir, not logs/events
+os.environ.setdefault('MBA_EVENTS_DIR', tempfile.mkdtemp(prefix='mba-tests-events-'))
+from mba_automation import sessions, planner, selector_cache
+
+
+def _write_state(path, exp=None):
+    value = 'plain-token'
+    if exp is not None:
+        payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip('=')
+        value = f"eyJhbGciOiJIUzI1NiJ9.{payload}.sig"
+    with open(path, 'w') as f:
+        json.dump({"cookies": [], "origins": [{"origin": "https://mba7.com",
+                                               "localStorage": [{"name": "token", "value": value}]}]}, f)
+
+
+class TestSessionManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mgr = sessions.SessionManager(os.path.join(self.tmp.name, 'meta.json'))
+        self.path = os.path.join(self.tmp.name, '8123.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fresh_after_login_then_stale(self):
+        _write_state(self.path)
+        now = time.time()
+        self.assertFalse(self.mgr.is_fresh('628123', self.path, now=now))
+        self.mgr.record_login('628123', now=now)
+        self.assertTrue(self.mgr.is_fresh('8123', self.path, now=now + 60))
+        # Without a known expiry, trust ends with the short freshness window
+        self.assertFalse(self.mgr.is_fresh('8123', self.path, now=now + sessions.FRESH_SECONDS + 1))
+
+    def test_token_expiry_extends_trust_and_detects_expired(self):
+        now = time.time()
+        _write_state(self.path, exp=now + 86400)
+        self.mgr.record_login('8123', now=now)
+        self.assertTrue(self.mgr.is_fresh('8123', self.path, now=now + 3600))
+        self.assertFalse(self.mgr.is_expired('8123', self.path, now=now + 3600))
+        self.assertTrue(self.mgr.is_expired('8123', self.path, now=now + 86401))
+        self.assertEqual(self.mgr.expiring(within=2 * 86400, now=now), ['8123'])
+        self.assertEqual(self.mgr.expiring(within=3600, now=now), [])
+
+    def test_lifetime_learned_once_per_invalidation(self):
+        _write_state(self.path)
+        t0 = time.time()
+        self.mgr.record_login('8123', now=t0)
+        self.mgr.record_valid('8123', now=t0 + 1000)
+        self.mgr.record_invalid('8123', now=t0 + 3000)
+        self.mgr.record_invalid('8123', now=t0 + 3100)  # same death, no second sample
+        self.assertEqual(self.mgr.lifetime('8123'), 2000)
+        self.assertFalse(self.mgr.is_fresh('8123', self.path, now=t0 + 3100))
+        # Learned lifetime drives the expiry estimate of the next session
+        self.mgr.record_login('8123', now=t0 + 4000)
+        self.assertEqual(self.mgr.expires_at('8123'), t0 + 4000 + 2000 * sessions.LIFETIME_SAFETY)
+
+    def test_remembered_hint_survives_session_updates(self):
+        hint = {'url': 'https://mba7.com/#/me', 'selector': '.user-balance'}
+        self.mgr.remember('628123', 'balance_hint', hint)
+        self.mgr.record_login('8123')
+        self.assertEqual(self.mgr.get('8123')['balance_hint'], hint)
+
+    def test_refresh_claimed_once_per_day_across_managers(self):
+        other = sessions.SessionManager(self.mgr.meta_file)  # e.g. another webapp process
+        self.assertTrue(self.mgr.claim_refresh('628123', '2025-01-07'))
+        self.assertFalse(other.claim_refresh('8123', '2025-01-07'))
+        self.assertTrue(other.claim_refresh('8123', '2025-01-08'))
+
+
+class TestBalanceParsing(unittest.TestCase):
+    def test_parse_balance_text_formats(self):
+        from mba_automation.scraper import parse_balance_text
+        self.assertEqual(parse_balance_text('Rp 1.234.567'), 1234567.0)
+        self.assertEqual(parse_balance_text('1.234,50'), 1234.5)
+        self.assertEqual(parse_balance_text('1,234.56'), 1234.56)
+        self.assertEqual(parse_balance_text(''), 0.0)
+
+    def test_parse_progress_text(self):
+        from mba_automation.scraper import parse_progress_text
+        self.assertEqual(parse_progress_text(' 55 / 60 '), (55, 60))
+        self.assertEqual(parse_progress_text('60/60'), (60, 60))
+        self.assertIsNone(parse_progress_text('0/0'))
+        self.assertIsNone(parse_progress_text('Memuat...'))
+
+
+class TestCheckinState(unittest.TestCase):
+    def test_stored_checkin_state_uses_newest_entry_of_month(self):
+        import datetime
+        from mba_automation import cli, automation
+        acc = {'daily_progress': {
+            '2025-03-31': {'points': 90.0, 'calendar': [30, 31]},
+            '2025-04-02': {'points': 10.0, 'calendar': [1, 2]},
+            '2025-04-03': {'points': 0.0, 'calendar': []},
+        }}
+        today = datetime.date(2025, 4, 3)
+        self.assertEqual(cli.stored_checkin_state(acc, today), (10.0, [1, 2]))
+        self.assertFalse(automation.checked_in_today([1, 2], today))
+        self.assertTrue(automation.checked_in_today([1, 2, 3], today))
+        # Previous month's calendar never counts
+        self.assertIsNone(cli.stored_checkin_state({'daily_progress': {'2025-03-31': {'calendar': [31]}}}, today))
+
+    def _run_cli(self, cli, argv):
+        import io
+        import contextlib
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            saved_argv, sys.argv = sys.argv, ['mba'] + argv
+            try:
+                cli.main()
+            finally:
+                sys.argv = saved_argv
+        return out.getvalue()
+
+    def test_checkin_batch_survives_a_failing_account(self):
+        import contextlib
+        from mba_automation import cli
+        calls = []
+
+        def checkin(browser, phone, password):
+            calls.append((phone, password))
+            if phone == '8111':
+                raise TimeoutError('page.goto: Timeout 30000ms exceeded')
+            return 5.0, [1]
+
+        browser = type('Browser', (), {'close': lambda self: None})()
+        saved = (cli.sync_playwright, cli.launch_browser, cli.checkin_account, cli.load_account, cli.save_progress)
+        try:
+            cli.sync_playwright = lambda: contextlib.nullcontext(None)
+            cli.launch_browser = lambda playwright, headless, slow_mo: browser
+            cli.checkin_account = checkin
+            cli.load_account = lambda phone: {}
+            cli.save_progress = lambda: None
+            out = self._run_cli(cli, ['--checkin-only', '--phone', '8111', '--phone', '8222',
+                                      '--password', 'a', '--password', 'b'])
+            self.assertEqual(calls, [('8111', 'a'), ('8222', 'b')])
+            self.assertIn('Check-in failed for 8111', out)
+
+            calls.clear()
+            out = self._run_cli(cli, ['--checkin-only', '--phone', '8111', '--phone', '8222', '--phone', '8333',
+                                      '--password', 'a', '--password', 'b'])
+            self.assertEqual(calls, [])
+            self.assertIn('2 passwords for 3 phones', out)
+        finally:
+            cli.sync_playwright, cli.launch_browser, cli.checkin_account, cli.load_account, cli.save_progress = saved
+
+    def test_sync_marks_only_sources_that_returned_data(self):
+        import contextlib
+        from mba_automation import cli
+
+        def run(playwright, phase_state=None, **kwargs):
+            # Income scraped fine; balance and the rest came back empty
+            phase_state['income'] = 5.0
+            return 0, 30, 5.0, 0.0, 0.0, 0.0, []
+
+        saved_progress = []
+        breaker = type('Breaker', (), {'wait_if_open': lambda self: None, 'record_success': lambda self: None})()
+        saved = (cli.sync_playwright, cli.automation_run, cli.load_account, cli.save_progress, cli.BREAKER)
+        try:
+            cli.sync_playwright = lambda: contextlib.nullcontext(None)
+            cli.automation_run = run
+            cli.load_account = lambda phone: {}
+            cli.save_progress = lambda: saved_progress.append(dict(cli.current_run_data))
+            cli.BREAKER = breaker
+            self._run_cli(cli, ['--sync', '--phone', '8111', '--password', 'a'])
+            self.assertEqual(saved_progress[-1]['synced_sources'], ['income'])
+        finally:
+            cli.sync_playwright, cli.automation_run, cli.load_account, cli.save_progress, cli.BREAKER = saved
+
+
+class TestStableBalance(unittest.TestCase):
+    class _Page:
+        def __init__(self):
+            self.waited = []
+
+        def goto(self, url, timeout=None):
+            self.url = url
+
+        def wait_for_selector(self, selector, state=None, timeout=None):
+            self.waited.append(selector)
+
+        def evaluate(self, script, args):
+            return {'selector': args[0][0], 'text': 'Rp 1.250.000', 'changes': 0, 'waited': 1500}
+
+    def test_waits_only_for_the_preferred_variant(self):
+        from mba_automation import scraper, selector_cache
+        saved = selector_cache.REGISTRY
+        with tempfile.TemporaryDirectory() as d:
+            try:
+                selector_cache.REGISTRY = selector_cache.SelectorRegistry(os.path.join(d, 'selectors.json'))
+                page = self._Page()
+                hint = {'url': scraper.BALANCE_URLS[0], 'selector': scraper.BALANCE_TEXT_FALLBACK}
+                balance, found = scraper.scrape_stable_balance(page, 30, hint)
+                self.assertEqual((balance, found), (1250000.0, hint))
+                # Text-fallback accounts no longer sit out a CSS wait that never matches
+                self.assertEqual(page.waited, ['text=Saldo Rekening'])
+
+                page = self._Page()
+                scraper.scrape_stable_balance(page, 30, {'selector': '.amount-value'})
+                self.assertEqual(page.waited, ['.amount-value'])
+            finally:
+                selector_cache.REGISTRY = saved
+
+
+class TestPopupDismissal(unittest.TestCase):
+    class _Page:
+        def __init__(self, results):
+            self.results = list(results)
+            self.waits = 0
+
+        def evaluate(self, script, arg):
+            return self.results.pop(0)
+
+        def wait_for_timeout(self, ms):
+            self.waits += 1
+
+    def test_no_popup_costs_no_wait(self):
+        from mba_automation.scraper import try_close_popups
+        page = self._Page([0])
+        self.assertEqual(try_close_popups(page), 0)
+        self.assertEqual(page.waits, 0)
+
+    def test_stacked_popups_are_rechecked(self):
+        from mba_automation.scraper import try_close_popups
+        page = self._Page([2, 1, 0])
+        self.assertEqual(try_close_popups(page), 3)
+        self.assertEqual(page.waits, 2)
+
+
+class TestBlockingProfiles(unittest.TestCase):
+    class _Context:
+        def __init__(self):
+            self.routes = []
+
+        def route(self, pattern, handler):
+            self.routes.append((pattern, handler))
+
+    class _Route:
+        def __init__(self, url, rtype):
+            self.request = type('Req', (), {'url': url, 'resource_type': rtype})()
+            self.outcome = None
+
+        def abort(self):
+            self.outcome = 'abort'
+
+        def fallback(self):
+            self.outcome = 'continue'
+
+    def test_python_routing_blocks_types_and_hosts_and_counts(self):
+        from mba_automation import blocking
+        ctx = self._Context()
+        stats = blocking.install(ctx, 'standard', mode='python')
+        (_, handler), = ctx.routes
+        for url, rtype in [('https://mba7.com/a.png', 'image'), ('https://www.google-analytics.com/g/collect', 'xhr'),
+                           ('https://mba7.com/api/user', 'xhr')]:
+            route = self._Route(url, rtype)
+            handler(route)
+        self.assertEqual(route.outcome, 'continue')
+        self.assertEqual(blocking.pop_stats(ctx), stats)
+        self.assertEqual((stats['blocked'], stats['by_type']), (2, {'image': 1, 'xhr': 1}))
+        self.assertEqual(blocking.pop_stats(ctx), {})
+
+    def test_pattern_mode_only_routes_blocked_urls(self):
+        from mba_automation import blocking
+        ctx = self._Context()
+        blocking.install(ctx, 'strict', mode='pattern')
+        ext_re, host_re = ctx.routes[0][0], ctx.routes[1][0]
+        self.assertTrue(ext_re.search('https://mba7.com/static/app.css?v=3'))
+        self.assertFalse(ext_re.search('https://mba7.com/static/app.js'))
+        self.assertTrue(host_re.match('https://www.googletagmanager.com/gtm.js'))
+        self.assertFalse(host_re.match('https://mba7.com/?ref=google-analytics.com'))
+        blocking.pop_stats(ctx)
+
+
+class TestAssetCache(unittest.TestCase):
+    class _Resp:
+        def __init__(self, status, body=b'', headers=None):
+            self.status, self._body, self.headers = status, body, headers or {}
+
+        def body(self):
+            return self._body
+
+    class _Route:
+        def __init__(self, url, resp):
+            self.request = type('Req', (), {'url': url, 'method': 'GET', 'headers': {}})()
+            self.resp = resp
+            self.sent_headers = None
+            self.fulfilled = None
+
+        def fetch(self, headers=None):
+            self.sent_headers = headers
+            return self.resp
+
+        def fulfill(self, status=None, headers=None, body=None, response=None):
+            self.fulfilled = (status or response.status, body)
+
+        def fallback(self):
+            self.fulfilled = 'fallback'
+
+    def setUp(self):
+        from mba_automation import asset_cache
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = asset_cache.AssetCache(self.tmp.name, max_mb=1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_revalidates_with_etag_and_serves_from_disk(self):
+        url = 'https://mba7.com/static/app.js'
+        stats = {}
+        route = self._Route(url, self._Resp(200, b'console.log(1)', {'ETag': '"v1"'}))
+        self.cache.handle(route, stats)
+        self.assertEqual(route.fulfilled, (200, b'console.log(1)'))
+
+        route = self._Route(url, self._Resp(304))
+        self.cache.handle(route, stats)
+        self.assertEqual(route.sent_headers['if-none-match'], '"v1"')
+        self.assertEqual(route.fulfilled, (200, b'console.log(1)'))
+        self.assertEqual((stats['misses'], stats['revalidated'], stats['bytes_saved']), (1, 1, 14))
+
+    def test_hashed_bundles_skip_the_network_and_share_blobs(self):
+        stats = {}
+        for url in ('https://mba7.com/js/chunk.3fa9c2b1d4.js', 'https://mba7.com/js/copy.5e6f7a8b9c.js'):
+            self.cache.handle(self._Route(url, self._Resp(200, b'same-bytes')), stats)
+        self.assertEqual(len(os.listdir(os.path.join(self.tmp.name, 'blobs'))), 1)
+        route = self._Route('https://mba7.com/js/chunk.3fa9c2b1d4.js', None)
+        self.cache.handle(route, stats)
+        self.assertIsNone(route.sent_headers)
+        self.assertEqual(route.fulfilled, (200, b'same-bytes'))
+        self.assertEqual(stats['hits'], 1)
+
+
+class _FakeLocator:
+    def __init__(self, visible):
+        self.visible = visible
+        self.first = self
+
+    def wait_for(self, state=None, timeout=None):
+        if not self.visible:
+            raise TimeoutError("not visible")
+
+    def count(self):
+        return 1 if self.visible else 0
+
+    def is_visible(self):
+        return self.visible
+
+
+class _FakePage:
+    def __init__(self, visible):
+        self.visible = set(visible)
+        self.lookups = []
+
+    def locator(self, selector):
+        self.lookups.append(selector)
+        return _FakeLocator(selector in self.visible)
+
+
+class TestSelectorRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'selectors.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_winner_is_tried_first_and_persisted(self):
+        variants = ['.a', '.b', '.c']
+        reg = selector_cache.SelectorRegistry(self.path)
+        page = _FakePage(['.c'])
+        self.assertIsNotNone(reg.find(page, 'balance', variants))
+        self.assertEqual(page.lookups, ['.a', '.b', '.c'])
+        reg.flush()
+
+        # A new process starts from the learned ordering
+        reg = selector_cache.SelectorRegistry(self.path)
+        page = _FakePage(['.c'])
+        reg.find(page, 'balance', variants)
+        self.assertEqual(page.lookups, ['.c'])
+        reg.flush()
+        self.assertEqual(selector_cache.SelectorRegistry(self.path).stats('balance'),
+                         {'.a': {'hit': 0, 'miss': 1}, '.b': {'hit': 0, 'miss': 1}, '.c': {'hit': 2, 'miss': 0}})
+
+    def test_miss_falls_back_and_sites_are_separate(self):
+        reg = selector_cache.SelectorRegistry(self.path)
+        reg.hit('btn', '.old')
+        reg.flush()
+        page = _FakePage(['.new'])
+        self.assertIsNotNone(reg.find(page, 'btn', ['.new', '.old']))
+        self.assertEqual(page.lookups, ['.old', '.new'])
+        self.assertEqual(reg.order('btn', ['.new', '.old']), ['.new', '.old'])
+        self.assertEqual(selector_cache.SelectorRegistry(self.path, site='other').order('btn', ['.new', '.old']),
+                         ['.new', '.old'])
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_classify_failures(self):
+        from mba_automation import retry
+        self.assertEqual(retry.classify(None), retry.PARTIAL)
+        self.assertEqual(retry.classify(retry.LoginFailed('x')), retry.LOGIN)
+        self.assertEqual(retry.classify(Exception('net::ERR_NAME_NOT_RESOLVED at https://mba7.com')), retry.NETWORK)
+        self.assertEqual(retry.classify(Exception('Page.goto: Timeout 30000ms exceeded.')), retry.SITE)
+        self.assertEqual(retry.classify(Exception('page.goto: net::ERR_CONNECTION_RESET at https://mba7.com')), retry.SITE)
+        self.assertEqual(retry.classify(Exception('Timeout 30000ms exceeded'), online=False), retry.NETWORK)
+        # A slow locator on one account is not a site outage
+        self.assertEqual(retry.classify(Exception('locator.click: Timeout 1500ms exceeded.')), retry.TRANSIENT)
+        self.assertEqual(retry.classify(Exception('Page.wait_for_selector: Timeout 5000ms exceeded.')), retry.TRANSIENT)
+        self.assertEqual(retry.classify(ValueError('boom')), retry.ERROR)
+
+    def test_backoff_grows_with_jitter_and_cap(self):
+        from mba_automation import retry
+        import random
+        rng = random.Random(1)
+        base, cap = retry.BACKOFF[retry.SITE]
+        for attempt in range(1, 10):
+            delay = retry.backoff(attempt, retry.SITE, rng)
+            self.assertGreaterEqual(delay, base)
+            self.assertLessEqual(delay, min(cap, base * 2 ** (attempt - 1)))
+
+    def test_circuit_breaker_opens_and_closes(self):
+        from mba_automation import retry
+        with tempfile.TemporaryDirectory() as tmp:
+            breaker = retry.CircuitBreaker(os.path.join(tmp, 'circuit.json'), threshold=2, cooldown=60)
+            now = time.time()
+            self.assertFalse(breaker.record_failure(retry.LOGIN, now=now))
+            self.assertFalse(breaker.record_failure(retry.SITE, now=now))
+            self.assertTrue(breaker.record_failure(retry.SITE, now=now))
+            self.assertGreater(breaker.remaining(now=now), 59)
+            slept = []
+            breaker.wait_if_open(sleep=slept.append)
+            self.assertEqual(len(slept), 1)
+            breaker.record_success()
+            self.assertEqual(breaker.remaining(), 0)
+
+
+class TestTaskLoop(unittest.TestCase):
+    class _Clickable:
+        def __init__(self, page, name):
+            self.page, self.name = page, name
+
+        def nth(self, i):
+            return self
+
+        def click(self, timeout=None):
+            self.page.clicks.append(self.name)
+
+    class _Page:
+        def __init__(self, states):
+            self.states = list(states)
+            self.clicks = []
+
+        def wait_for_function(self, script, arg=None, polling=None, timeout=None):
+            from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+            state = self.states.pop(0) if self.states else None
+            if state is None:
+                raise PlaywrightTimeoutError("timeout")
+            return type('Handle', (), {'json_value': lambda self: state})()
+
+        def get_by_text(self, text):
+            return TestTaskLoop._Clickable(self, 'item')
+
+        def get_by_role(self, role, name=None):
+            return TestTaskLoop._Clickable(self, name)
+
+    def test_confirm_is_handled_between_steps_and_progress_reported(self):
+        from mba_automation.automation import task_loop
+        page = self._Page(['confirm', 'item', 'kirim', 'item', 'confirm', 'kirim'])
+        progress = []
+        done = task_loop(page, 2, 10, 60, progress_callback=lambda c, t: progress.append((c, t)))
+        self.assertEqual(done, 2)
+        self.assertEqual(page.clicks, ['Mengonfirmasi', 'item', 'Kirim', 'item', 'Mengonfirmasi', 'Kirim'])
+        self.assertEqual(progress, [(11, 60), (12, 60)])
+
+    def test_gives_up_after_three_consecutive_timeouts(self):
+        from mba_automation.automation import task_loop
+        page = self._Page([])
+        self.assertEqual(task_loop(page, 5, 0, 60), 0)
+        self.assertEqual(page.clicks, [])
+
+    def test_stuck_confirm_dialog_counts_as_a_failure(self):
+        from mba_automation.automation import task_loop, MAX_CONFIRM_ATTEMPTS
+        # The dialog never goes away: each item gives up after the capped clicks
+        page = self._Page(['confirm'] * 100)
+        self.assertEqual(task_loop(page, 5, 0, 60), 0)
+        self.assertEqual(page.clicks, ['Mengonfirmasi'] * MAX_CONFIRM_ATTEMPTS * 3)
+
+
+class TestAccountRun(unittest.TestCase):
+    """automation.run() with the browser, login and scrapers stubbed out."""
+
+    class _Closeable:
+        def __init__(self, log, name):
+            self.log, self.name = log, name
+
+        def close(self):
+            self.log.append(self.name)
+
+    class _Monitor:
+        over_budget = False
+
+        def start(self):
+            return self
+
+        def stop(self):
+            return {'peak_rss_mb': 0, 'peak_cpu': 0}
+
+        def reset_budget(self):
+            self.over_budget = False
+
+    def _run(self, stubs, **kwargs):
+        from mba_automation import automation
+        closed = []
+        defaults = {
+            'launch_browser': lambda playwright, headless, slow_mo: self._Closeable(closed, 'browser'),
+            'new_account_page': lambda browser, phone, timeout: (self._Closeable(closed, 'context'), object()),
+            'close_account_context': lambda context: context.close(),
+            'ResourceMonitor': self._Monitor,
+            'login': lambda *a, **kw: True,
+            'perform_tasks': lambda *a, **kw: (30, 30),
+            'scrape_income': lambda page, timeout: 0.0,
+            'scrape_withdrawal': lambda page, timeout: 0.0,
+            'scrape_balance': lambda page, timeout: 0.0,
+            'perform_checkin': lambda page: (1.0, ['2025-01-01']),
+        }
+        defaults.update(stubs)
+        saved = {name: getattr(automation, name) for name in defaults}
+        try:
+            for name, fn in defaults.items():
+                setattr(automation, name, fn)
+            return automation.run(None, '8111', 'pw', iterations=30, **kwargs), closed
+        finally:
+            for name, fn in saved.items():
+                setattr(automation, name, fn)
+
+    def test_retry_after_partial_tasks_scrapes_the_balance_again(self):
+        state = {}
+        balances = iter([100.0, 250.0])
+        stubs = {'perform_tasks': lambda *a, **kw: (10, 30), 'scrape_balance': lambda page, timeout: next(balances)}
+        result, _ = self._run(stubs, phase_state=state)
+        self.assertEqual((result[0], result[4]), (10, 100.0))
+        stubs['perform_tasks'] = lambda *a, **kw: (30, 30)
+        result, _ = self._run(stubs, phase_state=state)
+        # The remaining tasks ran, so the pre-task balance is not reused
+        self.assertEqual((result[0], result[4]), (30, 250.0))
+
+    def test_sources_that_scraped_zero_are_recorded_as_done(self):
+        state = {}
+        calls = []
+
+        def income(page, timeout):
+            calls.append('income')
+            return 0.0
+
+        self._run({'scrape_income': income}, sync_only=True, sync_plan={'income'}, phase_state=state)
+        self.assertEqual(state['income'], 0.0)
+        # A retry does not scrape a real 0 again
+        self._run({'scrape_income': income}, sync_only=True, sync_plan={'income'}, phase_state=state)
+        self.assertEqual(calls, ['income'])
+
+    def test_failed_context_setup_still_closes_the_browser(self):
+        def no_context(browser, phone, timeout):
+            raise RuntimeError('context failed')
+
+        closed = []
+        stubs = {'launch_browser': lambda playwright, headless, slow_mo: self._Closeable(closed, 'browser'),
+                 'new_account_page': no_context}
+        with self.assertRaises(RuntimeError):
+            self._run(stubs)
+        self.assertEqual(closed, ['browser'])
+
+    def test_failed_login_after_recycling_aborts_the_run(self):
+        from mba_automation.retry import LoginFailed
+        logins = iter([True, False])
+        monitor = type('Monitor', (self._Monitor,), {'over_budget': True, 'last_rss': 900 * 1048576})
+        stubs = {'ResourceMonitor': monitor, 'login': lambda *a, **kw: next(logins)}
+        with self.assertRaises(LoginFailed):
+            self._run(stubs)
+
+
+class TestInstrumentation(unittest.TestCase):
+    def _classes(self):
+        class Page:
+            def goto(self, url):
+                time.sleep(0.01)
+
+            def wait_for_timeout(self, ms):
+                pass
+
+            def click(self, selector):
+                # Implemented via a locator, like Playwright's own Page.click
+                return Locator().click()
+
+        class Locator:
+            def click(self):
+                pass
+
+            def count(self):
+                return 1
+
+        return Page, Locator
+
+    def test_wrapped_calls_are_counted_once_and_timed(self):
+        from mba_automation import instrument
+        Page, Locator = self._classes()
+        counters = instrument.Counters()
+        instrument.install(Page, Locator, counters)
+        instrument.install(Page, Locator, counters)  # idempotent
+        before = counters.snapshot()
+        page = Page()
+        page.goto('x')
+        page.wait_for_timeout(1)
+        page.click('#a')
+        Locator().count()
+        delta = counters.delta(before)
+        self.assertEqual((delta['navigation_calls'], delta['wait_calls'], delta['locator_calls']), (1, 1, 2))
+        self.assertGreaterEqual(delta['navigation_s'], 0.01)
+        self.assertEqual(counters.hottest(before, 1)[0]['method'], 'Page.goto')
+
+    def test_span_attaches_counters_and_profiler_writes_file(self):
+        from mba_automation import instrument, events
+        records = []
+        events.add_listener(records.append)
+        try:
+            with tempfile.TemporaryDirectory() as d:
+                old_dir = events.EVENTS_DIR
+                events.EVENTS_DIR = d
+                try:
+                    with instrument.span('login') as ev:
+                        ev['ok'] = True
+                finally:
+                    events.EVENTS_DIR = old_dir
+                profiler = instrument.Profiler('8123', mode='cprofile', out_dir=d).start()
+                sum(range(1000))
+                path = profiler.stop()
+                self.assertTrue(path.endswith('.prof') and os.path.exists(path))
+                self.assertIsNone(instrument.Profiler('8123', mode='').start().stop())
+        finally:
+            events.remove_listener(records.append)
+        self.assertEqual(records[0]['phase'], 'login')
+        self.assertTrue(records[0]['ok'])
+        self.assertIn('navigation_calls', records[0])
+
+
+class TestResourceMonitor(unittest.TestCase):
+    @unittest.skipUnless(os.path.exists('/proc/self/stat'), "needs /proc")
+    def test_samples_child_tree_and_flags_budget(self):
+        import subprocess
+        from mba_automation import resources
+        child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(5)'])
+        try:
+            self.assertIn(child.pid, resources.descendants(os.getpid()))
+            monitor = resources.ResourceMonitor(budget_mb=1)
+            self.assertGreater(monitor.sample(), 1024 * 1024)
+            self.assertTrue(monitor.over_budget)
+            monitor.reset_budget()
+            self.assertFalse(monitor.over_budget)
+            self.assertGreater(monitor.summary()['peak_rss_mb'], 1)
+        finally:
+            child.kill()
+            child.wait()
+        self.assertGreater(resources.system_available_mb(), 0)
+
+
+class TestMockSite(unittest.TestCase):
+    def setUp(self):
+        from mba_automation import mock_site
+        self.site = mock_site.MockSite(popups=True)
+        self.server, self.url = mock_site.serve(self.site)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _call(self, path, body=None, token=None, headers=None):
+        import urllib.request
+        import urllib.error
+        headers = dict(headers or {})
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.url + path, data=data, headers=headers)
+        try:
+            with urllib.request.urlopen(req) as resp:
+                return resp.status, resp.read(), resp.headers
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), e.headers
+
+    def test_login_tasks_and_checkin_flow(self):
+        status, body, _ = self._call('/api/login', {'phone': '8123', 'password': 'wrong'})
+        self.assertNotIn('token', json.loads(body))
+        token = json.loads(self._call('/api/login', {'phone': '8123', 'password': 'rahasia123'})[1])['token']
+        # Saved sessions expose the token's expiry like the real site's JWT
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, '8123.json')
+            with open(path, 'w') as f:
+                json.dump({'cookies': [], 'origins': [{'origin': self.url, 'localStorage': [{'name': 'token', 'value': token}]}]}, f)
+            self.assertGreater(sessions.token_expiry(path), time.time())
+
+        self.assertEqual(self._call('/api/state')[0], 401)
+        state = json.loads(self._call('/api/state', token=token)[1])
+        self.assertEqual((state['completed'], state['total']), (0, 30))
+        state = json.loads(self._call('/api/task', {}, token=token)[1])
+        self.assertEqual(state['completed'], 1)
+        state = json.loads(self._call('/api/checkin', {}, token=token)[1])
+        import datetime
+        self.assertIn(datetime.date.today().day, state['calendar'])
+        self.assertTrue(json.loads(self._call('/api/config')[1])['popups'])
+
+    def test_static_assets_support_etag_revalidation(self):
+        status, body, headers = self._call('/static/app.js')
+        self.assertEqual(status, 200)
+        self.assertIn(b'van-progress__pivot', body)
+        status, _, _ = self._call('/static/app.js', headers={'If-None-Match': headers['ETag']})
+        self.assertEqual(status, 304)
+
+    def test_expired_token_is_rejected(self):
+        from mba_automation import mock_site
+        token = mock_site.make_token('8123', ttl=-10)
+        self.assertEqual(self._call('/api/state', token=token)[0], 401)
+
+
+class TestSyncPlanner(unittest.TestCase):
+    def setUp(self):
+        import datetime
+        self.dt = datetime
+        # A Monday, so no tier has its payout day
+        self.now = datetime.datetime(2025, 4, 7, 12, 0)
+
+    def _acc(self, age_minutes, **extra):
+        ts = (self.now - self.dt.timedelta(minutes=age_minutes)).isoformat()
+        acc = {'level': 'E2', 'sync_sources': {s: ts for s in planner.SOURCES}}
+        acc.update(extra)
+        return acc
+
+    def test_fresh_sources_are_skipped(self):
+        self.assertEqual(planner.plan_sync(self._acc(5), now=self.now, checked_in=True), set())
+        self.assertEqual(planner.plan_sync(self._acc(5), now=self.now), {'checkin'})
+        self.assertEqual(planner.plan_sync({}, now=self.now, checked_in=True), set(planner.MAX_AGE))
+        self.assertEqual(planner.plan_sync(self._acc(90), now=self.now, checked_in=True), {'progress', 'balance'})
+
+    def test_task_run_and_payout_day_mark_sources_stale(self):
+        last_run = (self.now - self.dt.timedelta(minutes=1)).isoformat()
+        self.assertEqual(planner.plan_sync(self._acc(5, last_run_ts=last_run), now=self.now, checked_in=True),
+                         {'progress', 'balance'})
+        thursday = self.dt.datetime(2025, 4, 10, 12, 0)
+        acc = self._acc(5)
+        acc['sync_sources'] = {s: (thursday - self.dt.timedelta(minutes=20)).isoformat() for s in planner.SOURCES}
+        self.assertEqual(planner.plan_sync(acc, now=thursday, checked_in=True), {'balance'})
+
+    def test_completed_day_skips_progress(self):
+        acc = self._acc(45, daily_progress={'2025-04-07': {'completed': 30, 'total': 30}})
+        self.assertEqual(planner.plan_sync(acc, now=self.now, checked_in=True), set())
+
+
+class TestBench(unittest.TestCase):
+    def test_stats_and_regression_check(self):
+        from mba_automation import bench
+        stats = bench._stats([3.0, 1.0, 2.0])
+        self.assertEqual((stats['count'], stats['p50'], stats['max']), (3, 2.0, 3.0))
+        self.assertEqual(bench._stats([]), {})
+        baseline = {'runs': [{'mode': 'task', 'accounts': 10, 'per_account': {'mean': 10.0}},
+                             {'mode': 'sync', 'accounts': 10, 'per_account': {'mean': 4.0}}]}
+        results = {'runs': [{'mode': 'task', 'accounts': 10, 'per_account': {'mean': 11.0}},
+                            {'mode': 'sync', 'accounts': 10, 'per_account': {'mean': 6.0}},
+                            {'mode': 'sync', 'accounts': 50, 'per_account': {'mean': 6.0}}]}
+        regressions = bench.compare(results, baseline, tolerance=0.2)
+        self.assertEqual([(r['mode'], r['accounts']) for r in regressions], [('sync', 10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
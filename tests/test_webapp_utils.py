@@ -3,11 +3,20 @@ import tempfile
 import os
 import json
 import re
+import time
+import threading
 
 import sys
 import os
 # ensure project root is on path so imports like 'import webapp' work
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Keep the webapp's log, event files and runner socket out of the repo, and
+# don't start its background threads on import
+_TEST_TMP = tempfile.mkdtemp(prefix='mba-tests-')
+os.environ.setdefault('MBA_BACKGROUND', '0')
+os.environ.setdefault('MBA_EVENTS_DIR', os.path.join(_TEST_TMP, 'events'))
+os.environ.setdefault('MBA_WEBAPP_LOG', os.path.join(_TEST_TMP, 'runs.log'))
+os.environ.setdefault('MBA_RUNNER_SOCKET', os.path.join(_TEST_TMP, 'runner.sock'))
 import webapp
 
 
@@ -107,6 +116,721 @@ class TestWebappUtils(unittest.TestCase):
         finally:
             webapp.JOB_QUEUE = orig_q
 
+    def test_run_index_latest_covers_all_job_kinds(self):
+        from utils.run_index import RunIndex
+        idx = RunIndex(key_fn=webapp.normalize_phone)
+        with tempfile.TemporaryDirectory() as d:
+            for name in ['automation_8123_20250101_080000.log',
+                         'schedule_8123_20250102_080000.log',
+                         'sync_8123_20250103_080000.log',
+                         'manual_8999_20250104_080000.log',
+                         'refresh_8999_20250105_030000.log',
+                         'notes.txt']:
+                open(os.path.join(d, name), 'w').close()
+            self.assertEqual(idx.seed(d), 5)
+            self.assertTrue(idx.latest('08123')['log_file'].endswith('sync_8123_20250103_080000.log'))
+            self.assertEqual([r['kind'] for r in idx.history('8123')], ['sync', 'schedule', 'manual'])
+            self.assertEqual(idx.latest('8999')['kind'], 'refresh')
+
+            idx.record_start('8123', os.path.join(d, 'manual_8123_20250105_080000.log'), 'manual')
+            self.assertEqual(idx.latest('628123')['kind'], 'manual')
+            self.assertIsNone(idx.latest('628123')['finished'])
+            idx.record_finish(os.path.join(d, 'manual_8123_20250105_080000.log'), 0)
+            self.assertEqual(idx.latest('628123')['returncode'], 0)
+
+    def test_api_phone_logs_reads_from_index(self):
+        from utils.run_index import RunIndex
+        orig = webapp.JOB_QUEUE
+        idx = RunIndex(key_fn=webapp.normalize_phone)
+        with tempfile.TemporaryDirectory() as d:
+            try:
+                webapp.JOB_QUEUE = self._idle_job_queue(d, runs=idx)
+                client = webapp.app.test_client()
+                self.assertEqual(client.get('/api/logs/8123').status_code, 404)
+                path = os.path.join(d, 'schedule_8123_20250102_080000.log')
+                with open(path, 'w') as f:
+                    f.write('hello log')
+                idx.record_start('8123', path, 'schedule')
+                resp = client.get('/api/logs/8123')
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(resp.get_data(as_text=True), 'hello log')
+                runs = client.get('/api/runs/8123').get_json()['runs']
+                self.assertEqual(runs[0]['log_name'], 'schedule_8123_20250102_080000.log')
+            finally:
+                webapp.JOB_QUEUE.close()
+                webapp.JOB_QUEUE = orig
+
+    def test_log_store_filters_by_phone_level_run_and_time(self):
+        from utils.log_store import LogStore
+        with tempfile.TemporaryDirectory() as d:
+            rows = [
+                {"ts": "2025-01-01T08:00:00.000", "level": "INFO", "phone": "628111", "run_id": "r1", "phase": "login", "msg": "a"},
+                {"ts": "2025-01-01T08:00:05.000", "level": "ERROR", "phone": "628111", "run_id": "r1", "phase": "tasks", "msg": "b"},
+                {"ts": "2025-01-02T09:00:00.000", "level": "INFO", "phone": "628222", "run_id": "r2", "phase": "login", "msg": "c"},
+                {"ts": "2025-01-02T09:30:00.000", "level": "INFO", "phone": "628111", "run_id": "r3", "phase": "run", "msg": "d"},
+            ]
+            for r in rows:
+                with open(os.path.join(d, r['ts'][:10] + '.jsonl'), 'a') as f:
+                    f.write(json.dumps(r) + "\n")
+            store = LogStore(d)
+            self.assertEqual([r['msg'] for r in store.query(phone='628111')], ['d', 'b', 'a'])
+            self.assertEqual([r['msg'] for r in store.query(level='error')], ['b'])
+            self.assertEqual([r['msg'] for r in store.query(run_id='r1', phone='628111')], ['b', 'a'])
+            self.assertEqual([r['msg'] for r in store.query(since='2025-01-02T00:00:00')], ['d', 'c'])
+            self.assertEqual([r['msg'] for r in store.query(until='2025-01-01T08:00:01')], ['a'])
+            self.assertEqual(len(store.query(limit=2)), 2)
+
+            # New lines are picked up incrementally
+            with open(os.path.join(d, '2025-01-02.jsonl'), 'a') as f:
+                f.write(json.dumps({"ts": "2025-01-02T10:00:00.000", "level": "WARNING", "phone": "628222", "msg": "e"}) + "\n")
+            self.assertEqual([r['msg'] for r in store.query(phone='628222')], ['e', 'c'])
+
+            with open(os.path.join(d, '2025-01-02.jsonl'), 'a') as f:
+                for n, calls in enumerate((4, 8)):
+                    f.write(json.dumps({"ts": f"2025-01-02T11:00:0{n}.000", "level": "INFO", "phone": "628111",
+                                        "phase": "instrument", "msg": "m", "navigation_calls": calls}) + "\n")
+            self.assertEqual(len(store.query(phase='instrument', phone='628111')), 2)
+
+            orig = webapp.LOG_STORE
+            try:
+                webapp.LOG_STORE = store
+                data = webapp.app.test_client().get('/api/logs?phone=8111&level=ERROR').get_json()
+                self.assertEqual(data['total'], 1)
+                self.assertEqual(data['logs'][0]['message'], 'b')
+                self.assertEqual(data['logs'][0]['timestamp'], '2025-01-01 08:00:05')
+                perf = webapp.app.test_client().get('/api/instrumentation?phone=8111').get_json()
+                self.assertEqual([r['navigation_calls'] for r in perf['runs']], [8, 4])
+                self.assertEqual(perf['summary']['navigation_calls'], 6)
+            finally:
+                webapp.LOG_STORE = orig
+
+    def test_log_retention_compresses_and_enforces_budgets(self):
+        import datetime
+        from utils.run_index import RunIndex
+        from utils import log_retention
+        with tempfile.TemporaryDirectory() as d:
+            events_dir = os.path.join(d, 'events')
+            os.makedirs(events_dir)
+            for name, size in [('manual_8111_20250101_080000.log', 10),
+                               ('sync_8111_20250109_080000.log', 4000),
+                               ('schedule_8222_20250110_080000.log', 4000)]:
+                with open(os.path.join(d, name), 'w') as f:
+                    f.write(os.urandom(size // 2).hex())
+            for day in ['2025-01-01', '2025-01-10']:
+                with open(os.path.join(events_dir, day + '.jsonl'), 'w') as f:
+                    f.write('{}\n')
+
+            idx = RunIndex(key_fn=webapp.normalize_phone, max_history=None)
+            idx.seed(d)
+            budget = [3, 1]
+            ret = log_retention.LogRetention(idx, events_dir, budget_fn=lambda: tuple(budget))
+            removed = ret.sweep(now=datetime.datetime(2025, 1, 10, 12, 0))
+            names = sorted(os.path.basename(p) for p in removed)
+            self.assertEqual(names, ['2025-01-01.jsonl', 'manual_8111_20250101_080000.log'])
+
+            # Survivors are compressed, indexed under their new name and still readable
+            latest = idx.latest('8111')['log_file']
+            self.assertTrue(latest.endswith('sync_8111_20250109_080000.log.gz'))
+            with log_retention.open_log(latest) as f:
+                self.assertEqual(len(f.read()), 4000)
+            # Uncompressed name still resolves to the .gz file
+            with log_retention.open_log(latest[:-3]) as f:
+                self.assertEqual(len(f.read()), 4000)
+
+            # Size budget drops the oldest compressed run first
+            budget[1] = (os.path.getsize(idx.latest('8222')['log_file']) + 10) / (1024 * 1024)
+            removed = ret.sweep(now=datetime.datetime(2025, 1, 10, 12, 0))
+            self.assertEqual([os.path.basename(p) for p in removed], ['sync_8111_20250109_080000.log.gz'])
+            self.assertIsNone(idx.latest('8111'))
+            self.assertIsNotNone(idx.latest('8222'))
+
+    def test_seeded_logs_stay_live_until_the_job_timeout(self):
+        import datetime
+        from utils.run_index import RunIndex
+        from utils import log_retention
+        idx = RunIndex(key_fn=webapp.normalize_phone)
+        with tempfile.TemporaryDirectory() as d:
+            for name in ('sync_8111_20250110_080000.log', 'sync_8222_20250110_115000.log'):
+                with open(os.path.join(d, name), 'w') as f:
+                    f.write('x' * 100)
+            now = datetime.datetime(2025, 1, 10, 12, 0)
+            idx.seed(d, live_for=3600, now=now)
+            self.assertIsNotNone(idx.latest('8111')['finished'])
+            # Possibly still written by a job that outlived the previous owner
+            self.assertIsNone(idx.latest('8222')['finished'])
+
+            ret = log_retention.LogRetention(idx, None, budget_fn=lambda: (3, 0), job_timeout=3600)
+            ret.sweep(now=now)
+            self.assertTrue(os.path.exists(os.path.join(d, 'sync_8222_20250110_115000.log')))
+            self.assertIsNone(idx.latest('8111'))
+            # Past the job timeout it is closed, compressed and budgeted like any other
+            ret.sweep(now=now + datetime.timedelta(hours=2))
+            self.assertEqual(os.listdir(d), [])
+
+    def test_log_retention_prunes_run_profiles(self):
+        import datetime
+        from utils.run_index import RunIndex
+        from utils import log_retention
+        with tempfile.TemporaryDirectory() as d:
+            now = datetime.datetime(2025, 1, 10, 12, 0)
+            for name, age_days in (('8111_20250101_080000.prof', 9), ('8111_20250110_080000.prof', 0)):
+                path = os.path.join(d, name)
+                with open(path, 'w') as f:
+                    f.write('x' * 1000)
+                stamp = (now - datetime.timedelta(days=age_days)).timestamp()
+                os.utime(path, (stamp, stamp))
+            budget = [3, 1]
+            ret = log_retention.LogRetention(RunIndex(), None, budget_fn=lambda: tuple(budget), profiles_dir=d)
+            self.assertEqual([os.path.basename(p) for p in ret.sweep(now=now)], ['8111_20250101_080000.prof'])
+            # Profiles count toward the size budget too
+            budget[1] = 500 / (1024 * 1024)
+            self.assertEqual([os.path.basename(p) for p in ret.sweep(now=now)], ['8111_20250110_080000.prof'])
+
+    def test_log_retention_evicts_logs_it_could_not_compress(self):
+        import datetime
+        from utils.run_index import RunIndex
+        from utils import log_retention
+        with tempfile.TemporaryDirectory() as d:
+            for name in ('sync_8111_20250109_080000.log', 'sync_8222_20250110_080000.log'):
+                with open(os.path.join(d, name), 'w') as f:
+                    f.write('x' * 4000)
+            idx = RunIndex(key_fn=webapp.normalize_phone, max_history=None)
+            idx.seed(d)
+            ret = log_retention.LogRetention(idx, None, budget_fn=lambda: (3, 5000 / (1024 * 1024)))
+            orig_gzip = log_retention.gzip_file
+            try:
+                log_retention.gzip_file = lambda src, dst=None: (_ for _ in ()).throw(OSError('disk full'))
+                with self.assertLogs(log_retention.logger, 'WARNING') as logs:
+                    removed = ret.sweep(now=datetime.datetime(2025, 1, 10, 12, 0))
+                    ret.sweep(now=datetime.datetime(2025, 1, 10, 12, 0))
+            finally:
+                log_retention.gzip_file = orig_gzip
+            # Over budget: the older uncompressed log goes, and each failure is warned about once
+            self.assertEqual([os.path.basename(p) for p in removed], ['sync_8111_20250109_080000.log'])
+            self.assertEqual(len([m for m in logs.output if 'failed to compress' in m]), 2)
+
+    def test_loadtest_dataset_is_served_and_restored(self):
+        sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+        import loadtest_webapp as lt
+        orig = webapp.data_manager.accounts_file
+        with tempfile.TemporaryDirectory() as d:
+            phones = lt.build_dataset(d, 3, 10, runs_per_account=2)
+            with lt.use_dataset(d):
+                data = webapp.app.test_client().get('/api/accounts').get_json()
+                self.assertEqual(len(data['accounts']), 3)
+                self.assertEqual(len(webapp._runs().history(phones[0])), 2)
+                stats = lt.measure(lambda: f"/api/logs/{phones[1]}", requests=4, concurrency=2)
+                self.assertEqual((stats['count'], stats['errors']), (4, 0))
+        self.assertEqual(webapp.data_manager.accounts_file, orig)
+
+    def test_metrics_registry_renders_prometheus_text(self):
+        from utils import metrics
+        reg = metrics.Registry()
+        jobs = reg.counter('jobs_total', 'Jobs', ('kind',))
+        jobs.inc(kind='sync')
+        jobs.inc(2, kind='sync')
+        hist = reg.histogram('wait_seconds', 'Wait', buckets=(1, 10))
+        for v in (0.5, 5, 50):
+            hist.observe(v)
+        reg.gauge('depth', 'Depth', ('kind',), fn=lambda: {'manual': 2})
+        self.assertIs(reg.counter('jobs_total', 'Jobs', ('kind',)), jobs)
+        text = reg.render()
+        self.assertIn('# TYPE jobs_total counter\njobs_total{kind="sync"} 3\n', text)
+        self.assertIn('wait_seconds_bucket{le="1"} 1\nwait_seconds_bucket{le="10"} 2\nwait_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn('wait_seconds_sum 55.5\nwait_seconds_count 3\n', text)
+        self.assertIn('depth{kind="manual"} 2\n', text)
+        with self.assertRaises(ValueError):
+            jobs.inc(kind='sync', extra='x')
+
+    def _idle_job_queue(self, d, **services):
+        # A runner that never executes locally, on its own socket
+        from utils.job_runner import JobQueue
+        return JobQueue(lambda job: None, os.path.join(d, 'runner.sock'), os.path.join(d, 'runner.lock'),
+                        should_run=lambda: False, services=services).start()
+
+    def test_metrics_endpoint_reports_queue_by_kind(self):
+        orig_q = webapp.JOB_QUEUE
+        with tempfile.TemporaryDirectory() as d:
+            try:
+                webapp.JOB_QUEUE = self._idle_job_queue(d)
+                webapp.JOB_QUEUE.put({'cmd': [], 'kind': 'sync', 'phone_display': '8111'})
+                webapp.JOB_QUEUE.put({'cmd': [], 'kind': 'sync', 'phone_display': '8222'})
+                webapp.JOB_QUEUE.put({'cmd': [], 'is_sync': False, 'phone_display': '8111'})
+                self.assertIsNotNone(webapp.JOB_QUEUE.status()['queued'][0]['enqueued_at'])
+                resp = webapp.app.test_client().get('/metrics')
+                text = resp.get_data(as_text=True)
+                self.assertTrue(resp.content_type.startswith('text/plain'))
+                self.assertIn('mba_queue_depth{kind="sync"} 2', text)
+                self.assertIn('mba_queue_depth{kind="manual"} 1', text)
+                self.assertIn('mba_active_jobs 0', text)
+                self.assertIn('# TYPE mba_job_duration_seconds histogram', text)
+            finally:
+                webapp.JOB_QUEUE.close()
+                webapp.JOB_QUEUE = orig_q
+
+    def test_job_runner_steals_work_but_never_runs_one_phone_twice(self):
+        import threading
+        from utils.job_runner import JobRunner
+        lock = threading.Lock()
+        running, overlaps, done = set(), [], []
+        finished = threading.Event()
+
+        def execute(job):
+            phone = job['phone_display']
+            with lock:
+                if phone in running:
+                    overlaps.append(phone)
+                running.add(phone)
+            time.sleep(0.05)
+            with lock:
+                running.discard(phone)
+                done.append(phone)
+                if len(done) == 6:
+                    finished.set()
+
+        runner = JobRunner(execute, slots=3)
+        # Everything for one phone lands on one slot; the idle slots must steal the others
+        for phone in ('8111', '8111', '8111', '8222', '8333', '8444'):
+            runner.put({'phone_display': phone})
+        self.assertEqual(len(runner.status()['queued']), 6)
+        runner.start()
+        self.assertTrue(finished.wait(10))
+        self.assertEqual(overlaps, [])
+        self.assertEqual(sorted(done), ['8111', '8111', '8111', '8222', '8333', '8444'])
+        self.assertEqual(runner.status()['running'], [])
+
+    def test_job_queue_forwards_to_the_owning_process(self):
+        from utils.job_runner import JobQueue
+        with tempfile.TemporaryDirectory() as d:
+            owner = self._idle_job_queue(d)
+            # A second process on the same paths cannot take the lock and talks over the socket
+            other = JobQueue(lambda job: None, os.path.join(d, 'runner.sock'), os.path.join(d, 'runner.lock')).start()
+            try:
+                self.assertTrue(owner.owner)
+                self.assertFalse(other.owner)
+                other.put({'cmd': ['secret-password'], 'phone_display': '8111', 'kind': 'manual'})
+                self.assertEqual(owner.qsize(), 1)
+                self.assertNotIn('cmd', other.status()['queued'][0])
+                record, expired = other.claim('pixel')
+                self.assertEqual(record['job']['cmd'], ['secret-password'])
+                self.assertEqual(expired, [])
+                self.assertEqual(owner.pending(), 1)
+                self.assertIsNotNone(other.touch(record['id']))
+                self.assertIsNotNone(other.finish(record['id']))
+                self.assertEqual(owner.pending(), 0)
+                # Owner gone: the next call takes the runner over
+                owner.close()
+                other.put({'cmd': [], 'phone_display': '8222'})
+                self.assertTrue(other.owner)
+                self.assertEqual(other.qsize(), 1)
+            finally:
+                other.close()
+                owner.close()
+
+    def test_remote_claim_keeps_the_phone_busy_for_local_slots(self):
+        from utils.job_runner import JobQueue
+        ran = []
+        started = threading.Event()
+
+        def execute(job):
+            ran.append(job['phone_display'])
+            started.set()
+
+        with tempfile.TemporaryDirectory() as d:
+            q = JobQueue(execute, os.path.join(d, 'runner.sock'), os.path.join(d, 'runner.lock'), lease=60).start()
+            try:
+                q.runner.should_run = lambda: False
+                q.put({'cmd': [], 'phone_display': '8111', 'kind': 'manual'})
+                record, _ = q.claim('remote-a')
+                self.assertIsNotNone(record)
+                q.runner.should_run = lambda: True
+                q.put({'cmd': [], 'phone_display': '8111', 'kind': 'sync'})
+                with q.runner.cond:
+                    q.runner.cond.notify_all()
+                self.assertFalse(started.wait(0.3))
+                self.assertEqual(len(q.status()['queued']), 1)
+
+                # The result frees the phone and the local sync runs
+                q.finish(record['id'])
+                self.assertTrue(started.wait(5))
+                self.assertEqual(ran, ['8111'])
+
+                # An expired lease frees the phone too
+                started.clear()
+                q.runner.should_run = lambda: False
+                q.put({'cmd': [], 'phone_display': '8222'})
+                record, _ = q.claim('remote-b')
+                # The owner hands out its own lease record; age it past the lease
+                record['seen'] -= 120
+                q.runner.should_run = lambda: True
+                self.assertEqual(q.status()['remote']['remote-b']['jobs'], [])
+                self.assertTrue(started.wait(5))
+                self.assertEqual(ran, ['8111', '8222'])
+            finally:
+                q.close()
+
+    def test_telegram_dispatcher_batches_and_honours_rate_limits(self):
+        from utils.notify import TelegramDispatcher, split_message
+        posts = []
+
+        class _Session:
+            # Rate-limits the first call, accepts the rest
+            def post(self, url, json=None, timeout=None):
+                posts.append(json['text'])
+                if len(posts) == 1:
+                    return type('Resp', (), {'status_code': 429, 'text': '',
+                                             'json': lambda _: {'parameters': {'retry_after': 0}}})()
+                return type('Resp', (), {'status_code': 200, 'text': 'ok'})()
+
+        observed = []
+        notifier = TelegramDispatcher(lambda: ('token', 'chat'), render_batch=lambda items: ['+'.join(items)],
+                                      window=0.2, min_interval=0, observe=lambda s, result: observed.append(result))
+        notifier.session = _Session()
+        notifier.start()
+        notifier.send('hello')
+        for phone in ('8111', '8222', '8333'):
+            notifier.add(phone)
+        notifier.join()
+        self.assertEqual(posts, ['hello', 'hello', '8111+8222+8333'])
+        self.assertEqual(observed, ['rate_limited', 'ok', 'ok'])
+        self.assertEqual(split_message(['a' * 6, 'b' * 6, 'c'], limit=10), ['a' * 6, 'b' * 6 + '\nc'])
+
+    def test_telegram_dispatcher_survives_a_failing_send(self):
+        from utils.notify import TelegramDispatcher
+        calls = []
+
+        def credentials():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError('settings unreadable')
+            return None, None
+
+        notifier = TelegramDispatcher(credentials, min_interval=0).start()
+        with self.assertLogs('utils.notify', 'ERROR'):
+            notifier.send('first')
+            notifier.join()
+        # The thread is still alive and join() did not hang
+        notifier.send('second')
+        notifier.join()
+        self.assertEqual(len(calls), 2)
+
+    def test_daily_report_aggregates_accounts_and_runs(self):
+        import datetime
+        from utils.report import daily_report
+        accounts = [
+            {'phone': '628111', 'schedule': '08:00', 'last_run_ts': '2025-01-07T08:00:05',
+             'daily_progress': {'2025-01-06': {'balance': 1000, 'income': 100},
+                                '2025-01-07': {'completed': 60, 'total': 60, 'balance': 1500, 'income': 150}}},
+            {'phone': '628222', 'schedule': '09:00', 'last_run_ts': '2025-01-06T09:00:00',
+             'daily_progress': {'2025-01-06': {'balance': 700, 'income': 70}}},
+            {'phone': '628333', 'schedule': '23:00',
+             'daily_progress': {'2025-01-07': {'completed': 10, 'total': 60, 'balance': 50}}},
+        ]
+        runs = [
+            {'phone': '628111', 'kind': 'schedule', 'started': '2025-01-07T08:00:05', 'finished': '2025-01-07T08:12:05', 'returncode': 0},
+            {'phone': '628333', 'kind': 'manual', 'started': '2025-01-07T10:00:00', 'finished': '2025-01-07T10:01:00', 'returncode': 1},
+            {'phone': '628333', 'kind': 'sync', 'started': '2025-01-07T11:00:00', 'finished': None, 'returncode': None},
+            {'phone': '628222', 'kind': 'schedule', 'started': '2025-01-06T09:00:00', 'finished': '2025-01-06T10:00:00', 'returncode': 0},
+        ]
+        rep = daily_report(accounts, runs, '2025-01-07', now=datetime.datetime(2025, 1, 7, 20, 0))
+        self.assertEqual((rep['accounts'], rep['completed'], rep['partial']), (3, 1, 1))
+        self.assertEqual(rep['no_progress'], ['628222'])
+        self.assertEqual(rep['balance'], 1500 + 700 + 50)
+        self.assertEqual(rep['balance_delta'], 500 + 50)
+        self.assertEqual(rep['income_delta'], 50)
+        self.assertEqual(rep['missed_schedule'], ['628222'])
+        self.assertEqual((rep['runs'], rep['running']), (3, 1))
+        self.assertEqual(rep['failed'], [{'phone': '628333', 'kind': 'manual', 'returncode': 1}])
+        self.assertEqual([r['seconds'] for r in rep['slowest']], [720, 60])
+        # Sundays have no scheduled runs to miss
+        self.assertEqual(daily_report(accounts, [], '2025-01-05')['missed_schedule'], [])
+
+    def test_daily_digest_is_sent_once_after_its_time(self):
+        import datetime
+        sent = []
+        recorder = type('Recorder', (), {'send': lambda _, msg: sent.append(msg)})()
+        dm = webapp.data_manager
+        saved = (dm.accounts_file, dm.settings_file, webapp.DIGEST_STATE_FILE, webapp.NOTIFIER)
+        with tempfile.TemporaryDirectory() as d:
+            try:
+                dm.accounts_file = os.path.join(d, 'accounts.json')
+                dm.settings_file = os.path.join(d, 'settings.json')
+                webapp.DIGEST_STATE_FILE = os.path.join(d, 'digest_state.json')
+                webapp.NOTIFIER = recorder
+                dm.write_accounts([{'phone': '628111', 'password': 'x'}])
+                dm.save_settings({'digest_time': '21:00'})
+                self.assertFalse(webapp._maybe_send_daily_digest(datetime.datetime(2025, 1, 7, 20, 59)))
+                self.assertTrue(webapp._maybe_send_daily_digest(datetime.datetime(2025, 1, 7, 21, 0)))
+                self.assertFalse(webapp._maybe_send_daily_digest(datetime.datetime(2025, 1, 7, 22, 0)))
+                self.assertEqual(len(sent), 1)
+                self.assertIn('Laporan Harian 2025-01-07', sent[0])
+                # Several processes racing on the same day: exactly one sends
+                racing = datetime.datetime(2025, 1, 8, 21, 0)
+                results = []
+                threads = [threading.Thread(target=lambda: results.append(webapp._maybe_send_daily_digest(racing)))
+                           for _ in range(4)]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+                self.assertEqual(sorted(results), [False, False, False, True])
+                self.assertIn('Tanpa progress hari ini: 1 akun', sent[0])
+                resp = webapp.app.test_client().get('/api/report/daily?day=2025-01-07')
+                self.assertEqual(resp.get_json()['no_progress'], ['628111'])
+                self.assertEqual(webapp.app.test_client().get('/api/report/daily?day=nope').status_code, 400)
+            finally:
+                dm.accounts_file, dm.settings_file, webapp.DIGEST_STATE_FILE, webapp.NOTIFIER = saved
+
+    def test_daily_report_uses_the_runner_owners_runs(self):
+        from utils.run_index import RunIndex
+        from utils.job_runner import JobQueue
+        idx = RunIndex(key_fn=webapp.normalize_phone)
+        saved = (webapp.JOB_QUEUE, webapp.data_manager.accounts_file)
+        with tempfile.TemporaryDirectory() as d:
+            owner = self._idle_job_queue(d, runs=idx)
+            try:
+                webapp.data_manager.accounts_file = os.path.join(d, 'accounts.json')
+                webapp.data_manager.write_accounts([{'phone': '628111', 'password': 'x'}])
+                log_file = os.path.join(d, 'manual_8111_20250107_100000.log')
+                idx.record_start('8111', log_file, 'manual')
+                idx.record_finish(log_file, 1)
+                day = idx.latest('8111')['started'][:10]
+                # This process does not own the runner and has recorded nothing itself
+                webapp.JOB_QUEUE = JobQueue(lambda job: None, owner.socket_path, owner.lock_path).start()
+                rep = webapp._daily_report(day)
+                self.assertEqual(rep['runs'], 1)
+                self.assertEqual(rep['failed'], [{'phone': '628111', 'kind': 'manual', 'returncode': 1}])
+            finally:
+                webapp.JOB_QUEUE.close()
+                owner.close()
+                webapp.JOB_QUEUE, webapp.data_manager.accounts_file = saved
+
+    def test_session_refresh_claims_only_accounts_it_can_refresh(self):
+        import datetime
+        import base64
+        from mba_automation.sessions import SessionManager
+        dm = webapp.data_manager
+        saved = (dm.accounts_file, dm.settings_file, webapp.JOB_QUEUE, webapp.SessionManager)
+        with tempfile.TemporaryDirectory() as d:
+            meta = os.path.join(d, 'meta.json')
+            # Both sessions expire within the refresh horizon
+            payload = base64.urlsafe_b64encode(json.dumps({'exp': time.time() + 60}).encode()).decode().rstrip('=')
+            for phone in ('8111', '8222'):
+                with open(os.path.join(d, f'{phone}.json'), 'w') as f:
+                    json.dump({'cookies': [], 'origins': [{'origin': 'https://mba7.com', 'localStorage': [
+                        {'name': 'token', 'value': f'eyJhbGciOiJIUzI1NiJ9.{payload}.sig'}]}]}, f)
+                SessionManager(meta).record_login(phone)
+            try:
+                dm.accounts_file = os.path.join(d, 'accounts.json')
+                dm.settings_file = os.path.join(d, 'settings.json')
+                webapp.JOB_QUEUE = self._idle_job_queue(d)
+                webapp.SessionManager = lambda: SessionManager(meta)
+                dm.write_accounts([{'phone': '628111', 'password': 'x'}, {'phone': '628222', 'password': ''}])
+                now = datetime.datetime.now().replace(hour=3, minute=0)
+                self.assertEqual(webapp._refresh_expiring_sessions(now), 1)
+                self.assertEqual([j['phone'] for j in webapp.JOB_QUEUE.status()['queued']], ['8111'])
+                # The account without a password did not use up today's claim
+                self.assertTrue(SessionManager(meta).claim_refresh('8222', now.date().isoformat()))
+            finally:
+                webapp.JOB_QUEUE.close()
+                dm.accounts_file, dm.settings_file, webapp.JOB_QUEUE, webapp.SessionManager = saved
+
+    def test_render_completions_digest(self):
+        import datetime
+        today = datetime.date.today().isoformat()
+        orig = webapp.data_manager.accounts_file
+        with tempfile.TemporaryDirectory() as d:
+            try:
+                webapp.data_manager.accounts_file = os.path.join(d, 'accounts.json')
+                webapp.data_manager.write_accounts([
+                    {'phone': '628111', 'password': 'x', 'daily_progress': {today: {'completed': 60, 'total': 60, 'balance': 1234567}}},
+                ])
+                single = webapp._render_completions(['8111'])
+                self.assertEqual(len(single), 1)
+                self.assertIn('Rp 1.234.567', single[0])
+                digest = webapp._render_completions(['8111', '8999', '8111'])
+                self.assertEqual(len(digest), 1)
+                self.assertIn('2 Tugas Selesai', digest[0])
+                self.assertIn('<code>8999</code> 📊 0/60', digest[0])
+            finally:
+                webapp.data_manager.accounts_file = orig
+
+    def test_settings_store_caches_reloads_and_notifies(self):
+        from utils.settings import SettingsStore
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'settings.json')
+            store = SettingsStore(path)
+            seen = []
+            store.subscribe(lambda changed, settings: seen.append(changed), keys=('job_slots',))
+            self.assertEqual(store.all(), {})
+            self.assertEqual(store.update({'job_slots': '3', 'log_level': 'INFO'}), {'job_slots': '3', 'log_level': 'INFO'})
+            self.assertEqual(store.get_int('job_slots', 1), 3)
+            self.assertEqual(store.update({'log_level': 'INFO'}), {})
+            self.assertEqual(seen, [{'job_slots': '3', 'log_level': 'INFO'}])
+            # Another process rewrites the file: picked up by mtime/size, subscribers told
+            with open(path, 'w') as f:
+                json.dump({'job_slots': 2, 'local_worker': 'off', 'digest_time': '25:00'}, f)
+            self.assertEqual(store.get_int('job_slots'), 2)
+            self.assertEqual(seen[-1], {'job_slots': 2, 'log_level': None, 'local_worker': 'off', 'digest_time': '25:00'})
+            self.assertIs(store.get_bool('local_worker', True), False)
+            self.assertIsNone(store.get_time('digest_time'))
+            self.assertEqual(store.get_float('missing', 1.5), 1.5)
+
+    def test_settings_save_merges_and_resizes_runner(self):
+        dm = webapp.data_manager
+        saved = (dm.settings_file, webapp.JOB_QUEUE)
+        with tempfile.TemporaryDirectory() as d:
+            try:
+                dm.settings_file = os.path.join(d, 'settings.json')
+                webapp.JOB_QUEUE = self._idle_job_queue(d)
+                dm.save_settings({'worker_token': 'keep-me', 'telegram_token': 'old'})
+                client = webapp.app.test_client()
+                resp = client.post('/settings/save', json={'telegram_token': 'new', 'job_slots': 3})
+                self.assertEqual(resp.get_json()['changed'], ['job_slots', 'telegram_token'])
+                self.assertEqual(client.get('/settings/get').get_json(),
+                                 {'worker_token': 'keep-me', 'telegram_token': 'new', 'job_slots': 3})
+                self.assertEqual(webapp.JOB_QUEUE.status()['slots'], 3)
+                self.assertEqual(client.post('/settings/save', json=[1]).status_code, 400)
+            finally:
+                webapp.JOB_QUEUE.close()
+                dm.settings_file, webapp.JOB_QUEUE = saved
+
+    def test_job_runner_slots_resize_live(self):
+        import threading
+        from utils.job_runner import JobRunner
+        release = threading.Event()
+        started = []
+        runner = JobRunner(lambda job: (started.append(job['phone_display']), release.wait(5)), slots=1).start()
+        for phone in ('8111', '8222', '8333'):
+            runner.put({'phone_display': phone})
+        deadline = time.time() + 5
+        while len(started) < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        runner.set_slots(3)
+        while len(started) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(sorted(started), ['8111', '8222', '8333'])
+        runner.set_slots(1)
+        release.set()
+        while len(runner.threads) > 1 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(list(runner.threads), [0])
+
+    def test_remote_job_leases_expire(self):
+        from utils.remote_jobs import RemoteJobs
+        jobs = RemoteJobs(lease=60)
+        a = jobs.lease({'phone_display': '8111'}, 'pixel', now=1000)
+        b = jobs.lease({'phone_display': '8222'}, 'tab', now=1000)
+        self.assertIsNotNone(jobs.touch(b['id'], now=1050))
+        self.assertEqual([r['id'] for r in jobs.expired(now=1070)], [a['id']])
+        self.assertIsNone(jobs.touch(a['id']))
+        self.assertEqual(jobs.active(), 1)
+        self.assertEqual(jobs.status(now=1070)['tab']['jobs'][0]['phone'], '8222')
+
+    def test_remote_worker_round_trip(self):
+        import datetime
+        from utils.run_index import RunIndex
+        from utils import log_retention
+        from mba_automation import remote_worker
+
+        class _TestClientSession:
+            # requests.Session stand-in that routes to the Flask test client
+            def __init__(self, client, headers):
+                self.client, self.headers = client, dict(headers)
+
+            def post(self, url, json=None, timeout=None):
+                resp = self.client.post(url[len('http://coordinator'):], json=json, headers=self.headers)
+                return type('Resp', (), {'status_code': resp.status_code, 'json': lambda _: resp.get_json()})()
+
+        script = (
+            "import json, os, datetime\n"
+            "p = os.environ['MBA_ACCOUNTS_FILE']\n"
+            "accs = json.load(open(p))\n"
+            "today = datetime.date.today().isoformat()\n"
+            "accs[0]['daily_progress'][today] = {'completed': 30, 'total': 30}\n"
+            "accs[0]['last_sync_ts'] = '2999-01-01T00:00:00'\n"
+            "json.dump(accs, open(p, 'w'))\n"
+            "print('ran for', accs[0]['phone'], 'password' in accs[0], os.environ.get('MBA_RUN_ID'))\n"
+        )
+        from utils.job_runner import JobQueue
+        saved = (webapp.JOB_QUEUE, webapp.data_manager.accounts_file, os.environ.get('MBA_WORKER_TOKEN'))
+        idx = RunIndex(key_fn=webapp.normalize_phone)
+        with tempfile.TemporaryDirectory() as d:
+            # The coordinator request lands in a process that does not own the runner:
+            # runs are recorded in (and compressed by) the owner
+            owner = self._idle_job_queue(d, runs=idx, retention=log_retention.LogRetention(idx))
+            try:
+                webapp.JOB_QUEUE = JobQueue(lambda job: None, owner.socket_path, owner.lock_path).start()
+                self.assertFalse(webapp.JOB_QUEUE.owner)
+                webapp.data_manager.accounts_file = os.path.join(d, 'accounts.json')
+                webapp.data_manager.write_accounts([
+                    {'phone': '628111', 'password': 'x', 'daily_progress': {'2020-01-01': {'completed': 1}}},
+                    {'phone': '628222', 'password': 'y'},
+                ])
+                os.environ['MBA_WORKER_TOKEN'] = 'secret'
+                client = webapp.app.test_client()
+                self.assertEqual(client.post('/api/worker/claim', json={}).status_code, 403)
+
+                log_file = os.path.join(d, 'sync_8111_20250101_080000.log')
+                webapp.JOB_QUEUE.put({'cmd': [sys.executable, '-c', script], 'log_file': log_file,
+                                      'phone_display': '8111', 'is_sync': True, 'kind': 'sync'})
+                worker = remote_worker.CoordinatorClient('http://coordinator', 'secret', 'pixel')
+                worker.session = _TestClientSession(client, worker.session.headers)
+                job = worker.claim()
+                self.assertEqual([a['phone'] for a in job['accounts']], ['628111'])
+                self.assertNotIn('password', job['accounts'][0])
+                self.assertEqual(client.get('/api/worker/status').get_json()['workers']['pixel']['jobs'][0]['phone'], '8111')
+                self.assertIsNone(worker.claim())
+
+                self.assertEqual(remote_worker.run_job(worker, job, heartbeat=1), 0)
+                acc = next(a for a in webapp.data_manager.load_accounts() if a['phone'] == '628111')
+                today = datetime.date.today().isoformat()
+                self.assertEqual(acc['daily_progress'][today]['completed'], 30)
+                self.assertIn('2020-01-01', acc['daily_progress'])
+                self.assertEqual(acc['password'], 'x')
+                self.assertEqual(acc['last_sync_ts'], '2999-01-01T00:00:00')
+                run = idx.latest('8111')
+                self.assertTrue(run['log_file'].endswith('.gz'))
+                self.assertEqual(run['returncode'], 0)
+                with log_retention.open_log(run['log_file']) as f:
+                    self.assertIn('ran for 628111 False sync_8111_20250101_080000', f.read())
+                self.assertEqual(client.post('/api/worker/result', json={'job_id': job['job_id']},
+                                             headers={'X-Worker-Token': 'secret'}).status_code, 410)
+            finally:
+                webapp.JOB_QUEUE.close()
+                owner.close()
+                webapp.JOB_QUEUE, webapp.data_manager.accounts_file, token = saved
+                if token is None:
+                    os.environ.pop('MBA_WORKER_TOKEN', None)
+                else:
+                    os.environ['MBA_WORKER_TOKEN'] = token
+
+    def test_worker_heartbeats_merge_accounts_without_rotating_backups(self):
+        orig = webapp.data_manager.accounts_file
+        with tempfile.TemporaryDirectory() as d:
+            try:
+                path = os.path.join(d, 'accounts.json')
+                webapp.data_manager.accounts_file = path
+                webapp.data_manager.write_accounts([{'phone': '628111', 'password': 'x'}])
+                backups = os.path.join(d, 'backups')
+                record = {'job': {'phone_display': '8111'}, 'day': '2025-01-01'}
+                remote = [{'phone': '628111', 'daily_progress': {'2025-01-01': {'completed': 5}}}]
+
+                taken = sorted(os.listdir(backups)) if os.path.isdir(backups) else []
+                webapp._apply_remote_accounts(record, remote)
+                self.assertEqual(sorted(os.listdir(backups)) if os.path.isdir(backups) else [], taken)
+                mtime = os.stat(path).st_mtime_ns
+                webapp._apply_remote_accounts(record, remote)
+                self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+                webapp._apply_remote_accounts(record, remote, final=True)
+                self.assertEqual(len(os.listdir(backups)), len(taken) + 1)
+                acc = webapp.data_manager.load_accounts()[0]
+                self.assertEqual(acc['daily_progress']['2025-01-01']['completed'], 5)
+                self.assertEqual(acc['password'], 'x')
+            finally:
+                webapp.data_manager.accounts_file = orig
+
     def test_schedule_regex(self):
         good = ['08:30', '8:30', '00:00', '23:59']
         for s in good:
@@ -0,0 +1,368 @@
+import os
+import json
+import time
+import fcntl
+import socket
+import logging
+import threading
+import socketserver
+from collections import deque
+
+from utils.remote_jobs import RemoteJobs, DEFAULT_LEASE
+
+logger = logging.getLogger(__name__)
+
+
+def _job_keys(job):
+    """Phones a job touches; two jobs sharing one never run at the same time."""
+    return {str(p) for p in (job.get('phones') or [job.get('phone_display')]) if p}
+
+
+def job_summary(job):
+    """What status() shows of a job (never the command line, it carries passwords)."""
+    return {
+        'phone': job.get('phone_display'),
+        'kind': job.get('kind', 'sync' if job.get('is_sync') else 'manual'),
+        'enqueued_at': job.get('enqueued_at'),
+    }
+
+
+class JobRunner:
+    """N executor slots, each with its own deque, stealing from the others when idle.
+
+    Jobs go to the slot their phone hashes to, so repeat jobs for one account
+    line up behind each other; an idle slot takes the oldest runnable job from
+    the longest other deque. A job never starts while another job for one of
+    its phones is running. should_run() returning False pauses local
+    execution (remote workers can still take() jobs). set_slots() changes
+    the slot count while running; a removed slot finishes its job, and the
+    jobs left in its deque are stolen by the others.
+    """
+
+    def __init__(self, execute, slots=1, should_run=None):
+        self.execute = execute
+        self.should_run = should_run or (lambda: True)
+        self.cond = threading.Condition()
+        self.slots = max(1, slots)
+        self.deques = [deque() for _ in range(self.slots)]
+        self.running = {}      # slot -> job
+        self.busy = set()      # phones with a running job
+        self.stolen = 0
+        self.threads = {}      # slot -> thread
+        self.started = False
+
+    def _spawn(self):
+        """Start a thread for every active slot without one (caller holds the lock)."""
+        for slot in range(self.slots):
+            if slot not in self.threads:
+                t = threading.Thread(target=self._slot_loop, args=(slot,), daemon=True, name=f"job-slot-{slot}")
+                self.threads[slot] = t
+                t.start()
+
+    def start(self):
+        with self.cond:
+            self.started = True
+            self._spawn()
+        return self
+
+    def set_slots(self, slots):
+        slots = max(1, int(slots))
+        with self.cond:
+            if slots == self.slots:
+                return
+            logger.info("Job runner: %d -> %d slots", self.slots, slots)
+            self.slots = slots
+            while len(self.deques) < slots:
+                self.deques.append(deque())
+            if self.started:
+                self._spawn()
+            self.cond.notify_all()
+
+    def put(self, job, block=True, timeout=None):
+        job.setdefault('enqueued_at', time.time())
+        keys = sorted(_job_keys(job))
+        slot = hash(keys[0]) % self.slots if keys else 0
+        with self.cond:
+            self.deques[slot].append(job)
+            self.cond.notify_all()
+
+    def _runnable(self, job):
+        return not (_job_keys(job) & self.busy)
+
+    def _pick(self, slot):
+        """Next job for `slot` (caller holds the lock): own deque first, else steal."""
+        own = self.deques[slot]
+        for i, job in enumerate(own):
+            if self._runnable(job):
+                del own[i]
+                return job
+        others = sorted((d for i, d in enumerate(self.deques) if i != slot), key=len, reverse=True)
+        for other in others:
+            for i, job in enumerate(other):
+                if self._runnable(job):
+                    del other[i]
+                    self.stolen += 1
+                    return job
+        return None
+
+    def take(self):
+        """Remove and return the oldest runnable job from any slot (for a remote worker), or None.
+
+        The job's phones count as busy until release(job).
+        """
+        with self.cond:
+            candidates = [(d[i].get('enqueued_at') or 0, n, i) for n, d in enumerate(self.deques)
+                          for i in range(len(d)) if self._runnable(d[i])]
+            if not candidates:
+                return None
+            _, n, i = min(candidates)
+            job = self.deques[n][i]
+            del self.deques[n][i]
+            self.busy |= _job_keys(job)
+            return job
+
+    def release(self, job):
+        """A job handed out by take() has finished (or was abandoned)."""
+        with self.cond:
+            self.busy -= _job_keys(job)
+            self.cond.notify_all()
+
+    def _slot_loop(self, slot):
+        while True:
+            with self.cond:
+                job = None
+                while job is None:
+                    if slot >= self.slots:
+                        # Slot removed by set_slots()
+                        del self.threads[slot]
+                        return
+                    job = self._pick(slot) if self.should_run() else None
+                    if job is None:
+                        # Timed wait: should_run() can change without a notify
+                        self.cond.wait(timeout=5)
+                keys = _job_keys(job)
+                self.busy |= keys
+                self.running[slot] = job
+            try:
+                self.execute(job)
+            except Exception:
+                logger.exception("Job runner slot %d: job failed", slot)
+            finally:
+                with self.cond:
+                    self.busy -= keys
+                    self.running.pop(slot, None)
+                    self.cond.notify_all()
+
+    def status(self):
+        with self.cond:
+            return {
+                'slots': self.slots,
+                'queued': [dict(job_summary(j), slot=n) for n, d in enumerate(self.deques) for j in d],
+                'running': [dict(job_summary(j), slot=n) for n, j in sorted(self.running.items())],
+                'stolen': self.stolen,
+            }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            response = self.server.queue._handle(request)
+        except Exception as e:
+            response = {'error': str(e)}
+        self.wfile.write((json.dumps(response) + "\n").encode())
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _ServiceProxy:
+    """Calls a shared object's public methods in the process that owns the runner."""
+
+    def __init__(self, queue, name):
+        self._queue = queue
+        self._name = name
+
+    def __getattr__(self, method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            request = {'op': 'call', 'service': self._name, 'method': method, 'args': args, 'kwargs': kwargs}
+            return self._queue._call(request)['result']
+        return call
+
+
+class JobQueue:
+    """The one job queue shared by every webapp process.
+
+    The process holding the flock on lock_path runs the JobRunner (and the
+    remote-worker leases) and serves them on a unix socket; every other
+    process forwards put/take/status over that socket. If the owner goes
+    away, the next process that cannot reach it takes the lock over.
+
+    `services` are objects only the owner may use (e.g. the run index);
+    service(name) reaches them from any process. on_own() runs once this
+    process becomes the owner. A queue that was never start()ed serves only
+    its own process and never takes the lock.
+    """
+
+    def __init__(self, execute, socket_path, lock_path, slots=1, should_run=None, lease=None, on_expire=None,
+                 services=None, on_own=None):
+        self.socket_path = socket_path
+        self.lock_path = lock_path
+        self.runner = JobRunner(execute, slots, should_run)
+        self.remote = RemoteJobs(lease or DEFAULT_LEASE)
+        self.on_expire = on_expire      # (lease record) for each requeued remote job
+        self.services = dict(services or {})
+        self.on_own = on_own
+        self.owner = False
+        self.started = False
+        self._lock_file = None
+        self._server = None
+        self._promote_lock = threading.Lock()
+
+    # ---- ownership ----
+    def start(self):
+        """Become the runner if nobody else is; otherwise act as a client."""
+        self.started = True
+        self._try_own()
+        return self
+
+    def _try_own(self):
+        with self._promote_lock:
+            if self.owner:
+                return True
+            os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+            f = open(self.lock_path, 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+            self._lock_file = f
+            # We hold the lock, so any socket file left behind is stale
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+            self._server = _Server(self.socket_path, _Handler)
+            self._server.queue = self
+            threading.Thread(target=self._server.serve_forever, daemon=True, name="job-runner-socket").start()
+            self.runner.start()
+            self.owner = True
+            logger.info("Job runner started in pid %d (%d slots, socket %s)", os.getpid(), self.runner.slots, self.socket_path)
+            if self.on_own:
+                try:
+                    self.on_own()
+                except Exception:
+                    logger.exception("Job runner: owner startup hook failed")
+            return True
+
+    def close(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._lock_file:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    # ---- transport ----
+    def _requeue_expired(self):
+        """Put jobs whose remote worker went quiet back on the queue; returns their leases."""
+        expired = self.remote.expired()
+        for record in expired:
+            self.runner.release(record['job'])
+            record['job'].pop('enqueued_at', None)
+            self.runner.put(record['job'])
+            if self.on_expire:
+                try:
+                    self.on_expire(record)
+                except Exception:
+                    logger.exception("Job runner: expired lease handler failed")
+        return expired
+
+    def _handle(self, request):
+        op = request.get('op')
+        # Checked on every call, so a dead worker's phones don't stay busy
+        expired = self._requeue_expired()
+        if op == 'put':
+            self.runner.put(request['job'])
+            return {'ok': True}
+        if op == 'status':
+            status = self.runner.status()
+            status['remote'] = self.remote.status()
+            return status
+        if op == 'claim':
+            self.remote.seen(request['worker'])
+            job = self.runner.take()
+            record = self.remote.lease(job, request['worker']) if job else None
+            return {'record': record, 'expired': expired}
+        if op == 'touch':
+            return {'record': self.remote.touch(request['job_id'])}
+        if op == 'finish':
+            record = self.remote.finish(request['job_id'])
+            if record:
+                self.runner.release(record['job'])
+            return {'record': record}
+        if op == 'call':
+            if request['method'].startswith('_'):
+                raise ValueError(f"private method {request['method']!r}")
+            method = getattr(self.services[request['service']], request['method'])
+            return {'result': method(*request.get('args', ()), **request.get('kwargs', {}))}
+        raise ValueError(f"unknown op {op!r}")
+
+    def _call(self, request):
+        if not self.owner and self.started:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                    s.settimeout(10)
+                    s.connect(self.socket_path)
+                    s.sendall((json.dumps(request) + "\n").encode())
+                    s.shutdown(socket.SHUT_WR)
+                    data = b''.join(iter(lambda: s.recv(65536), b''))
+                response = json.loads(data)
+                if 'error' in response:
+                    raise RuntimeError(response['error'])
+                return response
+            except (OSError, ValueError):
+                if not self._try_own():
+                    raise
+        return self._handle(request)
+
+    def service(self, name):
+        """A shared object: itself in the owner (or an unstarted queue), else a proxy to the owner's."""
+        if self.owner or not self.started:
+            return self.services[name]
+        return _ServiceProxy(self, name)
+
+    # ---- queue API used by the webapp ----
+    def put(self, job, block=True, timeout=None):
+        job.setdefault('enqueued_at', time.time())
+        self._call({'op': 'put', 'job': job})
+
+    def status(self):
+        return self._call({'op': 'status'})
+
+    def qsize(self):
+        return len(self.status()['queued'])
+
+    def pending(self):
+        """Queued plus running (locally and on remote workers)."""
+        status = self.status()
+        remote = sum(len(w['jobs']) for w in status['remote'].values())
+        return len(status['queued']) + len(status['running']) + remote
+
+    def claim(self, worker):
+        """(lease record or None, expired lease records) for a remote worker."""
+        response = self._call({'op': 'claim', 'worker': worker})
+        return response['record'], response['expired']
+
+    def touch(self, job_id):
+        return self._call({'op': 'touch', 'job_id': job_id})['record']
+
+    def finish(self, job_id):
+        return self._call({'op': 'finish', 'job_id': job_id})['record']
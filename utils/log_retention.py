@@ -0,0 +1,184 @@
+import os
+import io
+import gzip
+import time
+import shutil
+import datetime
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE_DAYS = 3
+DEFAULT_MAX_TOTAL_MB = 50
+
+
+def open_log(path, encoding='utf-8', errors='replace'):
+    """Open a (possibly gzip-compressed) log file for text reading.
+
+    Falls back to "<path>.gz" when the plain file has already been compressed.
+    """
+    if not path.endswith('.gz') and not os.path.exists(path) and os.path.exists(path + '.gz'):
+        path = path + '.gz'
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding=encoding, errors=errors)
+    return open(path, 'r', encoding=encoding, errors=errors)
+
+
+def gzip_file(src, dst=None):
+    """Compress src into dst (default src + '.gz') and remove src. Returns dst."""
+    dst = dst or src + '.gz'
+    tmp = dst + '.tmp'
+    with open(src, 'rb') as fin, gzip.open(tmp, 'wb', compresslevel=6) as fout:
+        shutil.copyfileobj(fin, fout)
+    os.replace(tmp, dst)
+    os.remove(src)
+    return dst
+
+
+def gzip_rotator(source, dest):
+    """RotatingFileHandler.rotator that compresses rotated files."""
+    gzip_file(source, dest)
+
+
+class LogRetention:
+    """Single owner of the logs/ directory lifecycle.
+
+    Finished run logs are gzip-compressed as soon as the job ends, and a
+    periodic sweep enforces the age and total-size budgets. The sweep works
+    from the run index (plus the handful of daily event files and run
+    profiles) instead of listing and stat-ing the whole logs directory.
+    """
+
+    def __init__(self, run_index, events_dir=None, budget_fn=None, job_timeout=None, profiles_dir=None):
+        self.run_index = run_index
+        self.events_dir = events_dir
+        self.profiles_dir = profiles_dir
+        # Runs still unfinished this many seconds after they started are closed by the sweep
+        self.job_timeout = job_timeout
+        # Returns (max_age_days, max_total_mb); read at every sweep so settings apply live
+        self.budget_fn = budget_fn or (lambda: (DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_TOTAL_MB))
+        self.lock = threading.Lock()
+        # Logs whose compression failed: left as they are (and warned about) once
+        self.compress_failed = set()
+
+    def compress(self, log_file):
+        """Compress a finished run log and repoint the index at the .gz file."""
+        if (not log_file or log_file.endswith('.gz') or log_file in self.compress_failed
+                or not os.path.exists(log_file)):
+            return log_file
+        try:
+            with self.lock:
+                dst = gzip_file(log_file)
+            self.run_index.relocate(log_file, dst)
+            return dst
+        except Exception as e:
+            self.compress_failed.add(log_file)
+            logger.warning("RETENTION: failed to compress %s, keeping it uncompressed: %s", log_file, e)
+            return log_file
+
+    def _event_files(self):
+        if not self.events_dir or not os.path.isdir(self.events_dir):
+            return []
+        files = []
+        for name in os.listdir(self.events_dir):
+            if name.endswith('.jsonl'):
+                # Day files are named YYYY-MM-DD.jsonl; treat midnight as their start
+                try:
+                    started = datetime.datetime.strptime(name[:-6], "%Y-%m-%d")
+                except ValueError:
+                    continue
+                files.append((started.isoformat(timespec='seconds'), os.path.join(self.events_dir, name)))
+        return files
+
+    def _profile_files(self):
+        """(mtime as ISO, path) of every MBA_PROFILE capture."""
+        if not self.profiles_dir or not os.path.isdir(self.profiles_dir):
+            return []
+        files = []
+        for name in os.listdir(self.profiles_dir):
+            path = os.path.join(self.profiles_dir, name)
+            try:
+                mtime = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+            except OSError:
+                continue
+            files.append((mtime.isoformat(timespec='seconds'), path))
+        return files
+
+    def sweep(self, now=None):
+        """Compress stragglers, then delete by age and by total size. Returns removed paths."""
+        now = now or datetime.datetime.now()
+        max_age_days, max_total_mb = self.budget_fn()
+        cutoff = (now - datetime.timedelta(days=max_age_days)).isoformat(timespec='seconds')
+        today_events = f"{now.date().isoformat()}.jsonl"
+        stale = (now - datetime.timedelta(seconds=self.job_timeout)).isoformat(timespec='seconds') if self.job_timeout else ''
+
+        entries = []  # (started, path, is_run_log, still being written)
+        for run in self.run_index.runs():
+            path = run['log_file']
+            if not run.get('finished') and run['started'] < stale:
+                # No job runs this long: its process is gone (e.g. a seeded log)
+                run = self.run_index.record_finish(path, None) or dict(run, finished=run['started'])
+            if run.get('finished') and not path.endswith('.gz') and run['started'] >= cutoff:
+                path = self.compress(path)
+            entries.append((run['started'], path, True, not run.get('finished')))
+        for started, path in self._event_files():
+            entries.append((started, path, False, path.endswith(today_events)))
+        # Profiles are budgeted like finished run logs (not in the index)
+        profiles = set()
+        for started, path in self._profile_files():
+            profiles.add(path)
+            entries.append((started, path, False, False))
+        entries.sort()
+
+        removed = []
+        kept = []
+        for started, path, is_run, live in entries:
+            # Event files are dated by day; keep them while any part of the day is in range
+            expired = started < cutoff if is_run or path in profiles else started[:10] < cutoff[:10]
+            if expired and not path.endswith(today_events):
+                if self._remove(path, is_run):
+                    removed.append(path)
+                continue
+            try:
+                kept.append((started, path, is_run, live, os.path.getsize(path)))
+            except OSError:
+                if is_run:
+                    self.run_index.forget(path)
+
+        budget = int(max_total_mb * 1024 * 1024)
+        total = sum(k[4] for k in kept)
+        for started, path, is_run, live, size in kept:
+            if total <= budget:
+                break
+            # Never delete today's event file or a log that is still being written;
+            # finished logs count whether or not they could be compressed
+            if live:
+                continue
+            if self._remove(path, is_run):
+                removed.append(path)
+                total -= size
+
+        if removed:
+            logger.info("RETENTION: removed %d old log files (%.1f MB kept)", len(removed), total / 1048576)
+        return removed
+
+    def _remove(self, path, is_run):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.warning("RETENTION: could not remove %s: %s", path, e)
+            return False
+        if is_run:
+            self.run_index.forget(path)
+        return True
+
+    def run_forever(self, interval=3600):
+        """Background loop (daemon thread target)."""
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Cleanup error: {e}")
+            time.sleep(interval)
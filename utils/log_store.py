@@ -0,0 +1,142 @@
+import os
+import json
+import bisect
+import datetime
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _DayIndex:
+    """Offsets of every event in one day file, bucketed by phone, level and run id."""
+
+    def __init__(self, path):
+        self.path = path
+        self.indexed_to = 0      # byte offset of the first unindexed line
+        self.offsets = []        # line start offsets, in file order
+        self.times = []          # event timestamps (ISO strings), parallel to offsets
+        self.by_phone = {}
+        self.by_level = {}
+        self.by_run = {}
+        self.by_phase = {}
+
+    def refresh(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size < self.indexed_to:
+            # File was truncated/replaced, start over
+            self.__init__(self.path)
+        if size == self.indexed_to:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self.indexed_to)
+            pos = self.indexed_to
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # partially written line, pick it up next time
+                try:
+                    rec = json.loads(raw)
+                except ValueError:
+                    pos += len(raw)
+                    continue
+                i = len(self.offsets)
+                self.offsets.append(pos)
+                self.times.append(rec.get('ts') or '')
+                if rec.get('phone'):
+                    self.by_phone.setdefault(rec['phone'], []).append(i)
+                self.by_level.setdefault(str(rec.get('level') or '').upper(), []).append(i)
+                if rec.get('run_id'):
+                    self.by_run.setdefault(rec['run_id'], []).append(i)
+                if rec.get('phase'):
+                    self.by_phase.setdefault(rec['phase'], []).append(i)
+                pos += len(raw)
+        self.indexed_to = pos
+
+    def candidates(self, phone=None, level=None, run_id=None, phase=None):
+        """Indices matching all given filters, ascending."""
+        lists = []
+        if phone:
+            lists.append(self.by_phone.get(phone, []))
+        if level:
+            lists.append(self.by_level.get(level, []))
+        if run_id:
+            lists.append(self.by_run.get(run_id, []))
+        if phase:
+            lists.append(self.by_phase.get(phase, []))
+        if not lists:
+            return range(len(self.offsets))
+        lists.sort(key=len)
+        result = lists[0]
+        for other in lists[1:]:
+            other_set = set(other)
+            result = [i for i in result if i in other_set]
+        return result
+
+
+class LogStore:
+    """Incrementally indexed reader for logs/events/*.jsonl.
+
+    Each line is parsed once when first indexed; queries only seek to and
+    decode the lines that match the phone/level/run id/phase/time filters.
+    """
+
+    def __init__(self, events_dir):
+        self.events_dir = events_dir
+        self.lock = threading.Lock()
+        self._days = {}  # 'YYYY-MM-DD' -> _DayIndex
+
+    def _day_files(self):
+        if not os.path.isdir(self.events_dir):
+            return []
+        return sorted(n[:-6] for n in os.listdir(self.events_dir) if n.endswith('.jsonl'))
+
+    def query(self, phone=None, level=None, run_id=None, since=None, until=None, limit=100, phase=None):
+        """Return matching events, newest first.
+
+        since/until are datetimes (or ISO strings); only day files in that
+        range are touched.
+        """
+        since_s = since.isoformat() if isinstance(since, datetime.datetime) else (since or '')
+        until_s = until.isoformat() if isinstance(until, datetime.datetime) else (until or '')
+        level = (level or '').upper() or None
+        results = []
+
+        with self.lock:
+            days = self._day_files()
+            for stale in set(self._days) - set(days):
+                del self._days[stale]
+
+            for day in reversed(days):
+                if since_s and day < since_s[:10]:
+                    break
+                if until_s and day > until_s[:10]:
+                    continue
+                idx = self._days.get(day)
+                if idx is None:
+                    idx = self._days[day] = _DayIndex(os.path.join(self.events_dir, day + '.jsonl'))
+                idx.refresh()
+
+                matches = idx.candidates(phone, level, run_id, phase)
+                # Narrow by time using the (sorted) timestamp column
+                lo, hi = 0, len(idx.offsets)
+                if since_s:
+                    lo = bisect.bisect_left(idx.times, since_s)
+                if until_s:
+                    hi = bisect.bisect_right(idx.times, until_s)
+                wanted = [i for i in matches if lo <= i < hi]
+                if not wanted:
+                    continue
+
+                with open(idx.path, 'rb') as f:
+                    for i in reversed(wanted):
+                        f.seek(idx.offsets[i])
+                        try:
+                            results.append(json.loads(f.readline()))
+                        except ValueError:
+                            continue
+                        if limit and len(results) >= limit:
+                            return results
+        return results
@@ -0,0 +1,184 @@
+"""Minimal Prometheus metrics (text exposition format 0.0.4), no client library needed.
+
+Counters, gauges and histograms with labels live in a Registry; the webapp
+renders REGISTRY at /metrics. Gauges can be computed at scrape time from a
+callback (e.g. the job queue depth), which may return a number or a dict of
+label-value tuples to numbers.
+"""
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self):
+        """(suffix, label values, extra label, value) rows."""
+        with self.lock:
+            return [('', key, None, value) for key, value in sorted(self._values.items())]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount < 0:
+            raise ValueError("counters can only increase")
+        key = self._key(labels)
+        with self.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self.lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), fn=None):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self.lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.fn is None:
+            return super().samples()
+        try:
+            result = self.fn()
+        except Exception:
+            return []
+        if result is None:
+            return []
+        if isinstance(result, dict):
+            return [('', tuple(str(v) for v in (k if isinstance(k, tuple) else (k,))), None, value)
+                    for k, value in sorted(result.items())]
+        return [('', (), None, result)]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self.lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block (also when it raises)."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self.lock:
+            entry = self._values.get(self._key(labels))
+            return entry[2] if entry else 0
+
+    def samples(self):
+        rows = []
+        with self.lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    rows.append(('_bucket', key, ('le', _format_value(float(bound))), cumulative))
+                rows.append(('_sum', key, None, round(total, 6)))
+                rows.append(('_count', key, None, count))
+        return rows
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        with self.lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Re-imports (tests, reloaders) get the metric that already exists
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), fn=None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, fn))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
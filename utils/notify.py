@@ -0,0 +1,155 @@
+import time
+import queue
+import threading
+import logging
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.telegram.org/bot{token}/sendMessage"
+# Telegram rejects longer messages; keep a margin for HTML entities
+MAX_MESSAGE_LEN = 4000
+# Telegram allows about one message per second to a chat
+MIN_INTERVAL = 1.0
+
+
+def split_message(lines, limit=MAX_MESSAGE_LEN):
+    """Join lines into as few messages as fit under `limit` characters each."""
+    chunks, current = [], ''
+    for line in lines:
+        line = line[:limit]
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class TelegramDispatcher:
+    """One background thread and one keep-alive session for every Telegram message.
+
+    send() queues a message as is. add() queues an item for the next digest:
+    items arriving within `window` seconds of the first are handed together
+    to render_batch(items), which returns the message(s) to send. Sends are
+    spaced MIN_INTERVAL apart, honour 429 retry_after and retry network and
+    5xx errors with backoff; other errors drop the message.
+    """
+
+    def __init__(self, credentials, render_batch=None, window=5.0, max_batch=50, attempts=4,
+                 timeout=10, min_interval=MIN_INTERVAL, observe=None):
+        self.credentials = credentials      # () -> (token, chat_id), read once per delivery
+        self.render_batch = render_batch or (lambda items: [str(i) for i in items])
+        self.window = window
+        self.max_batch = max_batch
+        self.attempts = attempts
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.observe = observe              # (seconds, result=...) per HTTP call
+        self.queue = queue.Queue()
+        self.session = None
+        self.thread = None
+        self._last_send = 0.0
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, daemon=True, name="telegram-dispatcher")
+                self.thread.start()
+        return self
+
+    def send(self, text):
+        self.queue.put(('text', text))
+
+    def add(self, item):
+        self.queue.put(('item', item))
+
+    def join(self):
+        """Block until everything queued so far has been delivered or dropped."""
+        self.queue.join()
+
+    def _loop(self):
+        pending, deadline = [], None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                kind, payload = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                kind = None
+            if kind == 'text':
+                try:
+                    self._deliver([payload])
+                except Exception:
+                    logger.exception("Telegram message failed")
+                self.queue.task_done()
+            elif kind == 'item':
+                pending.append(payload)
+                if deadline is None:
+                    deadline = time.monotonic() + self.window
+            if pending and (time.monotonic() >= deadline or len(pending) >= self.max_batch):
+                try:
+                    self._deliver(self.render_batch(pending))
+                except Exception:
+                    logger.exception("Telegram digest of %d item(s) failed", len(pending))
+                for _ in pending:
+                    self.queue.task_done()
+                pending, deadline = [], None
+
+    def _deliver(self, messages):
+        token, chat_id = self.credentials()
+        if not token or not chat_id:
+            logger.warning("Telegram NOT SENT: Missing token or chat_id in settings")
+            return
+        for text in messages:
+            self.post(token, chat_id, text)
+
+    def post(self, token, chat_id, text):
+        """Send one message now (with pacing and retries). Returns True once Telegram accepted it."""
+        if requests is None:
+            logger.warning("Telegram NOT SENT: requests module not installed.")
+            return False
+        if self.session is None:
+            self.session = requests.Session()
+        payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
+        for attempt in range(self.attempts):
+            wait = self._last_send + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            started = time.monotonic()
+            result, retry_after = 'error', min(60, 2 ** attempt)
+            try:
+                resp = self.session.post(API_URL.format(token=token), json=payload, timeout=self.timeout)
+                if resp.status_code == 200:
+                    result = 'ok'
+                elif resp.status_code == 429:
+                    result = 'rate_limited'
+                    try:
+                        retry_after = float(resp.json()['parameters']['retry_after'])
+                    except (ValueError, KeyError, TypeError):
+                        pass
+                else:
+                    result = 'failed'
+                    if resp.status_code < 500:
+                        logger.error(f"Telegram failed: {resp.status_code} - {resp.text}")
+                        return False
+            except requests.RequestException as e:
+                logger.warning(f"Telegram exception: {e}")
+            finally:
+                self._last_send = time.monotonic()
+                if self.observe:
+                    self.observe(self._last_send - started, result=result)
+            if result == 'ok':
+                logger.info("Telegram message sent successfully")
+                return True
+            if attempt + 1 < self.attempts:
+                logger.warning("Telegram %s, retrying in %.0fs", result, retry_after)
+                time.sleep(retry_after)
+        logger.error("Telegram message dropped after %d attempts", self.attempts)
+        return False
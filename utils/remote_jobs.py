@@ -0,0 +1,109 @@
+import uuid
+import time
+import datetime
+import threading
+
+# A claimed job whose worker has not reported for this long goes back on the queue
+DEFAULT_LEASE = 600
+# Fields the CLI writes while it runs; everything else stays owned by the coordinator
+REMOTE_FIELDS = ('last_run_ts', 'last_sync_ts')
+
+
+class RemoteJobs:
+    """Jobs leased to remote workers (coordinator side).
+
+    A worker claims a job, reports progress (which renews the lease) and
+    finally its result. Jobs whose worker went quiet are handed back by
+    expired() so the caller can requeue them.
+    """
+
+    def __init__(self, lease=DEFAULT_LEASE):
+        self.lease_seconds = lease
+        self.lock = threading.Lock()
+        self._jobs = {}      # job id -> lease record
+        self._workers = {}   # worker name -> last seen (unix time)
+
+    def seen(self, worker, now=None):
+        with self.lock:
+            self._workers[worker] = now or time.time()
+
+    def lease(self, job, worker, now=None):
+        """Register `job` as running on `worker`. Returns the lease record."""
+        now = now or time.time()
+        record = {
+            'id': uuid.uuid4().hex[:12],
+            'job': job,
+            'worker': worker,
+            'claimed': now,
+            'seen': now,
+            'day': datetime.date.fromtimestamp(now).isoformat(),
+        }
+        with self.lock:
+            self._jobs[record['id']] = record
+            self._workers[worker] = now
+        return record
+
+    def touch(self, job_id, now=None):
+        """Renew a lease; returns its record, or None if it expired or never existed."""
+        now = now or time.time()
+        with self.lock:
+            record = self._jobs.get(job_id)
+            if record:
+                record['seen'] = now
+                self._workers[record['worker']] = now
+            return record
+
+    def finish(self, job_id):
+        with self.lock:
+            return self._jobs.pop(job_id, None)
+
+    def expired(self, now=None):
+        """Drop and return the leases whose worker stopped reporting."""
+        now = now or time.time()
+        with self.lock:
+            stale = [r for r in self._jobs.values() if now - r['seen'] > self.lease_seconds]
+            for record in stale:
+                del self._jobs[record['id']]
+        return stale
+
+    def active(self):
+        with self.lock:
+            return len(self._jobs)
+
+    def status(self, now=None):
+        """Per-worker view for the dashboard: seconds since last contact and running jobs."""
+        now = now or time.time()
+        with self.lock:
+            workers = {name: {'last_seen_s': round(now - seen), 'jobs': []} for name, seen in self._workers.items()}
+            for record in self._jobs.values():
+                workers.setdefault(record['worker'], {'last_seen_s': None, 'jobs': []})['jobs'].append({
+                    'id': record['id'],
+                    'phone': record['job'].get('phone_display'),
+                    'kind': record['job'].get('kind'),
+                    'running_s': round(now - record['claimed']),
+                })
+        return workers
+
+
+def merge_account(local, remote, since_day):
+    """Fold what a remote CLI run wrote for one account into the coordinator's copy.
+
+    daily_progress entries from `since_day` on (the day the job was claimed)
+    and the sync-source timestamps come from the worker; timestamps only move
+    forward.
+    """
+    dp = local.setdefault('daily_progress', {})
+    for day, entry in (remote.get('daily_progress') or {}).items():
+        if day >= since_day:
+            dp[day] = entry
+    if remote.get('sync_sources'):
+        sources = local.setdefault('sync_sources', {})
+        for src, ts in remote['sync_sources'].items():
+            if ts and ts > (sources.get(src) or ''):
+                sources[src] = ts
+    for field in REMOTE_FIELDS:
+        if remote.get(field) and remote[field] > (local.get(field) or ''):
+            local[field] = remote[field]
+    if 'is_syncing' in remote:
+        local['is_syncing'] = remote['is_syncing']
+    return local
@@ -0,0 +1,98 @@
+import datetime
+
+# Runs listed under "slowest" in the daily digest
+SLOWEST_RUNS = 3
+
+
+def _previous_entry(daily_progress, day):
+    """The newest daily_progress entry before `day` (the baseline for deltas), or {}."""
+    earlier = [d for d in daily_progress if d < day]
+    return daily_progress[max(earlier)] if earlier else {}
+
+
+def _seconds(run):
+    try:
+        return (datetime.datetime.fromisoformat(run['finished'])
+                - datetime.datetime.fromisoformat(run['started'])).total_seconds()
+    except (TypeError, ValueError, KeyError):
+        return None
+
+
+def daily_report(accounts, runs, day, now=None, key_fn=None, slowest=SLOWEST_RUNS):
+    """Aggregate one day across all accounts and runs, one pass over each.
+
+    accounts are accounts.json entries, runs RunIndex.runs() rows. Returns
+    plain data: completion counts, balance and income totals with their
+    change since each account's previous entry, accounts whose schedule
+    passed without a run, failed runs and the slowest finished runs.
+    """
+    now = now or datetime.datetime.now()
+    key_fn = key_fn or (lambda p: p)
+    day_date = datetime.date.fromisoformat(day)
+    report = {
+        'day': day,
+        'accounts': 0,
+        'completed': 0,
+        'partial': 0,
+        'no_progress': [],
+        'balance': 0,
+        'balance_delta': 0,
+        'income': 0,
+        'income_delta': 0,
+        'missed_schedule': [],
+        'runs': 0,
+        'running': 0,
+        'failed': [],
+        'slowest': [],
+    }
+    for acc in accounts:
+        phone = key_fn(acc.get('phone', ''))
+        if not phone:
+            continue
+        report['accounts'] += 1
+        dp = acc.get('daily_progress') or {}
+        entry = dp.get(day)
+        previous = _previous_entry(dp, day)
+        current = entry or previous
+        report['balance'] += current.get('balance', 0) or 0
+        report['income'] += current.get('income', 0) or 0
+        if entry:
+            report['balance_delta'] += (entry.get('balance', 0) or 0) - (previous.get('balance', 0) or 0)
+            report['income_delta'] += (entry.get('income', 0) or 0) - (previous.get('income', 0) or 0)
+            total = entry.get('total') or 0
+            if total and (entry.get('completed', 0) or 0) >= total:
+                report['completed'] += 1
+            else:
+                report['partial'] += 1
+        else:
+            report['no_progress'].append(phone)
+
+        sched = acc.get('schedule')
+        # No scheduled runs on Sundays (see the scheduler)
+        if sched and day_date.weekday() != 6:
+            try:
+                hh, mm = (int(x) for x in sched.split(':'))
+                scheduled_dt = datetime.datetime.combine(day_date, datetime.time(hh, mm))
+            except ValueError:
+                continue
+            last_run = str(acc.get('last_run_ts') or acc.get('last_run') or '')
+            if scheduled_dt <= now and not last_run.startswith(day):
+                report['missed_schedule'].append(phone)
+
+    finished = []
+    for run in runs:
+        if not str(run.get('started', '')).startswith(day):
+            continue
+        report['runs'] += 1
+        if run.get('finished') is None:
+            report['running'] += 1
+            continue
+        if run.get('returncode') not in (0, None):
+            report['failed'].append({'phone': run['phone'], 'kind': run.get('kind'), 'returncode': run['returncode']})
+        seconds = _seconds(run)
+        if seconds is not None:
+            finished.append((seconds, run))
+    finished.sort(key=lambda item: item[0], reverse=True)
+    report['slowest'] = [{'phone': run['phone'], 'kind': run.get('kind'), 'seconds': round(seconds)}
+                         for seconds, run in finished[:slowest]]
+    return report
@@ -0,0 +1,169 @@
+import os
+import re
+import threading
+import datetime
+from collections import deque
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Log files written by the webapp look like "<prefix>_<phone>_<YYYYmmdd_HHMMSS>.log"
+# (".log.gz" once the retention sweep has compressed them)
+LOG_NAME_RE = re.compile(r"^((automation|manual|sync|schedule|refresh)_(\d+)_(\d{8}_\d{6}))\.log(\.gz)?$")
+# Batch jobs covering every account: "checkin_all_<YYYYmmdd_HHMMSS>.log"
+BATCH_LOG_RE = re.compile(r"^((checkin)_all_(\d{8}_\d{6}))\.log(\.gz)?$")
+
+# Map filename prefixes to job kinds (the dashboard form writes "automation_" logs)
+PREFIX_KINDS = {
+    'automation': 'manual',
+    'manual': 'manual',
+    'sync': 'sync',
+    'schedule': 'schedule',
+    'refresh': 'refresh',
+    'checkin': 'checkin',
+}
+
+
+class RunIndex:
+    """In-memory index of phone -> run history (newest last).
+
+    Updated by the worker whenever a job starts or finishes so that log
+    lookups never have to list the logs directory.
+    """
+
+    def __init__(self, key_fn=None, max_history=50):
+        self.key_fn = key_fn or (lambda p: p)
+        self.max_history = max_history
+        self.lock = threading.Lock()
+        self._runs = {}      # phone key -> deque of run dicts
+        self._by_file = {}   # log path -> list of run dicts
+
+    def record_start(self, phone, log_file, kind, started=None, run_id=None):
+        """Register a job that has just started writing to log_file."""
+        key = self.key_fn(phone)
+        if not key:
+            return None
+        run = {
+            'phone': key,
+            'log_file': log_file,
+            'kind': kind,
+            'run_id': run_id or os.path.splitext(os.path.basename(log_file))[0],
+            'started': (started or datetime.datetime.now()).isoformat(timespec='seconds'),
+            'finished': None,
+            'returncode': None,
+        }
+        with self.lock:
+            history = self._runs.setdefault(key, deque(maxlen=self.max_history))
+            if len(history) == history.maxlen:
+                self._unlink_file(history[0])
+            history.append(run)
+            # Batch jobs (e.g. check-in for all accounts) share one log file
+            self._by_file.setdefault(log_file, []).append(run)
+        return run
+
+    def _unlink_file(self, run):
+        runs = self._by_file.get(run['log_file'], [])
+        if run in runs:
+            runs.remove(run)
+        if not runs:
+            self._by_file.pop(run['log_file'], None)
+
+    def record_finish(self, log_file, returncode=None, finished=None):
+        """Mark the run(s) writing to log_file as finished."""
+        with self.lock:
+            runs = self._by_file.get(log_file)
+            if not runs:
+                return None
+            for run in runs:
+                run['finished'] = (finished or datetime.datetime.now()).isoformat(timespec='seconds')
+                run['returncode'] = returncode
+            return dict(runs[0])
+
+    def relocate(self, old_file, new_file):
+        """Point runs at a new path (e.g. after compression)."""
+        with self.lock:
+            runs = self._by_file.pop(old_file, None)
+            if runs:
+                for run in runs:
+                    run['log_file'] = new_file
+                self._by_file[new_file] = runs
+
+    def forget(self, log_file):
+        """Drop runs whose log file has been deleted."""
+        with self.lock:
+            for run in self._by_file.pop(log_file, None) or []:
+                history = self._runs.get(run['phone'])
+                if history is None:
+                    continue
+                try:
+                    history.remove(run)
+                except ValueError:
+                    pass
+                if not history:
+                    del self._runs[run['phone']]
+
+    def runs(self):
+        """Snapshot of every indexed log file (one run each), oldest first."""
+        with self.lock:
+            all_runs = [dict(runs[0]) for runs in self._by_file.values() if runs]
+        return sorted(all_runs, key=lambda r: r['started'])
+
+    def latest(self, phone):
+        """Return the most recently started run for phone, or None."""
+        key = self.key_fn(phone)
+        with self.lock:
+            history = self._runs.get(key)
+            return dict(history[-1]) if history else None
+
+    def history(self, phone, limit=None):
+        """Return runs for phone, newest first."""
+        key = self.key_fn(phone)
+        with self.lock:
+            runs = [dict(r) for r in reversed(self._runs.get(key, ()))]
+        return runs[:limit] if limit else runs
+
+    def seed(self, log_dir, live_for=0, now=None):
+        """Rebuild the index from existing log files (one scan at startup).
+
+        Logs started within `live_for` seconds (the job timeout) may still be
+        written by a job that outlived the previous process; they are left
+        unfinished.
+        """
+        now = now or datetime.datetime.now()
+        live_since = now - datetime.timedelta(seconds=live_for)
+        if not os.path.isdir(log_dir):
+            return 0
+        found = []
+        batches = []
+        for name in os.listdir(log_dir):
+            m = LOG_NAME_RE.match(name)
+            b = BATCH_LOG_RE.match(name) if not m else None
+            if not m and not b:
+                continue
+            try:
+                started = datetime.datetime.strptime((m or b).group(4 if m else 3), "%Y%m%d_%H%M%S")
+            except ValueError:
+                continue
+            if m:
+                found.append((started, m.group(3), os.path.join(log_dir, name), PREFIX_KINDS[m.group(2)], m.group(1)))
+            else:
+                batches.append((started, os.path.join(log_dir, name), PREFIX_KINDS[b.group(2)], b.group(1)))
+
+        # Oldest first so the newest ends up last in each history
+        found.sort()
+        for started, phone, path, kind, run_id in found:
+            run = self.record_start(phone, path, kind, started=started, run_id=run_id)
+            if run is not None and started < live_since:
+                # Too old to still be running
+                run['finished'] = run['started']
+        # Batch logs can't be attributed to one phone; track the file only (for retention)
+        with self.lock:
+            for started, path, kind, run_id in batches:
+                ts = started.isoformat(timespec='seconds')
+                self._by_file.setdefault(path, []).append({
+                    'phone': None, 'log_file': path, 'kind': kind, 'run_id': run_id,
+                    'started': ts, 'finished': ts if started < live_since else None, 'returncode': None,
+                })
+        found.extend(batches)
+        logger.info("Run index seeded with %d log files", len(found))
+        return len(found)
@@ -0,0 +1,165 @@
+import os
+import json
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+_TRUE = ('1', 'true', 'yes', 'on')
+_FALSE = ('0', 'false', 'no', 'off', '')
+
+
+class SettingsStore:
+    """settings.json held in memory.
+
+    Reads cost one stat(): the file is parsed again only when its mtime or
+    size changed (another process, or a hand edit). update() merges and
+    writes atomically. Subscribers are called with the changed keys -> new
+    values whenever either path changes something.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._data = {}
+        self._stamp = None
+        self._subscribers = []   # (fn, keys or None)
+
+    # ---- loading ----
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return (self.path, None)
+        return (self.path, st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        """Re-read the file if it changed; returns the changed keys (caller holds the lock)."""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return {}
+        if stamp[1] is None:
+            data = {}
+        else:
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+            except Exception as e:
+                # Keep what we had; the next call retries
+                logger.error(f"Failed to load settings: {e}")
+                return {}
+        self._stamp = stamp
+        changed = _diff(self._data, data)
+        self._data = data
+        return changed
+
+    def all(self):
+        """Copy of every setting."""
+        with self.lock:
+            changed = self._refresh()
+            data = dict(self._data)
+        self._notify(changed, data)
+        return data
+
+    # ---- typed accessors ----
+    def get(self, key, default=None):
+        return self.all().get(key, default)
+
+    def get_str(self, key, default=''):
+        value = self.get(key)
+        return default if value is None else str(value)
+
+    def get_float(self, key, default=None):
+        value = self.get(key)
+        if value is None or value == '':
+            return default
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            logger.warning("Setting %s=%r is not a number, using %r", key, value, default)
+            return default
+
+    def get_int(self, key, default=None):
+        value = self.get_float(key)
+        return default if value is None else int(value)
+
+    def get_bool(self, key, default=False):
+        value = self.get(key)
+        if value is None or isinstance(value, bool):
+            return default if value is None else value
+        text = str(value).strip().lower()
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return False
+        logger.warning("Setting %s=%r is not a boolean, using %r", key, value, default)
+        return default
+
+    def get_time(self, key, default=None):
+        """An "HH:MM" setting as (hour, minute), or default when unset or invalid."""
+        value = self.get(key)
+        if not value:
+            return default
+        try:
+            hh, mm = (int(x) for x in str(value).split(':'))
+            if 0 <= hh <= 23 and 0 <= mm <= 59:
+                return hh, mm
+        except ValueError:
+            pass
+        logger.warning("Setting %s=%r is not HH:MM, using %r", key, value, default)
+        return default
+
+    # ---- writing ----
+    def _write(self, data):
+        temp_file = self.path + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.path)
+        self._stamp = self._file_stamp()
+
+    def update(self, changes):
+        """Merge `changes` into the settings and save. Returns the keys that changed."""
+        with self.lock:
+            self._refresh()
+            data = dict(self._data, **changes)
+            changed = _diff(self._data, data)
+            if changed:
+                self._write(data)
+                self._data = data
+        self._notify(changed, dict(data))
+        return changed
+
+    def replace(self, settings):
+        """Overwrite every setting (e.g. restoring a backup). Returns the keys that changed."""
+        with self.lock:
+            self._refresh()
+            data = dict(settings)
+            changed = _diff(self._data, data)
+            self._write(data)
+            self._data = data
+        self._notify(changed, dict(data))
+        return changed
+
+    # ---- change notification ----
+    def subscribe(self, fn, keys=None):
+        """Call fn(changed, settings) when any of `keys` (default: any key) changes."""
+        self._subscribers.append((fn, set(keys) if keys else None))
+        return fn
+
+    def _notify(self, changed, data):
+        if not changed:
+            return
+        for fn, keys in list(self._subscribers):
+            if keys is not None and not keys & set(changed):
+                continue
+            try:
+                fn(changed, data)
+            except Exception:
+                logger.exception("Settings subscriber %r failed", fn)
+
+
+def _diff(old, new):
+    """Keys whose value differs between two settings dicts -> new value (None when removed)."""
+    return {k: new.get(k) for k in set(old) | set(new) if old.get(k) != new.get(k)}
@@ -10,13 +10,27 @@ import threading
 import time
 import logging
 from logging.handlers import RotatingFileHandler
-import queue
 import fcntl
+import gc
+import hmac
 try:
     import requests
 except ImportError:
     requests = None
 from utils import crypto
+from utils.run_index import RunIndex
+from utils.log_store import LogStore
+from utils import log_retention
+from utils import metrics
+from utils.remote_jobs import merge_account
+from utils.job_runner import JobQueue
+from utils.notify import TelegramDispatcher, split_message
+from utils import report
+from utils.settings import SettingsStore
+from mba_automation import events
+from mba_automation.sessions import SessionManager
+from mba_automation import resources
+from mba_automation import instrument
 
 
 app = Flask(__name__)
@@ -32,123 +46,275 @@ def manifest():
     return send_from_directory('static', 'manifest.json')
 
 
-LOG_FILE = os.path.join(os.path.dirname(__file__), "runs.log")
+LOG_FILE = os.getenv("MBA_WEBAPP_LOG") or os.path.join(os.path.dirname(__file__), "runs.log")
 ACCOUNTS_FILE = os.path.join(os.path.dirname(__file__), "accounts.json")
 SETTINGS_FILE = os.path.join(os.path.dirname(__file__), "settings.json")
+LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
+EVENTS_DIR = events.EVENTS_DIR
 SCHED_LOCK = threading.Lock()
 SCHED_CHECK_INTERVAL = 20  # seconds between schedule checks
+# Job runner shared by every webapp process (utils/job_runner.py): the process
+# holding RUNNER_LOCK runs the jobs, the others submit over RUNNER_SOCKET.
+# One slot by default (Pi Zero); raise MBA_JOB_SLOTS on bigger devices.
+JOB_SLOTS = int(os.getenv("MBA_JOB_SLOTS", "1"))
+RUNNER_SOCKET = os.getenv("MBA_RUNNER_SOCKET") or os.path.join(LOG_DIR, "runner.sock")
+RUNNER_LOCK = RUNNER_SOCKET + ".lock"
+# A CLI run is killed after this long, so an older log is never still being written
+JOB_TIMEOUT = int(os.getenv("MBA_JOB_TIMEOUT", "7200"))
+
+# phone -> run history, maintained by the worker (avoids listing LOG_DIR per poll).
+# Unbounded: LOG_RETENTION drops entries when their files expire.
+# Only the job runner's owner records runs and sweeps logs; other processes
+# reach both through _runs() / _retention().
+RUN_INDEX = RunIndex(key_fn=lambda p: normalize_phone(p), max_history=None)
+# Single log janitor: compresses finished run logs and enforces age/size budgets
+LOG_RETENTION = log_retention.LogRetention(RUN_INDEX, EVENTS_DIR, budget_fn=lambda: _log_budget(),
+                                           job_timeout=JOB_TIMEOUT, profiles_dir=instrument.PROFILE_DIR)
+JOB_QUEUE = JobQueue(lambda job: _run_job(job), RUNNER_SOCKET, RUNNER_LOCK, slots=JOB_SLOTS,
+                     should_run=lambda: _runs_local_jobs(), on_expire=lambda record: _remote_job_expired(record),
+                     services={'runs': RUN_INDEX, 'retention': LOG_RETENTION},
+                     on_own=lambda: _start_runner_owner_threads())
+# Indexed reader for the structured JSON-lines events (served by /api/logs)
+LOG_STORE = LogStore(EVENTS_DIR)
+
+DEFAULT_MIN_FREE_MB = 250
+
+
+def _runs():
+    """The run index (the runner owner's, over its socket in other processes)."""
+    return JOB_QUEUE.service('runs')
+
+
+def _retention():
+    return JOB_QUEUE.service('retention')
+
+
+def _queued_by_kind():
+    counts = {}
+    for job in JOB_QUEUE.status()['queued']:
+        counts[job['kind']] = counts.get(job['kind'], 0) + 1
+    return counts
+
+
+def _accounts_file_size():
+    try:
+        return os.path.getsize(data_manager.accounts_file)
+    except OSError:
+        return None
 
-# Job Queue for Serial Execution (Pi Zero Optimization)
-JOB_QUEUE = queue.Queue()
-ACTIVE_JOBS = 0
-ACTIVE_JOBS_LOCK = threading.Lock()
 
-def worker():
-    """Background worker to process automation jobs serially."""
+# Prometheus metrics, served at /metrics (utils/metrics.py)
+JOBS_TOTAL = metrics.REGISTRY.counter('mba_jobs_total', 'Finished automation jobs', ('kind', 'result'))
+JOB_DURATION = metrics.REGISTRY.histogram('mba_job_duration_seconds', 'Automation job run time', ('kind',),
+                                          buckets=(30, 60, 120, 300, 600, 900, 1800, 3600))
+QUEUE_WAIT = metrics.REGISTRY.histogram('mba_queue_wait_seconds', 'Time jobs spent queued before starting', ('kind',),
+                                        buckets=(1, 5, 15, 60, 300, 900, 1800, 3600, 7200))
+metrics.REGISTRY.gauge('mba_queue_depth', 'Jobs waiting in the queue', ('kind',), fn=_queued_by_kind)
+metrics.REGISTRY.gauge('mba_active_jobs', 'Jobs currently running in the job runner',
+                       fn=lambda: len(JOB_QUEUE.status()['running']))
+ACCOUNTS_IO = metrics.REGISTRY.histogram('mba_accounts_io_seconds', 'accounts.json read/write latency', ('op',),
+                                         buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+metrics.REGISTRY.gauge('mba_accounts_file_bytes', 'Size of accounts.json', fn=_accounts_file_size)
+SCHEDULER_LATENESS = metrics.REGISTRY.histogram('mba_scheduler_lateness_seconds',
+                                                'Delay between an account\'s scheduled time and its enqueue',
+                                                buckets=(5, 20, 60, 300, 900, 3600, 4 * 3600))
+SCHEDULER_LAST_CHECK = metrics.REGISTRY.gauge('mba_scheduler_last_check_timestamp_seconds',
+                                              'Unix time of the last scheduler pass')
+TELEGRAM_SEND = metrics.REGISTRY.histogram('mba_telegram_send_seconds', 'Telegram sendMessage latency (per attempt)', ('result',),
+                                           buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+
+
+def _wait_for_memory(phone_display, poll=15):
+    """Hold the next job while the system is low on memory (keeps the LMK away from the stack)."""
+    min_free = data_manager.settings.get_float('min_free_mb', DEFAULT_MIN_FREE_MB)
+    warned = False
     while True:
-        job = None
+        available = resources.system_available_mb()
+        if available is None or available >= min_free:
+            return
+        if not warned:
+            logger.warning("QUEUE: Low memory (%.0f MB free < %.0f MB), holding job for %s", available, min_free, phone_display)
+            warned = True
+        gc.collect()
+        time.sleep(poll)
+
+
+def _job_env(run_id=None):
+    """MBA_* variables for a CLI job (local or on a remote worker)."""
+    env = {}
+    if run_id:
+        # Lets the CLI tag its structured events with this run
+        env['MBA_RUN_ID'] = run_id
+    # Resource blocking profile (mba_automation/blocking.py), configurable from settings
+    settings = data_manager.settings.all()
+    block_profile = settings.get('block_profile')
+    if block_profile:
+        env['MBA_BLOCK_PROFILE'] = block_profile
+    # Browser RSS budget before the CLI recycles it (mba_automation/resources.py)
+    if settings.get('browser_rss_mb'):
+        env['MBA_BROWSER_RSS_MB'] = str(settings['browser_rss_mb'])
+    return env
+
+
+def _fmt_rp(val):
+    """Rupiah amount with dot thousands separators."""
+    try: return f"{int(float(val or 0)):,}".replace(',', '.')
+    except: return str(val or 0)
+
+
+def _render_completions(phones):
+    """Telegram message(s) for runs that finished within one dispatcher window.
+
+    Accounts are loaded once for the whole batch; one run keeps the detailed
+    message, several become one digest line each.
+    """
+    accounts = {normalize_phone(a.get('phone', '')): a for a in data_manager.load_accounts()}
+    today_str = datetime.datetime.now().strftime('%Y-%m-%d')
+    phones = list(dict.fromkeys(phones))
+    if len(phones) == 1:
+        phone_display = phones[0]
+        acc_info = accounts.get(normalize_phone(phone_display))
+        if not acc_info:
+            return [f"✅ <b>Tugas Selesai!</b>\nAkun: <code>{phone_display}</code>\nStatus: Berhasil."]
+        prog = acc_info.get('daily_progress', {}).get(today_str, {})
+        return [
+            f"✅ <b>Tugas Selesai!</b> ({phone_display})\n\n"
+            f"📊 Progress: <b>{prog.get('completed', 0)}/{prog.get('total', 60)}</b> ({prog.get('percentage', 0)}%)\n"
+            f"💵 Saldo: <code>Rp {_fmt_rp(prog.get('balance'))}</code>\n\n"
+            f"<i>Automasi sukses dijalankan! 🔥</i>"
+        ]
+    lines = [f"✅ <b>{len(phones)} Tugas Selesai!</b>", ""]
+    for phone_display in phones:
+        prog = (accounts.get(normalize_phone(phone_display)) or {}).get('daily_progress', {}).get(today_str, {})
+        lines.append(f"<code>{phone_display}</code> 📊 {prog.get('completed', 0)}/{prog.get('total', 60)}"
+                     f" · 💵 Rp {_fmt_rp(prog.get('balance'))}")
+    return split_message(lines)
+
+
+def _render_daily_report(rep):
+    """Telegram message(s) for a daily_report() result."""
+    def delta(val):
+        return f"{'+' if val >= 0 else '-'}Rp {_fmt_rp(abs(val))}"
+
+    lines = [
+        f"📋 <b>Laporan Harian {rep['day']}</b>",
+        "",
+        f"✅ Selesai: <b>{rep['completed']}/{rep['accounts']}</b> akun"
+        + (f" · ⏳ sebagian {rep['partial']}" if rep['partial'] else ""),
+        f"💵 Saldo: <code>Rp {_fmt_rp(rep['balance'])}</code> ({delta(rep['balance_delta'])})",
+        f"📈 Income: <code>Rp {_fmt_rp(rep['income'])}</code> ({delta(rep['income_delta'])})",
+        f"🔁 Run: {rep['runs']}" + (f" · {rep['running']} masih berjalan" if rep['running'] else ""),
+    ]
+    if rep['failed']:
+        lines += ["", f"❌ <b>Gagal ({len(rep['failed'])})</b>"]
+        lines += [f"<code>{phone_display(f['phone'])}</code> {f['kind']} (rc={f['returncode']})" for f in rep['failed']]
+    if rep['missed_schedule']:
+        lines += ["", f"⏰ <b>Jadwal terlewat ({len(rep['missed_schedule'])})</b>"]
+        lines += [f"<code>{phone_display(p)}</code>" for p in rep['missed_schedule']]
+    if rep['no_progress']:
+        lines += ["", f"💤 Tanpa progress hari ini: {len(rep['no_progress'])} akun"]
+    if rep['slowest']:
+        lines += ["", "🐢 <b>Run terlama</b>"]
+        lines += [f"<code>{phone_display(r['phone'])}</code> {r['kind']} {r['seconds'] // 60}m{r['seconds'] % 60:02d}s"
+                  for r in rep['slowest']]
+    return split_message(lines)
+
+
+def _daily_report(day=None):
+    day = day or datetime.date.today().isoformat()
+    # Runs come from the runner owner's index, whichever process sends the digest
+    return report.daily_report(data_manager.load_accounts(), _runs().runs(), day, key_fn=normalize_phone)
+
+
+DIGEST_STATE_FILE = os.path.join(LOG_DIR, "digest_state.json")
+
+
+def _maybe_send_daily_digest(now):
+    """Send today's digest once `digest_time` (HH:MM in settings) has passed."""
+    digest_time = data_manager.settings.get_time('digest_time')
+    if not digest_time:
+        return False
+    due = datetime.datetime.combine(now.date(), datetime.time(*digest_time))
+    day = now.date().isoformat()
+    if now < due:
+        return False
+    # Check and mark under a flock so only one webapp process sends the
+    # digest; mark first so a failing send does not repeat every pass
+    os.makedirs(os.path.dirname(DIGEST_STATE_FILE), exist_ok=True)
+    with open(DIGEST_STATE_FILE, 'a+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
         try:
-            job = JOB_QUEUE.get()
-            if job is None:
-                break
-            
-            cmd = job.get('cmd')
-            log_file = job.get('log_file')
-            phone_display = job.get('phone_display')
-            is_sync = job.get('is_sync', False)
-            
-            logger.info(f"QUEUE: Starting job for {phone_display} (Sync={is_sync})")
-            
-            with ACTIVE_JOBS_LOCK:
-                global ACTIVE_JOBS
-                ACTIVE_JOBS += 1
-            
+            f.seek(0)
             try:
-                # Open file for writing
-                with open(log_file, "w") as f:
-                    # Run synchronously - creating a BLOCKING call here
-                    subprocess.run(cmd, cwd=os.path.dirname(__file__), stdout=f, stderr=subprocess.STDOUT)
-                
-                # Send Telegram Notification (Skip if it's just a sync job)
-                if not is_sync:
-                    def _send_tele_safe():
-                        try:
-                            # Reload accounts to get the latest progress update from the CLI run
-                            # We create a new DataManager instance here to avoid lock contention if needed,
-                            # but utilizing the thread-safe read from main instance is also okay.
-                            # For simplicity, let's just use the logic directly.
-                            
-                            # Note: data_manager methods use a lock.
-                            accounts_data = data_manager.load_accounts()
-                            norm_p = normalize_phone(phone_display)
-                            acc_info = next((a for a in accounts_data if normalize_phone(a.get('phone', '')) == norm_p), None)
-                            
-                            if acc_info:
-                                today_str = datetime.datetime.now().strftime('%Y-%m-%d')
-                                prog = acc_info.get('daily_progress', {}).get(today_str, {})
-                                
-                                # Format as currency-like string
-                                def fmt_rp(val):
-                                    try: return f"{int(float(val or 0)):,}".replace(',', '.')
-                                    except: return str(val or 0)
-
-                                header = "✅ <b>Tugas Selesai!</b>"
-                                msg = (
-                                    f"{header} ({phone_display})\n\n"
-                                    f"📊 Progress: <b>{prog.get('completed', 0)}/{prog.get('total', 60)}</b> ({prog.get('percentage', 0)}%)\n"
-                                    f"💵 Saldo: <code>Rp {fmt_rp(prog.get('balance'))}</code>\n\n"
-                                    f"<i>Automasi sukses dijalankan! 🔥</i>"
-                                )
-                                data_manager.send_telegram_msg(msg)
-                            else:
-                                data_manager.send_telegram_msg(f"✅ <b>Tugas Selesai!</b>\nAkun: <code>{phone_display}</code>\nStatus: Berhasil.")
-                        except Exception as tele_e:
-                            logger.error(f"Failed to send detailed Telegram: {tele_e}")
-                    
-                    # Fire and forget thread
-                    threading.Thread(target=_send_tele_safe, daemon=True).start()
-                
-                logger.info(f"QUEUE: Finished job for {phone_display}")
-            except Exception as e:
-                logger.exception(f"QUEUE: Job failed for {phone_display}: {e}")
-            finally:
-                with ACTIVE_JOBS_LOCK:
-                    ACTIVE_JOBS -= 1
-                
-        except Exception as e:
-            logger.exception(f"Worker exception: {e}")
+                sent_day = json.loads(f.read() or '{}').get('day')
+            except ValueError:
+                sent_day = None
+            if sent_day == day:
+                return False
+            f.seek(0)
+            f.truncate()
+            json.dump({'day': day}, f)
+            f.flush()
         finally:
-            if job is not None:
-                JOB_QUEUE.task_done()
+            fcntl.flock(f, fcntl.LOCK_UN)
+    for msg in _render_daily_report(_daily_report(day)):
+        NOTIFIER.send(msg)
+    logger.info("Daily digest for %s queued", day)
+    return True
 
-# Start worker thread
-worker_thread = threading.Thread(target=worker, daemon=True)
-worker_thread.start()
 
-def clean_old_logs():
-    """Delete log files older than 3 days in the logs directory."""
-    while True:
+def _runs_local_jobs():
+    """False when this webapp only coordinates and leaves every job to remote workers."""
+    return data_manager.settings.get_bool('local_worker', True)
+
+
+def _run_job(job):
+    """Run one queued CLI job (called by a job runner slot)."""
+    cmd = job.get('cmd')
+    log_file = job.get('log_file')
+    phone_display = job.get('phone_display')
+    is_sync = job.get('is_sync', False)
+    kind = job.get('kind', 'sync' if is_sync else 'manual')
+    
+    _wait_for_memory(phone_display)
+    logger.info(f"QUEUE: Starting job for {phone_display} (Sync={is_sync})")
+    if job.get('enqueued_at') is not None:
+        QUEUE_WAIT.observe(time.time() - job['enqueued_at'], kind=kind)
+    # Batch jobs list every phone they touch so each one's log lookup finds it
+    runs = [_runs().record_start(p, log_file, kind) for p in (job.get('phones') or [phone_display])]
+    run = next((r for r in runs if r), None)
+    run_env = dict(os.environ)
+    run_env.update(_job_env(run['run_id'] if run else None))
+    
+    try:
+        # Open file for writing
+        returncode = None
+        started = time.monotonic()
         try:
-            log_dir = os.path.join(os.path.dirname(__file__), "logs")
-            if os.path.exists(log_dir):
-                now = time.time()
-                retention_seconds = 3 * 24 * 3600 # 3 days
-                for f in os.listdir(log_dir):
-                    f_path = os.path.join(log_dir, f)
-                    if os.path.isfile(f_path):
-                        if os.stat(f_path).st_mtime < now - retention_seconds:
-                            try:
-                                os.remove(f_path)
-                                logger.info(f"CLEANUP: Removed old log file {f}")
-                            except: pass
-        except Exception as e:
-            logger.error(f"Cleanup error: {e}")
-        time.sleep(3600) # Check every hour
+            with open(log_file, "w") as f:
+                # Run synchronously - blocks this runner slot
+                returncode = subprocess.run(cmd, cwd=os.path.dirname(__file__), stdout=f, stderr=subprocess.STDOUT, env=run_env,
+                                            timeout=JOB_TIMEOUT).returncode
+        finally:
+            JOB_DURATION.observe(time.monotonic() - started, kind=kind)
+            JOBS_TOTAL.inc(kind=kind, result='ok' if returncode == 0 else 'failed')
+            _runs().record_finish(log_file, returncode)
+            _retention().compress(log_file)
+        
+        # Send Telegram Notification (Skip if it's just a sync job)
+        if not is_sync:
+            NOTIFIER.add(phone_display)
+        
+        logger.info(f"QUEUE: Finished job for {phone_display}")
+    except Exception as e:
+        logger.exception(f"QUEUE: Job failed for {phone_display}: {e}")
 
-# Start cleanup thread
-cleanup_thread = threading.Thread(target=clean_old_logs, daemon=True)
-cleanup_thread.start()
 
+def _log_budget():
+    """(max_age_days, max_total_mb) for the log retention sweep, from settings."""
+    max_age = data_manager.settings.get_float('log_retention_days', log_retention.DEFAULT_MAX_AGE_DAYS)
+    max_mb = data_manager.settings.get_float('log_max_mb', log_retention.DEFAULT_MAX_TOTAL_MB)
+    return max_age, max_mb
 
 
 class DataManager:
@@ -156,37 +322,42 @@ class DataManager:
     
     def __init__(self):
         self.accounts_file = ACCOUNTS_FILE
-        self.settings_file = SETTINGS_FILE
+        # Cached in memory, re-read when the file changes (utils/settings.py)
+        self.settings = SettingsStore(SETTINGS_FILE)
         self.lock = threading.Lock()
 
+    @property
+    def settings_file(self):
+        return self.settings.path
+
+    @settings_file.setter
+    def settings_file(self, path):
+        self.settings.path = path
+
     def load_settings(self):
-        """Load settings from JSON file with error handling."""
-        if not os.path.exists(self.settings_file):
-            return {}
-        try:
-            with open(self.settings_file, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Failed to load settings: {e}")
-            return {}
+        """Current settings (a copy of the cached settings.json)."""
+        return self.settings.all()
 
     def save_settings(self, settings):
-        """Save settings to JSON file with error handling."""
+        """Replace all settings with error handling."""
         try:
-            temp_file = self.settings_file + '.tmp'
-            with open(temp_file, 'w') as f:
-                json.dump(settings, f, indent=2)
-                f.flush()
-                os.fsync(f.fileno())
-            os.replace(temp_file, self.settings_file)
+            self.settings.replace(settings)
             return True
         except Exception as e:
             logger.error(f"Failed to save settings: {e}")
             return False
 
+    def update_settings(self, changes):
+        """Merge changes into the settings; returns the changed keys, or None on error."""
+        try:
+            return self.settings.update(changes)
+        except Exception as e:
+            logger.error(f"Failed to save settings: {e}")
+            return None
+
     def load_accounts(self):
         """Load accounts with shared lock to prevent reading during a write."""
-        with self.lock:
+        with self.lock, ACCOUNTS_IO.time(op='read'):
             if not os.path.exists(self.accounts_file):
                 return []
             try:
@@ -205,9 +376,13 @@ class DataManager:
                 logger.warning("WARNING failed to read accounts file: %s", e)
                 return []
 
-    def atomic_update_accounts(self, update_fn):
-        """Atomically update accounts.json using a file lock."""
-        with self.lock:
+    def atomic_update_accounts(self, update_fn, backup=True):
+        """Atomically update accounts.json using a file lock.
+
+        update_fn may return None to leave the file untouched. backup=False
+        skips the rotating backup (for frequent small merges).
+        """
+        with self.lock, ACCOUNTS_IO.time(op='write'):
             # Create file if not exists
             if not os.path.exists(self.accounts_file):
                 try:
@@ -217,7 +392,8 @@ class DataManager:
                     pass
 
             # Backup logic
-            self._backup_accounts()
+            if backup:
+                self._backup_accounts()
 
             try:
                 with open(self.accounts_file, 'r+') as f:
@@ -235,6 +411,8 @@ class DataManager:
                                 acc['password'] = crypto.decrypt_password(acc['password'])
                         
                         new_accounts = update_fn(accounts)
+                        if new_accounts is None:
+                            return True
                         
                         # Encrypt BEFORE saving
                         for acc in new_accounts:
@@ -286,40 +464,45 @@ class DataManager:
         return self.atomic_update_accounts(lambda _: accounts)
 
     def send_telegram_msg(self, message):
-        """Send a message via Telegram Bot API using settings."""
-        if requests is None:
-            logger.warning("Telegram NOT SENT: requests module not installed.")
-            return False
-
-        settings = self.load_settings()
-        token = settings.get('telegram_token')
-        chat_id = settings.get('telegram_chat_id')
-        
-        if not token or not chat_id:
-            logger.warning("Telegram NOT SENT: Missing token or chat_id in settings")
-            return False
-            
-        try:
-            url = f"https://api.telegram.org/bot{token}/sendMessage"
-            payload = {
-                "chat_id": chat_id,
-                "text": message,
-                "parse_mode": "HTML"
-            }
-            resp = requests.post(url, json=payload, timeout=10)
-            if resp.status_code == 200:
-                logger.info("Telegram message sent successfully")
-                return True
-            else:
-                logger.error(f"Telegram failed: {resp.status_code} - {resp.text}")
-                return False
-        except Exception as e:
-            logger.error(f"Telegram exception: {e}")
-            return False
+        """Queue a message for Telegram (sent by NOTIFIER with the token and chat_id from settings)."""
+        NOTIFIER.send(message)
+        return True
 
 data_manager = DataManager()
 
 
+def _telegram_credentials():
+    settings = data_manager.settings.all()
+    return settings.get('telegram_token'), settings.get('telegram_chat_id')
+
+
+# Every Telegram message goes through one thread and connection; finished runs
+# within NOTIFY_WINDOW seconds of each other are sent as one digest
+NOTIFY_WINDOW = float(os.getenv("MBA_NOTIFY_WINDOW", "10"))
+NOTIFIER = TelegramDispatcher(_telegram_credentials, render_batch=_render_completions,
+                              window=NOTIFY_WINDOW, observe=TELEGRAM_SEND.observe)
+
+# Wakes the scheduler early when a setting it uses changes
+SCHED_WAKE = threading.Event()
+
+
+# Settings that take effect without a restart: subscribed to the settings
+# store, which calls them after /settings/save or when another process (or a
+# hand edit) changes settings.json
+def _apply_job_slots(changed=None, settings=None):
+    JOB_QUEUE.runner.set_slots(data_manager.settings.get_int('job_slots', JOB_SLOTS))
+
+
+def _apply_notify_window(changed=None, settings=None):
+    NOTIFIER.window = data_manager.settings.get_float('notify_window', NOTIFY_WINDOW)
+
+
+data_manager.settings.subscribe(_apply_job_slots, keys=('job_slots',))
+data_manager.settings.subscribe(_apply_notify_window, keys=('notify_window',))
+data_manager.settings.subscribe(lambda changed, settings: SCHED_WAKE.set(),
+                                keys=('digest_time', 'session_refresh_window'))
+
+
 def _format_phone_for_cli(raw_phone: str) -> str:
     """Return phone string in display format expected by the CLI (no leading '62').
     Returns empty string if phone cannot be normalized.
@@ -338,8 +521,14 @@ if not logger.handlers:
     logger.setLevel(logging.INFO)
     try:
         handler = RotatingFileHandler(LOG_FILE, maxBytes=10 * 1024 * 1024, backupCount=3)
+        # Rotated files are stored as runs.log.N.gz
+        handler.namer = lambda name: name + ".gz"
+        handler.rotator = log_retention.gzip_rotator
         handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
         logger.addHandler(handler)
+        # Mirror webapp warnings and errors into the structured event stream
+        # (INFO stays in runs.log only, it would double the event volume)
+        logger.addHandler(events.EventLogHandler(phase='webapp', level=logging.WARNING))
     except Exception:
         # fallback to basic logging to stderr when file not writable
         logging.basicConfig(level=logging.INFO)
@@ -478,7 +667,7 @@ def api_accounts():
     
     return jsonify({
         "accounts": results,
-        "queue_size": JOB_QUEUE.qsize() + ACTIVE_JOBS
+        "queue_size": JOB_QUEUE.pending()
     })
 
 
@@ -611,37 +800,33 @@ def api_global_history():
         return jsonify({}), 500
 
 
+@app.route("/api/report/daily")
+def api_daily_report():
+    """The daily digest as data (?day=YYYY-MM-DD, default today)."""
+    day = request.args.get('day') or None
+    try:
+        if day:
+            datetime.date.fromisoformat(day)
+    except ValueError:
+        return jsonify({"error": "day must be YYYY-MM-DD"}), 400
+    return jsonify(_daily_report(day))
+
+
 @app.route("/api/logs/<phone_display>")
 def api_phone_logs(phone_display):
     """Get the latest log content for a specific phone number."""
     try:
-        # normalize to get the CLI format used in filenames
         norm = normalize_phone(phone_display)
         if not norm:
             return "Invalid phone number", 400
-        
-        # Logic matches _format_phone_for_cli
-        phone_cli = norm[2:] if norm.startswith('62') else norm
-        
-        log_dir = os.path.join(os.path.dirname(__file__), "logs")
-        if not os.path.exists(log_dir):
-            return "No logs available yet.", 404
-            
-        # Find files matching pattern
-        prefix = f"automation_{phone_cli}_"
-        candidates = []
-        for f in os.listdir(log_dir):
-            if f.startswith(prefix) and f.endswith(".log"):
-                candidates.append(os.path.join(log_dir, f))
-        
-        if not candidates:
+
+        # Answer from the run index (covers manual, sync and schedule jobs)
+        latest = _runs().latest(norm)
+        if not latest or not os.path.exists(latest['log_file']):
             return "Log file not found for this account.", 404
-            
-        # Get the most recently modified file
-        latest_log = max(candidates, key=os.path.getmtime)
-        
-        # Read content
-        with open(latest_log, 'r', encoding='utf-8', errors='replace') as f:
+
+        # Finished runs are gzip-compressed by the retention subsystem
+        with log_retention.open_log(latest['log_file']) as f:
             content = f.read()
             
         return content, 200, {'Content-Type': 'text/plain'}
@@ -651,6 +836,192 @@ def api_phone_logs(phone_display):
         return str(e), 500
 
 
+@app.route("/api/runs/<phone_display>")
+def api_phone_runs(phone_display):
+    """Run history (newest first) for a specific phone number."""
+    norm = normalize_phone(phone_display)
+    if not norm:
+        return jsonify({"runs": []}), 400
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        limit = 20
+    runs = _runs().history(norm, limit=limit)
+    for r in runs:
+        r['log_name'] = os.path.basename(r.pop('log_file'))
+    return jsonify({"runs": runs})
+
+
+@app.route("/api/instrumentation")
+def api_instrumentation():
+    """Per-run navigation/wait/locator counters from the automation (mba_automation/instrument.py).
+
+    Filters: phone, limit. 'summary' averages each counter over the returned runs.
+    """
+    phone_filter = normalize_phone(request.args.get('phone', ''))
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        limit = 20
+    records = LOG_STORE.query(phone=phone_filter or None, phase='instrument', limit=limit)
+    runs = [{k: v for k, v in rec.items() if k not in ('level', 'phase', 'msg')} for rec in records]
+    summary = {}
+    for key in sorted({k for r in runs for k in r if k.endswith('_calls') or k.endswith('_s')}):
+        values = [r[key] for r in runs if isinstance(r.get(key), (int, float))]
+        if values:
+            summary[key] = round(sum(values) / len(values), 3)
+    return jsonify({"runs": runs, "summary": summary})
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint (queue depth, jobs, accounts.json I/O, scheduler, Telegram)."""
+    return metrics.REGISTRY.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+
+# ================= REMOTE WORKERS (coordinator side) =================
+# Other devices run `python -m mba_automation.remote_worker --coordinator http://<this host>:5000`.
+# They claim jobs from JOB_QUEUE (leases live in the job runner), run the CLI
+# locally against a copy of the job's accounts and post the log and the
+# updated accounts back.
+
+def _worker_token():
+    return os.getenv('MBA_WORKER_TOKEN') or data_manager.settings.get_str('worker_token')
+
+
+def _worker_request():
+    """The JSON body of an authorized worker call, or None (remote workers off or bad token)."""
+    token = _worker_token()
+    if not token or not hmac.compare_digest(request.headers.get('X-Worker-Token', ''), token):
+        return None
+    return request.get_json(silent=True) or {}
+
+
+def _job_phones(job):
+    return [normalize_phone(p) for p in (job.get('phones') or [job.get('phone_display')]) if p]
+
+
+def _apply_remote_accounts(record, accounts, final=False):
+    """Merge the accounts a worker's CLI wrote into accounts.json.
+
+    Heartbeats only write when the merge changed something and skip the
+    rotating backup, which is taken once for the final result.
+    """
+    if not accounts:
+        return
+    by_phone = {normalize_phone(a.get('phone', '')): a for a in accounts if isinstance(a, dict)}
+    wanted = set(_job_phones(record['job']))
+
+    def update(stored):
+        changed = False
+        for acc in stored:
+            remote = by_phone.get(normalize_phone(acc.get('phone', '')))
+            if remote and normalize_phone(acc.get('phone', '')) in wanted:
+                before = json.dumps(acc, sort_keys=True)
+                merge_account(acc, remote, record['day'])
+                changed = changed or json.dumps(acc, sort_keys=True) != before
+        return stored if changed or final else None
+
+    data_manager.atomic_update_accounts(update, backup=final)
+
+
+def _append_remote_log(record, text):
+    if text:
+        with open(record['job']['log_file'], 'a') as f:
+            f.write(text)
+
+
+def _remote_job_expired(record):
+    """A remote worker stopped reporting; its job is already back in the queue."""
+    logger.warning("REMOTE: %s stopped reporting, requeued job for %s", record['worker'], record['job'].get('phone_display'))
+    # Close the run the lost worker left open
+    _runs().record_finish(record['job']['log_file'], None)
+
+
+@app.route("/api/worker/claim", methods=["POST"])
+def worker_claim():
+    """Hand the next queued job to a remote worker (204 when there is none)."""
+    body = _worker_request()
+    if body is None:
+        return jsonify({"error": "unauthorized"}), 403
+    name = str(body.get('worker') or request.remote_addr)
+    record, _ = JOB_QUEUE.claim(name)
+    if not record:
+        return '', 204
+    job = record['job']
+    kind = job.get('kind', 'sync' if job.get('is_sync') else 'manual')
+    if job.get('enqueued_at') is not None:
+        QUEUE_WAIT.observe(time.time() - job['enqueued_at'], kind=kind)
+    runs = [_runs().record_start(p, job['log_file'], kind) for p in (job.get('phones') or [job.get('phone_display')])]
+    run = next((r for r in runs if r), None)
+    with open(job['log_file'], 'w') as f:
+        f.write(f"[remote worker {name}]\n")
+    phones = set(_job_phones(job))
+    accounts = [{k: v for k, v in a.items() if k != 'password'}
+                for a in data_manager.load_accounts() if normalize_phone(a.get('phone', '')) in phones]
+    logger.info("REMOTE: %s claimed job for %s (%s)", name, job.get('phone_display'), kind)
+    return jsonify({
+        "job_id": record['id'],
+        "kind": kind,
+        # The coordinator's interpreter path means nothing on the worker
+        "args": job['cmd'][1:],
+        "env": _job_env(run['run_id'] if run else None),
+        "accounts": accounts,
+    })
+
+
+@app.route("/api/worker/progress", methods=["POST"])
+def worker_progress():
+    """Log output and account progress from a running remote job; renews its lease."""
+    body = _worker_request()
+    if body is None:
+        return jsonify({"error": "unauthorized"}), 403
+    record = JOB_QUEUE.touch(body.get('job_id'))
+    if not record:
+        # Lease expired and the job was requeued: tell the worker to stop
+        return jsonify({"ok": False, "cancel": True}), 410
+    _append_remote_log(record, body.get('log'))
+    _apply_remote_accounts(record, body.get('accounts'))
+    return jsonify({"ok": True})
+
+
+@app.route("/api/worker/result", methods=["POST"])
+def worker_result():
+    """Final log, accounts and exit code of a remote job."""
+    body = _worker_request()
+    if body is None:
+        return jsonify({"error": "unauthorized"}), 403
+    record = JOB_QUEUE.finish(body.get('job_id'))
+    if not record:
+        return jsonify({"ok": False}), 410
+    job = record['job']
+    kind = job.get('kind', 'sync' if job.get('is_sync') else 'manual')
+    returncode = body.get('returncode')
+    _append_remote_log(record, body.get('log'))
+    _apply_remote_accounts(record, body.get('accounts'), final=True)
+    JOB_DURATION.observe(time.time() - record['claimed'], kind=kind)
+    JOBS_TOTAL.inc(kind=kind, result='ok' if returncode == 0 else 'failed')
+    _runs().record_finish(job['log_file'], returncode)
+    _retention().compress(job['log_file'])
+    logger.info("REMOTE: %s finished job for %s (rc=%s)", record['worker'], job.get('phone_display'), returncode)
+    if not job.get('is_sync', False):
+        NOTIFIER.add(job.get('phone_display'))
+    return jsonify({"ok": True})
+
+
+@app.route("/api/worker/status")
+def worker_status():
+    """Remote workers seen by this coordinator and the jobs they are running."""
+    status = JOB_QUEUE.status()
+    return jsonify({"workers": status['remote'], "queued": len(status['queued']), "local_worker": _runs_local_jobs()})
+
+
+@app.route("/api/queue")
+def queue_status():
+    """The job runner's queue: queued and running jobs per slot (one view for every webapp process)."""
+    return jsonify(JOB_QUEUE.status())
+
+
 @app.route("/settings/get", methods=["GET"])
 def get_settings():
     return jsonify(data_manager.load_settings())
@@ -660,8 +1031,12 @@ def get_settings():
 def save_settings():
     try:
         data = request.get_json()
-        if data_manager.save_settings(data):
-            return jsonify({"status": "success"})
+        if not isinstance(data, dict):
+            return jsonify({"status": "error", "message": "Expected a JSON object"}), 400
+        # Merge: the settings form only sends the keys it shows
+        changed = data_manager.update_settings(data)
+        if changed is not None:
+            return jsonify({"status": "success", "changed": sorted(changed)})
         return jsonify({"status": "error", "message": "Failed to save settings"}), 500
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -791,6 +1166,7 @@ def index():
                             if 'daily_progress' in old: acc['daily_progress'] = old['daily_progress']
                             if 'is_syncing' in old: acc['is_syncing'] = old['is_syncing']
                             if 'sync_start_ts' in old: acc['sync_start_ts'] = old['sync_start_ts']
+                            if 'sync_sources' in old: acc['sync_sources'] = old['sync_sources']
                             
                         new_list.append(acc)
                     return new_list
@@ -879,7 +1255,8 @@ def index():
                         'cmd': cmd,
                         'log_file': log_file,
                         'phone_display': phone,
-                        'is_sync': False
+                        'is_sync': False,
+                        'kind': 'manual'
                     })
                     
                     started += 1
@@ -909,7 +1286,7 @@ def index():
                          if norm in existing_map:
                              old = existing_map[norm]
                              # Merge all persistent fields
-                             for k in ['reviews', 'schedule', 'last_run', 'last_run_ts', 'last_sync_ts', 'daily_progress', 'is_syncing', 'sync_start_ts']:
+                             for k in ['reviews', 'schedule', 'last_run', 'last_run_ts', 'last_sync_ts', 'daily_progress', 'is_syncing', 'sync_start_ts', 'sync_sources']:
                                  if k in old: acc[k] = old[k]
                          new_list.append(acc)
                     return new_list
@@ -1068,6 +1445,7 @@ def index():
         saved=saved_accounts,
         now=now,
         settings=settings,
+        job_slots=JOB_SLOTS,
         queue_size=JOB_QUEUE.qsize()
     )
 
@@ -1137,7 +1515,8 @@ def _trigger_run_for_account(acc):
             'cmd': cmd,
             'log_file': log_file,
             'phone_display': phone_display,
-            'is_sync': False
+            'is_sync': False,
+            'kind': 'schedule'
         })
         logger.info("Queued scheduled job logging to %s", log_file)
         return True
@@ -1147,13 +1526,79 @@ def _trigger_run_for_account(acc):
 
 
 
+# Off-peak session refresh: phones refreshed today (display format -> date)
+SESSION_REFRESH_AHEAD = 12 * 3600  # refresh sessions expiring within this many seconds
+
+
+def _in_refresh_window(now, window):
+    """True if now falls in an "HH:MM-HH:MM" window (may wrap past midnight)."""
+    try:
+        start_s, end_s = window.split('-')
+        start = datetime.time(*(int(x) for x in start_s.strip().split(':')))
+        end = datetime.time(*(int(x) for x in end_s.strip().split(':')))
+    except Exception:
+        return False
+    t = now.time()
+    return start <= t < end if start <= end else (t >= start or t < end)
+
+
+def _refresh_expiring_sessions(now=None):
+    """During off-peak hours, queue a fresh login for sessions that are about to expire."""
+    now = now or datetime.datetime.now()
+    window = data_manager.settings.get('session_refresh_window', '02:00-05:00')
+    if not window or not _in_refresh_window(now, window):
+        return 0
+
+    today = now.date().isoformat()
+    sessions = SessionManager()
+    due = [p for p in sessions.expiring(SESSION_REFRESH_AHEAD) if sessions.get(p).get('refreshed_on') != today]
+    if not due:
+        return 0
+
+    queued = 0
+    accounts = {phone_display(a.get('phone', '')): a for a in data_manager.load_accounts()}
+    for p in due:
+        acc = accounts.get(p)
+        if not acc or not acc.get('password'):
+            continue
+        # Recorded in sessions/meta.json under its flock: one refresh per day
+        # across webapp processes and restarts
+        if not sessions.claim_refresh(p, today):
+            continue
+        cmd = [sys.executable, "-m", "mba_automation.cli", "--phone", p, "--password", acc['password'], "--refresh-session", "--headless"]
+        log_file = os.path.join(LOG_DIR, f"refresh_{p}_{now.strftime('%Y%m%d_%H%M%S')}.log")
+        os.makedirs(LOG_DIR, exist_ok=True)
+        JOB_QUEUE.put({
+            'cmd': cmd,
+            'log_file': log_file,
+            'phone_display': p,
+            'is_sync': True,  # no "task done" Telegram message
+            'kind': 'refresh'
+        })
+        logger.info("Queued off-peak session refresh for %s", p)
+        queued += 1
+    return queued
+
+
 def _scheduler_loop():
     # Loop forever checking schedules and triggering runs when needed.
     while True:
         try:
+            try:
+                _refresh_expiring_sessions()
+            except Exception as e:
+                logger.warning("Session refresh check failed: %s", e)
+
+            SCHEDULER_LAST_CHECK.set(time.time())
+            try:
+                _maybe_send_daily_digest(datetime.datetime.now())
+            except Exception as e:
+                logger.warning("Daily digest failed: %s", e)
+
             # do not run scheduled jobs on Sundays (weekday == 6)
             if datetime.datetime.now().weekday() == 6:
-                time.sleep(SCHED_CHECK_INTERVAL)
+                SCHED_WAKE.wait(SCHED_CHECK_INTERVAL)
+                SCHED_WAKE.clear()
                 continue
             
             def check_and_trigger(accounts):
@@ -1203,6 +1648,7 @@ def _scheduler_loop():
                     # Trigger
                     ok = _trigger_run_for_account(acc)
                     if ok:
+                        SCHEDULER_LATENESS.observe((now - scheduled_dt).total_seconds())
                         # Mark as triggered immediately to prevent double-queuing
                         acc['last_run_ts'] = datetime.datetime.now().isoformat()
                         if 'last_run' in acc: del acc['last_run']
@@ -1241,7 +1687,8 @@ def _scheduler_loop():
         except Exception as e:
             logger.exception("Scheduler error: %s", e)
  
-        time.sleep(SCHED_CHECK_INTERVAL)
+        SCHED_WAKE.wait(SCHED_CHECK_INTERVAL)
+        SCHED_WAKE.clear()
 
 
 @app.route("/review", methods=["GET", "POST"])
@@ -1441,6 +1888,39 @@ def history(phone, metric):
                            history_items=history_items)
 
 
+@app.route("/checkin_all", methods=["POST"])
+def checkin_all():
+    """Queue one check-in-only job covering every account (one shared browser)."""
+    accounts = [a for a in data_manager.load_accounts() if a.get('phone') and a.get('password')]
+    if not accounts:
+        return jsonify({"ok": False, "msg": "No accounts with password"}), 400
+
+    cmd = [sys.executable, "-m", "mba_automation.cli"]
+    phones = []
+    for acc in accounts:
+        p = phone_display(acc['phone'])
+        phones.append(p)
+        cmd.extend(["--phone", p, "--password", acc['password']])
+    cmd.extend(["--checkin-only", "--headless"])
+
+    logger.info("CHECK-IN ALL ENQUEUE for %d accounts", len(phones))
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        JOB_QUEUE.put({
+            'cmd': cmd,
+            'log_file': os.path.join(LOG_DIR, f"checkin_all_{timestamp}.log"),
+            'phone_display': 'ALL',
+            'phones': phones,
+            'is_sync': True,
+            'kind': 'checkin'
+        })
+        return jsonify({"ok": True, "msg": f"Check-in queued for {len(phones)} accounts"})
+    except Exception as e:
+        logger.exception("FAILED CHECK-IN ENQUEUE: %s", e)
+        return jsonify({"ok": False, "msg": str(e)}), 500
+
+
 @app.route("/run_single", methods=["POST"])
 def run_single():
     return _handle_single_run(request, sync_only=False)
@@ -1508,6 +1988,9 @@ def _handle_single_run(req, sync_only=False):
         
     if sync_only:
         cmd.append("--sync")
+        # Manual sync from the dashboard scrapes everything; auto-sync only what is stale
+        if req.form.get('full') in ('1', 'true', 'on'):
+            cmd.append("--full-sync")
 
     logger.info("SINGLE RUN ENQUEUE (Sync=%s) for %s: %s", sync_only, phone, ' '.join(shlex.quote(c) for c in cmd))
 
@@ -1543,7 +2026,8 @@ def _handle_single_run(req, sync_only=False):
             'cmd': cmd,
             'log_file': log_file,
             'phone_display': phone_display,
-            'is_sync': sync_only
+            'is_sync': sync_only,
+            'kind': 'sync' if sync_only else 'manual'
         })
         
         return jsonify({"ok": True, "msg": "Job queued"})
@@ -1607,6 +2091,11 @@ def view_logs():
             with open(LOG_FILE, 'r', encoding='utf-8', errors='ignore') as f:
                 all_lines = f.readlines()
                 lines = all_lines[-1000:]  # Last 1000 lines
+            # Top up from the most recent (compressed) rotation right after a rollover
+            rotated = LOG_FILE + ".1.gz"
+            if len(lines) < 1000 and os.path.exists(rotated):
+                with log_retention.open_log(rotated, errors='ignore') as f:
+                    lines = f.readlines()[-(1000 - len(lines)):] + lines
         except Exception as e:
             flash(f"Error reading log file: {e}", "error")
     
@@ -1645,44 +2134,35 @@ def view_logs():
 
 @app.route("/api/logs")
 def api_logs():
-    """API endpoint to fetch logs as JSON."""
+    """API endpoint to fetch structured log events as JSON.
+
+    Filters: level, phone, run_id, since/until (ISO datetimes), limit.
+    """
     level_filter = request.args.get('level', '').upper()
-    limit = int(request.args.get('limit', 100))
-    
-    lines = []
-    if os.path.exists(LOG_FILE):
-        try:
-            with open(LOG_FILE, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()[-limit:]
-        except Exception:
-            pass
-    
-    # Parse lines
+    phone_filter = normalize_phone(request.args.get('phone', ''))
+    run_filter = request.args.get('run_id', '').strip()
+    since = request.args.get('since', '').strip()
+    until = request.args.get('until', '').strip()
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        limit = 100
+
+    records = LOG_STORE.query(
+        phone=phone_filter or None,
+        level=level_filter or None,
+        run_id=run_filter or None,
+        since=since or None,
+        until=until or None,
+        limit=limit
+    )
+
     parsed_logs = []
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        parts = line.split(' ', 3)
-        if len(parts) >= 4:
-            date = parts[0]
-            time_str = parts[1]
-            level = parts[2]
-            message = parts[3] if len(parts) > 3 else ''
-            
-            # Filter by level if specified
-            if level_filter and level != level_filter:
-                continue
-            
-            parsed_logs.append({
-                'timestamp': f"{date} {time_str}",
-                'level': level,
-                'message': message
-            })
-    
-    # Reverse for newest first
-    parsed_logs.reverse()
+    for rec in records:
+        entry = dict(rec)
+        entry['timestamp'] = str(rec.get('ts', '')).replace('T', ' ')[:19]
+        entry['message'] = rec.get('msg', '')
+        parsed_logs.append(entry)
     
     return jsonify({'logs': parsed_logs, 'total': len(parsed_logs)})
 
@@ -1693,8 +2173,12 @@ def api_logs():
 def _start_background_threads():
     # Only start if not already started (useful for some dev servers)
     if not getattr(app, '_threads_started', False):
-        # 1. Start worker thread (processes the JOB_QUEUE)
-        # (Worker thread is actually started at line 60-61, which is fine)
+        # 1. Start the job runner, or attach to the one another process owns
+        # (started here, once data_manager and logger exist: slots read settings)
+        _apply_job_slots()
+        _apply_notify_window()
+        JOB_QUEUE.start()
+        NOTIFIER.start()
         
         # 2. Start scheduler thread (checks schedules in accounts.json)
         # Only start scheduler if we are not in a debug reloader child or if explicitly told to
@@ -1705,8 +2189,22 @@ def _start_background_threads():
         
         app._threads_started = True
 
-# Trigger startup
-_start_background_threads()
+
+def _start_runner_owner_threads():
+    """Run index and log retention, kept by the process that owns the job runner only."""
+    # 1. Seed the run index once from logs left by previous processes
+    try:
+        RUN_INDEX.seed(LOG_DIR, live_for=JOB_TIMEOUT)
+    except Exception as e:
+        logger.warning("Run index seed failed: %s", e)
+
+    # 2. Start the log retention sweep (compression + age/size budgets)
+    t_cleanup = threading.Thread(target=LOG_RETENTION.run_forever, daemon=True)
+    t_cleanup.start()
+
+# Trigger startup (MBA_BACKGROUND=0 skips it, e.g. for tests importing the app)
+if os.getenv("MBA_BACKGROUND", "1") != "0":
+    _start_background_threads()
 
 
 if __name__ == "__main__":